@@ -0,0 +1,351 @@
+from typing import Any, Dict, List, Text
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+REPROMPT = "Please select one of the options provided."
+
+
+class FromSlot:
+    """Derived value copied from another slot at validation time."""
+
+    def __init__(self, slot: Text) -> None:
+        self.slot = slot
+
+    def __repr__(self) -> Text:
+        return "FromSlot({!r})".format(self.slot)
+
+
+# slot -> {accepted value -> derived slots}. The chosen value is stored in the
+# slot itself unless the derived slots override it. Accepted values must match
+# the button payloads of ``utter_ask_<slot>`` in domain.yml (or the mapped
+# values for slots filled from intents); see ``scripts/check_choices.py``.
+CHOICE_TABLES = {
+    "abdominal_pain_type": {
+        "cramping": {"abdominal_pain_crampy": True},
+        "burning or gnawing": {"abdominal_pain_burning_or_gnawing": True},
+        "sharp and stabbing": {"abdominal_pain_sharp_and_stabbing": True},
+        "others": {"abdominal_pain_type": "Unknown"},
+    },
+    "abdominal_pain_location": {
+        "left upper": {"abdominal_pain_left_side": True, "abdominal_pain_left_upper_quadrant": True, "abdominal_pain_localised": True},
+        "left lower": {"abdominal_pain_left_side": True, "abdominal_pain_left_lower_quadrant": True, "abdominal_pain_localised": True},
+        "right upper": {"abdominal_pain_right_side": True, "abdominal_pain_right_upper_quadrant": True, "abdominal_pain_localised": True},
+        "right lower": {"abdominal_pain_right_side": True, "abdominal_pain_right_lower_quadrant": True, "abdominal_pain_localised": True},
+        "centre": {"abdominal_pain_periumbilical": True, "abdominal_pain_localised": True},
+        "flanks": {"flank_pain": True, "abdominal_pain_localised": True},
+        "pelvis": {"abdominal_pain_pelvic": True, "abdominal_pain_localised": True},
+        "all over": {"abdominal_pain_diffuse": True},
+    },
+    "abdominal_pain_duration": {
+        "less than 2 days": {"abdominal_pain_lasting_less_than_two_days": True},
+        "between 2 to 7 days": {"abdominal_pain_lasting_2_to_7_days": True},
+        "between 1 to 2 weeks": {"abdominal_pain_lasting_8_to_14_days": True},
+        "more than 2 weeks": {"abdominal_pain_lasting_more_than_two_weeks": True},
+    },
+    "abdominal_pain_onset": {
+        "gradual": {"abdominal_pain_gradual_onset": True},
+        "sudden": {"abdominal_pain_sudden_onset": True},
+    },
+    "abdominal_pain_scale": {
+        "mild": {"abdominal_pain_mild": True},
+        "moderate": {"abdominal_pain_moderate": True},
+        "severe": {"abdominal_pain_severe": True},
+    },
+    "abdominal_tenderness_location": {
+        "left upper": {"abdominal_tenderness_left_upper_quadrant": True},
+        "left lower": {"abdominal_tenderness_left_lower_quadrant": True},
+        "right upper": {"abdominal_tenderness_right_upper_quadrant": True},
+        "right lower": {"abdominal_tenderness_right_lower_quadrant": True},
+        "pelvis": {"abdominal_tenderness_suprapubic": True},
+    },
+    "abdominal_pain_exacerbation": {
+        "after caffeine consumption": {"abdominal_pain_exacerbating_after_caffeine_consumption": True},
+        "during coughing or movement": {"abdominal_pain_exacerbating_during_coughing_or_movement": True},
+        "during deep breaths": {"abdominal_pain_exacerbating_during_deep_breath": True},
+        "on an empty stomach": {"abdominal_pain_exacerbating_on_an_empty_stomach": True},
+        "when under stress": {"gastrointestinal_complaints_stress_related": True},
+        "no": {"abdominal_pain_exacerbation": "None"},
+    },
+    "diarrhea_duration": {
+        "less than 2 days": {"diarrhea_lasting_less_than_48_hours": True},
+        "between 2 days and 2 weeks": {"diarrhea_lasting_2_to_14_days": True},
+        "more than 2 weeks": {"diarrhea_lasting_more_than_14_days": True},
+    },
+    "vomiting_duration": {
+        "less than a week": {"vomiting_less_than_7_days": True},
+        "more than a week": {"vomiting_7_days_or_more": True},
+    },
+    "stools": {
+        "black feces": {"black_stools": True},
+        "blood in feces": {"blood_in_stool": True},
+        "no": {"stools": "Normal"},
+    },
+    "bleeding_from_anus_scale": {
+        "light": {"bleeding_from_anus_light": True},
+        "heavy": {"bleeding_from_anus_heavy": True},
+    },
+    "cough_duration": {
+        "less than 3 weeks": {"cough_lasting_less_than_three_weeks": True},
+        "3 to 8 weeks": {"cough_lasting_three_to_eight_weeks": True},
+        "more than 8 weeks": {"cough_lasting_more_than_eight_weeks": True},
+    },
+    "cough_productive": {
+        True: {"cough_dry": False},
+        False: {"cough_dry": True},
+    },
+    "cough_productive_color": {
+        "pink and frothy": {"cough_productive_with_pink_frothy_sputum": True},
+        "yellow or green": {"cough_productive_with_yellow_or_green_sputum": True},
+        "others": {"cough_productive_color": "unknown"},
+    },
+    "dyspnea_severity": {
+        "when resting": {"dyspnea_at_rest": True},
+        "after few minutes of walking": {"dyspnea_after_a_few_minutes_of_walking": True},
+        "when i do physical activities": {"dyspnea_on_exertion": True},
+    },
+    "dyspnea_duration": {
+        "less than 1 hour": {"dyspnea_lasting_less_than_1_hour": True},
+        "1 to 24 hours": {"dyspnea_lasting_1_to_24_hours": True},
+        "1 day to 4 weeks": {"dyspnea_lasting_1_day_to_4_weeks": True},
+    },
+    "chest_pain_type": {
+        "burning": {"chest_pain_burning": True},
+        "pressing": {"chest_pain_pressure": True},
+        "stabbing": {"chest_pain_stabbing": True},
+    },
+    "chest_pain_duration": {
+        "less than 30 minutes": {"chest_pain_lasting_less_than_30_minutes": True},
+        "between 30 minutes and 8 hours": {"chest_pain_lasting_between_30_minutes_and_8_hours": True},
+        "more than 8 hours": {"chest_pain_lasting_over_8_hours": True},
+    },
+    "chest_pain_radiating": {
+        "spreading to left upper limb": {"chest_pain_radiating_to_left_upper_limb": True},
+        "spreading to neck": {"chest_pain_radiating_to_the_neck": True},
+        "spreading between shoulders": {"chest_pain_radiating_between_shoulder_blades": True},
+        "spreading elsewhere": {},
+        "not spreading": {"chest_pain_radiating": "Not Spreading"},
+    },
+    "back_pain_location": {
+        "upper back": {"back_pain_thoracic": True, "back_pain_lumbar": False},
+        "lower back": {"back_pain_lumbar": True},
+        "both upper and lower back": {"back_pain_location": "upper and lower back", "back_pain_lumbar": True, "back_pain_thoracic": True},
+    },
+    "back_pain_scale": {
+        "Mild": {},
+        "Moderate": {},
+        "Severe": {"back_pain_severe": True},
+    },
+    "breast_pain": {
+        "only one breast": {"breast_pain_or_tenderness_unilateral": True},
+        "both breasts": {"breast_pain_or_tenderness_bilateral": True},
+    },
+    "abnormal_breast_size": {
+        "larger than normal": {"enlarged_breasts": True},
+        "smaller than normal": {"decreased_breast_size": True},
+        "no change in size": {},
+    },
+    "headache_chronic": {
+        True: {"headache_recent": False},
+        False: {"headache_recent": True},
+    },
+    "chronic_headache_duration": {
+        "lasts up to 5 minutes": {"headache_chronic_attack_lasting_up_to_five_minutes": True},
+        "lasts 5 minutes to 4 hours": {"headache_chronic_attack_lasting_five_minutes_to_four_hours": True},
+        "lasts 4 to 72 hours": {"headache_chronic_attack_lasting_4_to_72_hours": True},
+        "lasts 3 to 7 days": {"headache_chronic_attack_lasting_three_to_seven_days": True},
+    },
+    "recent_headache_duration": {
+        "lasts less than 1 hour": {"headache_recent_lasting_less_than_1_hour": True},
+        "lasts for more than 1 hour": {"headache_recent_lasting_for_more_than_1_hour_and_less_than_1_day": True},
+        "lasts more than 1 day": {"headache_recent_lasting_more_than_1_day": True},
+    },
+    "headache_type": {
+        "Stabbing/Sharp": {"headache_lancinating": True},
+        "Pressing": {"headache_pressing": True},
+        "Pulsating": {"headache_pulsating": True},
+    },
+    "headache_location": {
+        "Forehead": {"headache_forehead": True},
+        "All over": {"headache_generalized": True},
+        "At the temples": {"headache_temporal_region": True},
+    },
+    "headache_pain_level": {
+        "Mild": {"headache_mild": True},
+        "Moderate": {"headache_moderate": True},
+        "Severe": {"headache_severe": True, "headache_worst_headache_in_life": True},
+    },
+    "dermatological_flare_ups_reason": {
+        "Coming into contact with buttons,fasteners or cosmetics": {"dermatological_changes_at_the_point_of_contact_with_buttons_fasteners_or_cosmetics": True},
+        "Stress": {"dermatological_changes_aggravated_by_stress": True},
+        "Alcohol consumption": {"dermatological_changes_exacerbated_by_alcohol_consumption": True},
+        "Sunlight exposure": {"dermatological_changes_exacerbated_by_sunlight_exposure": True},
+        "None of the above": {"dermatological_flare_ups_reason": "Not affected by stress, alcohol, sunlight, or tight clothes"},
+    },
+    "dermatological_changes_upper_lower_extremities": {
+        "Lower Body excluding feet": {
+            "dermatological_changes_lower_extremities_excluding_feet": True,
+            "dermatological_changes_located_on_the_limb": True,
+            "erythema_limb": FromSlot("erythema"),
+        },
+        "Upper Body excluding hands": {
+            "dermatological_changes_upper_extremities_excluding_hands": True,
+            "dermatological_changes_located_on_the_limb": True,
+            "erythema_limb": FromSlot("erythema"),
+        },
+        "Hand": {
+            "dermatological_changes_hands": True,
+            "erythema_hand": FromSlot("erythema"),
+            "erythema_palmar": FromSlot("erythema"),
+            "erythema_finger": FromSlot("erythema"),
+            "dermatological_changes_located_on_the_limb": True,
+            "erythema_limb": FromSlot("erythema"),
+        },
+        "Feet": {
+            "dermatological_changes_feet": True,
+            "erythema_toe": FromSlot("erythema"),
+            "pruritus_foot": FromSlot("pruritus"),
+            "dermatological_changes_located_on_the_limb": True,
+            "erythema_limb": FromSlot("erythema"),
+        },
+        "Elsewhere": {"dermatological_changes_upper_lower_extremities": "None"},
+    },
+    "dermatological_changes_location": {
+        "Eyelid": {"dermatological_changes_eyelid": True},
+        "Mouth": {"dermatological_changes_located_in_the_mouth": True},
+        "Head/Face": {"dermatological_changes_located_on_the_face": True, "erythema_facial": FromSlot("erythema")},
+        "Trunk": {"dermatological_changes_trunk": True},
+        "Near a joint": {"dermatological_changes_located_on_the_joint": True, "erythema_of_skin_overlying_a_joint": FromSlot("erythema")},
+        "Scalp": {"dermatological_changes_scalp": True, "pruritus_scalp": FromSlot("pruritus")},
+        # The sex-specific genital slot is added by ValidateSkinForm.
+        "Genitals": {"dermatological_changes_located_in_the_genital_area": True},
+        "other places": {"dermatological_changes_location": "Unknown"},
+    },
+    "pigmentation": {
+        "darken": {"dermatological_changes_hyperpigmentation_of_the_skin": True},
+        "lighten": {"hypopigmentation_of_the_skin": True},
+        "normal skin colour": {},
+    },
+    "joint_pain_location": {
+        "Ankle": {"joint_pain_ankle": True},
+        "Elbow": {"joint_pain_elbow": True},
+        "Big toe": {"joint_pain_hallux": True},
+        "Hip": {"joint_pain_hip": True},
+        "Knee": {"joint_pain_knee": True},
+        "Shoulder": {"joint_pain_shoulder": True},
+        "Thumb": {"joint_pain_thumb": True},
+        "Wrist": {"joint_pain_wrist": True},
+        "Others": {"joint_pain_others": True},
+    },
+    "joint_pain_trauma": {
+        True: {},
+        False: {},
+    },
+    "decreased_hearing_reason": {
+        "Sudden loss of hearing": {"decreased_hearing_sudden_hearing_loss": True},
+        "Slowly losing hearing": {"decreased_hearing_progressive_hearing_loss": True},
+        "Hearing ability changing (changing intensity and duration)": {"decreased_hearing_variable_intensity_and_duration": True},
+        "None of the above": {},
+    },
+    "discharge_from_ear_type": {
+        "Blood": {"discharge_from_ear_bloody": True},
+        "Pus": {"discharge_from_ear_purulent": True},
+        "Others": {"discharge_from_ear_others": True},
+    },
+    "impaired_eye_motion_direction": {
+        "Moving Downwards": {"impaired_downward_eye_motion": True},
+        "Moving Upwards": {"impaired_upward_eye_motion": True},
+        "Moving to the left/right": {"impaired_lateral_eye_motion": True},
+        "Moving back to the centre": {"impaired_medial_eye_motion": True},
+    },
+    "eyelid_twitching": {
+        True: {"eyelid_tremors": True},
+        False: {"eyelid_tremors": False},
+    },
+    "diplopia_lasting_more_than_24_hours": {
+        True: {"diplopia_lasting_up_to_24_hours": False},
+        False: {"diplopia_lasting_up_to_24_hours": True},
+    },
+}
+
+
+def _compile_table(slot: Text, table: Dict[Any, Dict[Text, Any]]) -> Dict[Any, Dict[Text, Any]]:
+    compiled = {}
+    for value, derived in table.items():
+        result = {slot: value}
+        result.update(derived)
+        compiled[value] = result
+    return compiled
+
+
+COMPILED_CHOICES = {slot: _compile_table(slot, table) for slot, table in CHOICE_TABLES.items()}
+
+
+def validate_choice(
+    slot: Text,
+    slot_value: Any,
+    dispatcher: CollectingDispatcher,
+    tracker: Tracker,
+) -> Dict[Text, Any]:
+    try:
+        result = COMPILED_CHOICES[slot].get(slot_value)
+    except TypeError:
+        # Unhashable values (e.g. lists) can never be a valid option.
+        result = None
+    if result is None:
+        dispatcher.utter_message(text=REPROMPT)
+        return {slot: None}
+    result = dict(result)
+    for name, value in result.items():
+        if isinstance(value, FromSlot):
+            result[name] = tracker.slots.get(value.slot)
+    return result
+
+
+class ChoiceValidationMixin:
+    """Resolves ``validate_<slot>`` for every slot in ``CHOICE_TABLES``.
+
+    Hand-written ``validate_<slot>`` methods take precedence, since
+    ``__getattr__`` is only consulted when normal attribute lookup fails.
+    """
+
+    def __getattr__(self, name: Text):
+        if name.startswith("validate_") and name[len("validate_"):] in COMPILED_CHOICES:
+            slot = name[len("validate_"):]
+
+            def validate(slot_value, dispatcher, tracker, domain):
+                return validate_choice(slot, slot_value, dispatcher, tracker)
+
+            return validate
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+
+def check_choice_tables(domain: Dict[Text, Any]) -> List[Text]:
+    """Compare every table with the options the domain actually offers."""
+    problems = []
+    mappings = {}
+    for form in domain.get("forms", {}).values():
+        for slot, slot_mappings in (form.get("required_slots") or {}).items():
+            mappings.setdefault(slot, slot_mappings or [])
+    responses = domain.get("responses", {})
+
+    for slot, table in CHOICE_TABLES.items():
+        intent_values = [m.get("value") for m in mappings.get(slot, []) if m.get("type") == "from_intent"]
+        if intent_values:
+            expected = set(intent_values)
+            source = "intent mappings"
+        else:
+            expected = {
+                button.get("payload")
+                for variation in responses.get("utter_ask_{}".format(slot), [])
+                for button in variation.get("buttons", [])
+            }
+            source = "utter_ask_{} buttons".format(slot)
+        if not expected:
+            problems.append("{}: no buttons or intent mappings found in the domain".format(slot))
+            continue
+        for value in sorted(expected - set(table), key=str):
+            problems.append("{}: {!r} from {} has no table entry".format(slot, value, source))
+        for value in sorted(set(table) - expected, key=str):
+            problems.append("{}: table entry {!r} is not offered by {}".format(slot, value, source))
+    return problems
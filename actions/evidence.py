@@ -0,0 +1,123 @@
+import logging
+import zlib
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Text
+
+from rasa_sdk import Tracker
+from rasa_sdk.events import SlotSet
+
+from actions.evidence_bits import BITSET_SLOTS, unpack
+from actions.infermedica_tables import ANSWER_SLOTS, EVIDENCE_MAP, SYMPTOM_IDS
+from actions.symptoms import chief_complaints
+
+logger = logging.getLogger(__name__)
+
+# Which slots have been answered so far, as "<layout tag>.<mask>" with the
+# mask in hex over ANSWER_SLOTS. The answers themselves are the slots' own
+# values, so a turn only rewrites this short mask and not every answer so far.
+# Derived evidence packed into the per-form bitset slots is kept there instead.
+ANSWERS_SLOT = "answered_slots"
+ANSWER_BITS = MappingProxyType({slot: 1 << position for position, slot in enumerate(ANSWER_SLOTS)})
+ANSWER_TAG = "{:x}".format(zlib.crc32(",".join(ANSWER_SLOTS).encode("utf-8")) & 0xFFFF)
+HISTORY_SLOTS = ("age", "gender", "allergy", "smoking_cigarettes", "hypertension", "diagnosed_diabetes", "high_cholesterol", "high_bmi")
+# Bookkeeping slots that never describe the patient.
+IGNORED_SLOTS = frozenset(("requested_slot", "initial", ANSWERS_SLOT)) | BITSET_SLOTS
+
+
+def _recorded_mask(slots: Dict[Text, Any]) -> int:
+    recorded = slots.get(ANSWERS_SLOT)
+    if isinstance(recorded, str):
+        tag, _, mask = recorded.partition(".")
+        if tag == ANSWER_TAG:
+            try:
+                return int(mask, 16)
+            except ValueError:
+                pass
+    # Conversation started before answers were tracked, or under another
+    # layout (or kept them as a dict): rebuild the mask from the slots once.
+    mask = 0
+    for slot, bit in ANSWER_BITS.items():
+        if slots.get(slot) is not None:
+            mask |= bit
+    return mask
+
+
+def _recorded_answers(slots: Dict[Text, Any]) -> Dict[Text, Any]:
+    """The answered slots and their values, in ANSWER_SLOTS order; O(answers)."""
+    mask = _recorded_mask(slots)
+    answers = {}
+    while mask:
+        bit = mask & -mask
+        slot = ANSWER_SLOTS[bit.bit_length() - 1]
+        value = slots.get(slot)
+        if value is not None:
+            answers[slot] = value
+        mask ^= bit
+    return answers
+
+
+def answers_from_slots(slots: Dict[Text, Any]) -> Dict[Text, Any]:
+    """Every answer so far: the recorded slots, then the packed derived evidence."""
+    answers = _recorded_answers(slots)
+    packed = unpack(slots)
+    if packed:
+        answers.update(packed)
+    return answers
+
+
+def answered_slots(tracker: Tracker) -> Dict[Text, Any]:
+    return answers_from_slots(tracker.slots)
+
+
+def record_answers(tracker: Tracker, events: List[Dict[Text, Any]]) -> Optional[Dict[Text, Any]]:
+    """Fold the ``SlotSet`` events of one turn into the answered-slot mask.
+
+    Returns an event updating ``ANSWERS_SLOT``, or None if the turn set no answer.
+    """
+    mask = None
+    for event in events:
+        if event.get("event") != "slot" or event.get("name") in IGNORED_SLOTS:
+            continue
+        bit = ANSWER_BITS.get(event["name"])
+        if bit is None:
+            logger.warning("%s is not an answer slot; rerun `python -m scripts.build_evidence_map`.", event["name"])
+            continue
+        if mask is None:
+            mask = _recorded_mask(tracker.slots)
+        if event.get("value") is None:
+            mask &= ~bit
+        else:
+            mask |= bit
+    if mask is None:
+        return None
+    return SlotSet(ANSWERS_SLOT, "{}.{:x}".format(ANSWER_TAG, mask))
+
+
+def build_evidence(answers: Dict[Text, Any], initial: Optional[List[Text]] = None) -> List[Dict[Text, Any]]:
+    """Infermedica evidence for the answered slots, in O(answers)."""
+    evidence = []
+    for name in initial or []:
+        symptom_id = SYMPTOM_IDS.get(name)
+        if symptom_id is not None:
+            evidence.append({"id": symptom_id, "choice_id": "present", "source": "initial"})
+    for slot, value in answers.items():
+        entry = EVIDENCE_MAP.get(slot)
+        if entry is None or not isinstance(value, bool):
+            continue
+        evidence_id, kind = entry
+        choice = "present" if value else "absent"
+        if kind == "risk_factor":
+            evidence.append({"id": evidence_id, "choice_id": choice, "source": "predefined"})
+        else:
+            evidence.append({"id": evidence_id, "choice_id": choice})
+    return evidence
+
+
+def evidence_from_slots(slots: Dict[Text, Any], answers: Optional[Dict[Text, Any]] = None) -> List[Dict[Text, Any]]:
+    """The evidence ``action_create_report`` sends for these slot values.
+
+    Pass ``answers`` if ``answers_from_slots(slots)`` is already at hand.
+    """
+    if answers is None:
+        answers = answers_from_slots(slots)
+    return build_evidence(answers, chief_complaints(slots.get("initial")))
@@ -0,0 +1,125 @@
+"""Derived evidence packed into one tri-state bitset slot per form.
+
+Choice answers fan out into derived bool evidence (a "Hand" skin location
+sets ``erythema_hand``, ``erythema_palmar``, ``erythema_finger`` ...). No form
+asks for these, so instead of a domain slot and a ``SlotSet`` event each,
+a form's validator writes them all into ``<form>_evidence``. Each derived
+slot is present, absent or unknown; the value is encoded as
+
+    <layout tag>.<present mask>.<absent mask>        e.g. "3f2a.1c0.2"
+
+with the masks in hex over the form's slot order from ``evidence_map.json``.
+The tag changes with that order, so a value packed under an older layout
+is ignored rather than misread.
+"""
+import logging
+import zlib
+from collections import ChainMap
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Text, Tuple
+
+from rasa_sdk.events import SlotSet
+
+from actions.infermedica_tables import EVIDENCE_BITSETS
+
+logger = logging.getLogger(__name__)
+
+SLOT_SUFFIX = "_evidence"
+
+
+class FormBitset:
+    def __init__(self, form: Text, slots: Tuple[Text, ...]) -> None:
+        self.form = form
+        self.slot_name = form + SLOT_SUFFIX
+        self.slots = slots
+        self.bits = MappingProxyType({slot: 1 << position for position, slot in enumerate(slots)})
+        self.tag = "{:x}".format(zlib.crc32(",".join(slots).encode("utf-8")) & 0xFFFF)
+
+    def masks(self, encoded: Optional[Text]) -> Tuple[int, int]:
+        if not encoded:
+            return 0, 0
+        try:
+            tag, present, absent = encoded.split(".")
+            if tag == self.tag:
+                return int(present, 16), int(absent, 16)
+        except (AttributeError, ValueError):
+            pass
+        logger.warning("Ignoring %s=%r, packed under a different layout.", self.slot_name, encoded)
+        return 0, 0
+
+    def encode(self, present: int, absent: int) -> Text:
+        return "{}.{:x}.{:x}".format(self.tag, present, absent)
+
+    def update(self, encoded: Optional[Text], values: Mapping[Text, Any]) -> Text:
+        """``encoded`` with ``values`` applied; True/False set a slot, anything else clears it."""
+        present, absent = self.masks(encoded)
+        for slot, value in values.items():
+            bit = self.bits[slot]
+            present &= ~bit
+            absent &= ~bit
+            if value is True:
+                present |= bit
+            elif value is False:
+                absent |= bit
+        return self.encode(present, absent)
+
+    def decode(self, encoded: Optional[Text]) -> Dict[Text, bool]:
+        """The known slots, in layout order."""
+        present, absent = self.masks(encoded)
+        known = present | absent
+        if not known:
+            return {}
+        return {slot: bool(present & bit) for slot, bit in self.bits.items() if known & bit}
+
+
+BITSETS = MappingProxyType({form: FormBitset(form, slots) for form, slots in EVIDENCE_BITSETS.items()})
+BITSET_SLOTS = frozenset(bitset.slot_name for bitset in BITSETS.values())
+
+
+def pack_events(form: Text, slots: Mapping[Text, Any], events: List[Dict[Text, Any]]) -> List[Dict[Text, Any]]:
+    """Fold the form's derived evidence ``SlotSet`` events into one bitset event."""
+    bitset = BITSETS.get(form)
+    if bitset is None:
+        return events
+    packed = {}
+    kept = []
+    for event in events:
+        if event.get("event") == "slot" and event.get("name") in bitset.bits:
+            packed[event["name"]] = event.get("value")
+        else:
+            kept.append(event)
+    if not packed:
+        return events
+    # Earlier events of this turn may have set the slot already.
+    encoded = next(
+        (e["value"] for e in reversed(kept) if e.get("event") == "slot" and e.get("name") == bitset.slot_name),
+        slots.get(bitset.slot_name),
+    )
+    kept.append(SlotSet(bitset.slot_name, bitset.update(encoded, packed)))
+    return kept
+
+
+def unpack(slots: Mapping[Text, Any]) -> Dict[Text, bool]:
+    """Derived evidence from every form's bitset slot."""
+    values = {}
+    for bitset in BITSETS.values():
+        encoded = slots.get(bitset.slot_name)
+        if encoded:
+            values.update(bitset.decode(encoded))
+    return values
+
+
+def form_view(form: Text, slots: Mapping[Text, Any]) -> Mapping[Text, Any]:
+    """``slots`` with the form's packed evidence readable as ordinary slots.
+
+    Plain values set earlier in the same turn (before packing) win.
+    """
+    bitset = BITSETS.get(form)
+    if bitset is None:
+        return slots
+    values = bitset.decode(slots.get(bitset.slot_name))
+    for slot in bitset.slots:
+        value = slots.get(slot)
+        if value is not None:
+            values[slot] = value
+    return ChainMap(values, slots) if values else slots
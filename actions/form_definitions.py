@@ -0,0 +1,449 @@
+# Slot order and skip rules for every form, compiled once by
+# ``actions.form_engine``. A rule is active when all of its ``when`` tests
+# pass; its ``skip`` slots are then left out of the form. Tests are either a
+# bare value (equality) or one of {"eq": v}, {"ne": v}, {"in": [...]},
+# {"not_in": [...]}. Rules may overlap freely. ``derived`` lists evidence a
+# form's hand-written validators set besides the choice tables; it is packed
+# with the rest of the form's derived evidence (see ``actions.evidence_bits``).
+
+FEVER_SLOTS = ["fever_between_37_and_38", "fever_between_38_and_40", "fever_greater_than_40"]
+
+JOINT_MOVEMENT_SLOTS = [
+    "joint_pain_during_ankle_movement",
+    "joint_pain_during_elbow_movement",
+    "joint_pain_during_hip_movement",
+    "joint_pain_during_knee_movement",
+    "joint_pain_during_shoulder_movement",
+    "joint_pain_during_thumb_movement",
+    "joint_pain_during_wrist_movement",
+]
+
+
+def _other_joint_movements(joint):
+    return [s for s in JOINT_MOVEMENT_SLOTS if s != "joint_pain_during_{}_movement".format(joint)]
+
+
+FORM_DEFINITIONS = {
+    "history_taking_form": {
+        "slots": [
+            "age",
+            "gender",
+            "allergies",
+            "allergy",
+            "smoking_cigarettes",
+            "hypertension",
+            "diagnosed_diabetes",
+            "high_cholesterol",
+            "high_bmi",
+        ],
+        "rules": [
+            # Only ask what allergies the user has if they have any.
+            {"when": {"allergies": False}, "skip": ["allergy"]},
+        ],
+    },
+    "abdominal_pain_form": {
+        "slots": [
+            "abdominal_pain",
+            "abdominal_pain_type",
+            "abdominal_pain_location",
+            "abdominal_pain_duration",
+            "abdominal_pain_onset",
+            "abdominal_pain_scale",
+            "abdominal_tenderness",
+            "abdominal_tenderness_location",
+            "abdominal_pain_postprandial",
+            "abdominal_pain_premenstrual",
+            "abdominal_pain_exacerbation",
+            "bloating",
+            "abdominal_mass",
+            "fever",
+            "temperature",
+            "diarrhea",
+            "diarrhea_duration",
+            "constipation",
+            "nausea",
+            "vomiting",
+            "vomiting_duration",
+            "vomiting_every_time_after_meal",
+            "vomiting_more_often_in_the_morning",
+            "diminished_appetite",
+            "stools",
+            "painful_defecation",
+            "bleeding_from_anus",
+            "bleeding_from_anus_scale",
+            "blood_in_urine",
+            "pain_while_urinating",
+        ],
+        "rules": [
+            {"when": {"abdominal_pain": False}, "skip": [
+                "abdominal_pain_type",
+                "abdominal_pain_location",
+                "abdominal_pain_duration",
+                "abdominal_pain_onset",
+                "abdominal_pain_scale",
+                "abdominal_tenderness",
+                "abdominal_tenderness_location",
+                "abdominal_pain_postprandial",
+                "abdominal_pain_premenstrual",
+            ]},
+            {"when": {"abdominal_tenderness": False}, "skip": ["abdominal_tenderness_location"]},
+            {"when": {"gender": "male"}, "skip": ["abdominal_pain_premenstrual"]},
+            {"when": {"fever": False}, "skip": ["temperature"]},
+            {"when": {"diarrhea": False}, "skip": ["diarrhea_duration"]},
+            {"when": {"vomiting": False}, "skip": [
+                "vomiting_duration",
+                "vomiting_every_time_after_meal",
+                "vomiting_more_often_in_the_morning",
+            ]},
+            {"when": {"stools": "Normal"}, "skip": [
+                "painful_defecation",
+                "bleeding_from_anus",
+                "bleeding_from_anus_scale",
+            ]},
+        ],
+        "derived": FEVER_SLOTS,
+    },
+    "urti_form": {
+        "slots": [
+            "fever",
+            "temperature",
+            "cough",
+            "cough_duration",
+            "cough_productive",
+            "hemoptysis",
+            "cough_productive_color",
+            "cough_nocturnal",
+            "cough_paroxysmal",
+            "nasal_catarrh",
+            "nasal_congestion",
+            "nasal_congestion_chronic",
+            "facial_pain",
+            "facial_pain_paranasal_sinus",
+            "facial_pain_longer_than_a_couple_of_hours",
+            "pharyngeal_pain",
+            "fatigue",
+            "dyspnea",
+            "dyspnea_severity",
+            "dyspnea_duration",
+            "dyspnea_orthopnea",
+            "chest_pain",
+            "chest_pain_type",
+            "chest_pain_duration",
+            "chest_pain_exacerbated_by_stress",
+            "chest_pain_during_exertion",
+            "chest_pain_exacerbating_with_deep_breath_or_cough",
+            "chest_pain_exacerbating_when_lying_down",
+            "chest_pain_radiating",
+        ],
+        "rules": [
+            {"when": {"fever": False}, "skip": ["temperature"]},
+            {"when": {"cough": False}, "skip": [
+                "cough_duration",
+                "cough_productive",
+                "hemoptysis",
+                "cough_productive_color",
+                "cough_nocturnal",
+                "cough_paroxysmal",
+            ]},
+            {"when": {"cough_productive": False}, "skip": ["cough_productive_color"]},
+            {"when": {"nasal_congestion": False}, "skip": ["nasal_congestion_chronic"]},
+            {"when": {"facial_pain": False}, "skip": [
+                "facial_pain_paranasal_sinus",
+                "facial_pain_longer_than_a_couple_of_hours",
+            ]},
+            {"when": {"dyspnea": False}, "skip": [
+                "dyspnea_severity",
+                "dyspnea_duration",
+                "dyspnea_orthopnea",
+            ]},
+            {"when": {"chest_pain": False}, "skip": [
+                "chest_pain_type",
+                "chest_pain_duration",
+                "chest_pain_exacerbated_by_stress",
+                "chest_pain_during_exertion",
+                "chest_pain_exacerbating_with_deep_breath_or_cough",
+                "chest_pain_exacerbating_when_lying_down",
+                "chest_pain_radiating",
+            ]},
+        ],
+        "derived": FEVER_SLOTS,
+    },
+    "back_pain_form": {
+        "slots": [
+            "back_pain",
+            "back_pain_location",
+            "back_pain_exacerbated_by_physical_exertion",
+            "back_pain_scale",
+            "back_pain_lumbar_radiates_to_back_of_the_thigh",
+            "back_pain_lumbar_radiating_to_the_groin",
+            "flank_pain",
+            "buttocks_pain",
+            "neck_pain",
+            "back_pain_sudden",
+            "back_pain_lasting_several_hours",
+            "back_pain_improves_with_rest",
+            "back_pain_recurrent",
+        ],
+        "rules": [
+            {"when": {"back_pain_lumbar": False}, "skip": [
+                "back_pain_lumbar_radiates_to_back_of_the_thigh",
+                "back_pain_lumbar_radiating_to_the_groin",
+            ]},
+        ],
+    },
+    "breast_pain_form": {
+        "slots": [
+            "breast_pain",
+            "abnormal_breast_size",
+            "breast_asymmetry_in_size_or_shape",
+            "nodule_located_in_breast",
+            "nipple_discharge",
+            "retraction_or_indentation_of_nipple",
+            "symptoms_regularly_appear_a_few_days_before_menstrual_period",
+        ],
+        "rules": [],
+    },
+    "headache_form": {
+        "slots": [
+            "headache",
+            "headache_chronic",
+            "chronic_headache_duration",
+            "recent_headache_duration",
+            "headache_type",
+            "headache_exacerbating_by_tilting_head_forward",
+            "headache_exacerbating_in_the_morning",
+            "headache_location",
+            "headache_unilateral",
+            "headache_pain_level",
+            "headache_occipital",
+            "headache_sudden_onset",
+            "dizziness",
+            "dizziness_head_rotation",
+            "dizziness_vertigo",
+            "impaired_balance_while_walking",
+            "orthostatic_hypotension",
+            "fever",
+            "temperature",
+            "nasal_catarrh",
+            "facial_pain",
+            "facial_pain_paranasal_sinus",
+            "impaired_memory",
+            "impaired_memory_finding_objects_of_everyday_use",
+            "impaired_memory_short_term",
+            "tinnitus",
+            "neck_pain",
+            "stiff_neck",
+            "neck_pain_unilateral",
+            "redness_on_shoulders_and_nape_of_neck",
+            "pain_near_eye_socket",
+            "tremors",
+            "nausea",
+            "vomiting",
+            "vomiting_duration",
+            "vomiting_every_time_after_meal",
+            "vomiting_more_often_in_the_morning",
+        ],
+        "rules": [
+            {"when": {"headache": False}, "skip": [
+                "headache_chronic",
+                "chronic_headache_duration",
+                "recent_headache_duration",
+                "headache_type",
+                "headache_exacerbating_by_tilting_head_forward",
+                "headache_exacerbating_in_the_morning",
+                "headache_location",
+                "headache_pain_level",
+                "headache_occipital",
+                "headache_unilateral",
+                "headache_sudden_onset",
+            ]},
+            {"when": {"headache_chronic": True}, "skip": ["recent_headache_duration"]},
+            {"when": {"headache_chronic": False}, "skip": ["chronic_headache_duration"]},
+            {"when": {"dizziness": False}, "skip": [
+                "dizziness_head_rotation",
+                "dizziness_vertigo",
+                "impaired_balance_while_walking",
+            ]},
+            {"when": {"fever": False}, "skip": ["temperature"]},
+            {"when": {"nasal_catarrh": False}, "skip": ["facial_pain", "facial_pain_paranasal_sinus"]},
+            {"when": {"impaired_memory": False}, "skip": [
+                "impaired_memory_finding_objects_of_everyday_use",
+                "impaired_memory_short_term",
+            ]},
+            {"when": {"neck_pain": False}, "skip": ["neck_pain_unilateral"]},
+            {"when": {"vomiting": False}, "skip": [
+                "vomiting_duration",
+                "vomiting_every_time_after_meal",
+                "vomiting_more_often_in_the_morning",
+            ]},
+        ],
+        "derived": FEVER_SLOTS,
+    },
+    "skin_form": {
+        "slots": [
+            "dermatological_changes",
+            "erythema",
+            "pruritus",
+            "dermatological_flare_ups_reason",
+            "dermatological_changes_entire_skin",
+            "dermatological_changes_upper_lower_extremities",
+            "dermatological_changes_location",
+            "pigmentation",
+            "dermatological_changes_painful",
+            "skin_pain_severe",
+            "dermatological_changes_localization_near_sebaceous_glands",
+            "dermatological_changes_located_in_genital_area_chancre",
+            "erythema_foreskin_or_head_of_the_penis",
+            "erythema_vulva",
+            "dermatological_changes_preceded_by_pain_or_itching",
+            "dermatological_changes_recurring_during_infections_or_menstrual_period",
+            "dermatological_changes_rough_and_irregular_surface",
+            "dermatological_changes_scabs",
+            "erythema_and_scaling_on_large_portion_of_body",
+            "erythema_facial_butterfly_shaped",
+            "erythema_limb_hot_to_the_touch",
+            "pruritus_aggravated_by_change_in_temperature_sweating_or_wearing_wool",
+            "pruritus_most_intense_at_night",
+            "leopard_like_spots_on_the_skin",
+            "skin_and_blood_vessel_inflammation",
+            "skin_desquamation",
+            "skin_mass",
+            "skin_mass_greater_than_1_cm_in_diameter",
+            "skin_mass_bleeding",
+            "skin_mole_or_birthmark_with_irregular_border",
+            "skin_thickening",
+        ],
+        "rules": [
+            {"when": {"dermatological_changes_entire_skin": True}, "skip": [
+                "dermatological_changes_upper_lower_extremities",
+                "dermatological_changes_location",
+            ]},
+            {"when": {"dermatological_changes_scalp": {"ne": True}}, "skip": [
+                "dermatological_changes_localization_near_sebaceous_glands",
+            ]},
+            {"when": {"dermatological_changes_located_in_the_genital_area": {"ne": True}}, "skip": [
+                "erythema_foreskin_or_head_of_the_penis",
+                "dermatological_changes_located_in_genital_area_chancre",
+                "erythema_vulva",
+            ]},
+            {"when": {"dermatological_changes_located_in_the_genital_area": True, "gender": "male"},
+             "skip": ["erythema_vulva"]},
+            {"when": {"dermatological_changes_located_in_the_genital_area": True, "gender": "female"},
+             "skip": ["erythema_foreskin_or_head_of_the_penis"]},
+            {"when": {"gender": "male"}, "skip": [
+                "dermatological_changes_recurring_during_infections_or_menstrual_period",
+            ]},
+            {"when": {"dermatological_changes_located_on_the_face": {"ne": True}}, "skip": [
+                "erythema_facial_butterfly_shaped",
+            ]},
+            {"when": {"dermatological_changes_located_on_the_limb": {"ne": True}}, "skip": [
+                "erythema_limb_hot_to_the_touch",
+            ]},
+            {"when": {"pruritus": False}, "skip": [
+                "pruritus_aggravated_by_change_in_temperature_sweating_or_wearing_wool",
+                "pruritus_most_intense_at_night",
+            ]},
+            {"when": {"skin_mass": False}, "skip": [
+                "skin_mass_bleeding",
+                "skin_mass_greater_than_1_cm_in_diameter",
+            ]},
+            {"when": {"dermatological_changes_painful": False}, "skip": ["skin_pain_severe"]},
+            # A limb was picked, so there is no need to ask for another location.
+            {"when": {"dermatological_changes_upper_lower_extremities": {"not_in": ["None", None]}},
+             "skip": ["dermatological_changes_location"]},
+        ],
+        "derived": ["dermatological_changes_male_genital_area", "dermatological_changes_female_genital_area"],
+    },
+    "joint_form": {
+        "slots": [
+            "joint_pain_location",
+            *JOINT_MOVEMENT_SLOTS,
+            "joint_pain_sudden",
+            "joint_pain_trauma",
+            "joint_deformation_posttraumatic",
+            "joint_deformation_nontraumatic",
+            "joint_pain_aggravated_during_cold_damp_weather",
+            "joint_pain_during_movement_in_the_morning",
+            "joint_pain_tenderness",
+            "joint_stiffness",
+        ],
+        "rules": [
+            {"when": {"joint_pain_ankle": True}, "skip": _other_joint_movements("ankle")},
+            {"when": {"joint_pain_elbow": True}, "skip": _other_joint_movements("elbow")},
+            {"when": {"joint_pain_hallux": True}, "skip": JOINT_MOVEMENT_SLOTS},
+            {"when": {"joint_pain_hip": True}, "skip": _other_joint_movements("hip")},
+            {"when": {"joint_pain_knee": True}, "skip": _other_joint_movements("knee")},
+            {"when": {"joint_pain_shoulder": True}, "skip": _other_joint_movements("shoulder")},
+            {"when": {"joint_pain_thumb": True}, "skip": _other_joint_movements("thumb")},
+            {"when": {"joint_pain_wrist": True}, "skip": _other_joint_movements("wrist")},
+            {"when": {"joint_pain_others": True}, "skip": JOINT_MOVEMENT_SLOTS},
+            {"when": {"joint_pain_trauma": True}, "skip": ["joint_deformation_nontraumatic"]},
+            {"when": {"joint_pain_trauma": False}, "skip": ["joint_deformation_posttraumatic"]},
+        ],
+    },
+    "ear_form": {
+        "slots": [
+            "earache",
+            "clogged_ear",
+            "decreased_hearing",
+            "decreased_hearing_reason",
+            "discharge_from_ear",
+            "discharge_from_ear_type",
+            "ear_canal_swelling",
+            "itching_in_ear",
+            "tinnitus",
+            "dizziness",
+            "numbness_of_part_of_ear",
+            "pain_behind_ear",
+            "pain_increases_when_touching_ear_area",
+            "redness_behind_the_ear",
+        ],
+        "rules": [
+            {"when": {"decreased_hearing": False}, "skip": ["decreased_hearing_reason"]},
+            {"when": {"discharge_from_ear": False}, "skip": ["discharge_from_ear_type"]},
+            {"when": {"earache": False}, "skip": ["pain_increases_when_touching_ear_area", "pain_behind_ear"]},
+        ],
+    },
+    "eye_form": {
+        "slots": [
+            "eye_pain",
+            "eye_pain_unbearable",
+            "red_eye",
+            "eyes_sensitive_to_light",
+            "impaired_vision",
+            "decreased_visual_acuity",
+            "impaired_vision_in_one_eye",
+            "diplopia",
+            "diplopia_lasting_more_than_24_hours",
+            "difficulty_completely_closing_one_eye",
+            "impaired_eye_motion",
+            "impaired_eye_motion_direction",
+            "diminished_eye_motility_in_the_same_direction",
+            "dry_eye",
+            "dry_discharge_on_eyelids",
+            "eye_flashes",
+            "lens_clouding",
+            "eyelid_lesion",
+            "eyelid_lesion_painful",
+            "eyelid_lesion_red_and_warm",
+            "eyelid_lesion_red_lump_with_yellow_tip",
+            "stinging_eyes_and_feeling_of_sand_under_eyelids",
+            "itching_of_eyes",
+            "pain_near_eye_socket",
+            "sunken_eyeballs",
+            "thick_eye_discharge",
+            "weak_eye_clenching",
+        ],
+        "rules": [
+            {"when": {"eye_pain": False}, "skip": ["eye_pain_unbearable"]},
+            {"when": {"impaired_vision": False}, "skip": ["impaired_vision_in_one_eye"]},
+            {"when": {"diplopia": False}, "skip": ["diplopia_lasting_more_than_24_hours"]},
+            {"when": {"impaired_eye_motion": False}, "skip": ["impaired_eye_motion_direction"]},
+            {"when": {"eyelid_lesion": False}, "skip": [
+                "eyelid_lesion_painful",
+                "eyelid_lesion_red_and_warm",
+                "eyelid_lesion_red_lump_with_yellow_tip",
+            ]},
+        ],
+    },
+}
@@ -0,0 +1,179 @@
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Text, Tuple
+
+from rasa_sdk import Tracker, FormValidationAction
+from rasa_sdk.events import EventType
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.choices import ChoiceValidationMixin
+from actions.evidence import answered_slots, answers_from_slots, evidence_from_slots, record_answers
+from actions.evidence_bits import form_view, pack_events
+from actions.form_definitions import FORM_DEFINITIONS
+from actions.metrics import observe_action
+from actions.prefetch import prefetcher
+from actions.tracing import span, trace_action
+
+# Conversations whose last evaluation is remembered per form.
+MAX_TRACKED_CONVERSATIONS = 10000
+
+Predicate = Callable[[Any], bool]
+
+
+def compile_test(test: Any) -> Predicate:
+    # A bare value means equality; a dict selects one of the other operators.
+    if not isinstance(test, dict):
+        return lambda value: value == test
+    (op, operand), = test.items()
+    if op == "eq":
+        return lambda value: value == operand
+    if op == "ne":
+        return lambda value: value != operand
+    if op == "in":
+        return lambda value: value in operand
+    if op == "not_in":
+        return lambda value: value not in operand
+    raise ValueError("Unknown condition operator '{}'".format(op))
+
+
+class SkipRule:
+    def __init__(self, when: Dict[Text, Any], skip: List[Text]) -> None:
+        self.controllers = tuple(when)
+        self.tests = tuple((slot, compile_test(test)) for slot, test in when.items())
+        self.skip = frozenset(skip)
+
+    def is_active(self, slots: Dict[Text, Any]) -> bool:
+        return all(test(slots.get(slot)) for slot, test in self.tests)
+
+
+class FormState:
+    __slots__ = ("values", "active", "required")
+
+    def __init__(self, values: Tuple[Any, ...], active: FrozenSet[int], required: Tuple[Text, ...]) -> None:
+        self.values = values
+        self.active = active
+        self.required = required
+
+
+class CompiledForm:
+    """Slot order plus skip rules, compiled into a controller -> rule graph.
+
+    Each call only re-evaluates the rules whose controlling slots changed
+    since the previous call for the same conversation.
+    """
+
+    def __init__(self, name: Text, definition: Dict[Text, Any]) -> None:
+        self.name = name
+        self.slot_order = tuple(definition["slots"])
+        self.rules = [SkipRule(rule["when"], rule["skip"]) for rule in definition.get("rules", [])]
+
+        unknown = {s for rule in self.rules for s in rule.skip} - set(self.slot_order)
+        if unknown:
+            raise ValueError("Form '{}' skips slots it does not ask: {}".format(name, sorted(unknown)))
+
+        dependents = OrderedDict()
+        for index, rule in enumerate(self.rules):
+            for slot in rule.controllers:
+                dependents.setdefault(slot, []).append(index)
+        self.controllers = tuple(dependents)
+        self.dependents = tuple(tuple(dependents[slot]) for slot in self.controllers)
+        self._states = OrderedDict()
+
+    def _required(self, active: FrozenSet[int]) -> Tuple[Text, ...]:
+        skipped = set()
+        for index in active:
+            skipped |= self.rules[index].skip
+        return tuple(slot for slot in self.slot_order if slot not in skipped)
+
+    def evaluate(self, slots: Dict[Text, Any], previous: Optional[FormState] = None) -> FormState:
+        values = tuple(slots.get(slot) for slot in self.controllers)
+        if previous is None:
+            dirty = range(len(self.rules))
+            active = set()
+        else:
+            if values == previous.values:
+                return previous
+            dirty = set()
+            for position, value in enumerate(values):
+                if value != previous.values[position]:
+                    dirty.update(self.dependents[position])
+            active = set(previous.active)
+
+        for index in dirty:
+            if self.rules[index].is_active(slots):
+                active.add(index)
+            else:
+                active.discard(index)
+        active = frozenset(active)
+
+        if previous is not None and active == previous.active:
+            return FormState(values, active, previous.required)
+        return FormState(values, active, self._required(active))
+
+    def required_slots(self, tracker: Tracker) -> List[Text]:
+        key = tracker.sender_id
+        state = self.evaluate(form_view(self.name, tracker.slots), self._states.pop(key, None))
+        self._states[key] = state
+        if len(self._states) > MAX_TRACKED_CONVERSATIONS:
+            self._states.popitem(last=False)
+        return list(state.required)
+
+
+def compile_forms(definitions: Dict[Text, Dict[Text, Any]]) -> Dict[Text, CompiledForm]:
+    return {name: CompiledForm(name, definition) for name, definition in definitions.items()}
+
+
+COMPILED_FORMS = compile_forms(FORM_DEFINITIONS)
+
+
+class DeclarativeFormValidationAction(ChoiceValidationMixin, FormValidationAction):
+    """Form validator whose ``required_slots`` come from ``FORM_DEFINITIONS``.
+
+    Choice slots are validated from ``CHOICE_TABLES``; subclasses only provide
+    ``name`` and validators for free-form slots such as ``temperature``. Every
+    validated slot is also folded into the running ``answered_slots`` record
+    (derived evidence into the form's bitset slot, see ``actions.evidence_bits``),
+    and a speculative report request may be started (see ``actions.prefetch``).
+    """
+
+    @abstractmethod
+    def name(self) -> Text:
+        raise NotImplementedError("An action must implement a name")
+
+    async def required_slots(
+        self,
+        slots_mapped_in_domain: List[Text],
+        dispatcher: "CollectingDispatcher",
+        tracker: "Tracker",
+        domain: "DomainDict",
+    ) -> List[Text]:
+        return COMPILED_FORMS[self.form_name()].required_slots(tracker)
+
+    @observe_action
+    @trace_action
+    async def run(
+        self,
+        dispatcher: "CollectingDispatcher",
+        tracker: "Tracker",
+        domain: "DomainDict",
+    ) -> List[EventType]:
+        with span("validate"):
+            events = await super().run(dispatcher, tracker, domain)
+        with span("record_answers"):
+            events = pack_events(self.form_name(), tracker.slots, events)
+            answers_event = record_answers(tracker, events)
+        if answers_event is not None:
+            events.append(answers_event)
+            with span("prefetch"):
+                self._prefetch(tracker, events)
+        return events
+
+    def _prefetch(self, tracker: "Tracker", events: List[EventType]) -> None:
+        slots = dict(tracker.slots)
+        slots.update((e["name"], e.get("value")) for e in events if e.get("event") == "slot")
+        answers = answers_from_slots(slots)
+        required = COMPILED_FORMS[self.form_name()].evaluate(form_view(self.form_name(), slots)).required
+        completed = all(slots.get(slot) is not None for slot in required)
+        if prefetcher.should_prefetch(completed, len(answered_slots(tracker)), len(answers)):
+            evidence = evidence_from_slots(slots, answers)
+            prefetcher.schedule(tracker.sender_id, evidence, slots.get("gender"), slots.get("age"))
@@ -0,0 +1,293 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+import aiohttp
+
+from actions.metrics import INFERMEDICA_ERRORS, INFERMEDICA_HEDGES, INFERMEDICA_LATENCY, REGISTRY, CallbackGauge
+from actions.tracing import span
+
+INFERMEDICA_URL = os.environ.get("INFERMEDICA_URL", "https://api.infermedica.com/v3/")
+INFERMEDICA_APP_ID = os.environ.get("INFERMEDICA_APP_ID", "fb1de113")
+INFERMEDICA_APP_KEY = os.environ.get("INFERMEDICA_APP_KEY", "97e9474d5049b2f276da86e8d16c1f6b")
+# Seconds allowed for a single diagnosis or triage call.
+INFERMEDICA_TIMEOUT = float(os.environ.get("INFERMEDICA_TIMEOUT", "10"))
+# Keep-alive connections held open to the API host.
+INFERMEDICA_POOL_SIZE = int(os.environ.get("INFERMEDICA_POOL_SIZE", "20"))
+# Seconds a whole report (both calls, hedges and retries) may take.
+INFERMEDICA_BUDGET = float(os.environ.get("INFERMEDICA_BUDGET", "5"))
+# Attempts per call, counting hedges and retries.
+INFERMEDICA_MAX_ATTEMPTS = int(os.environ.get("INFERMEDICA_MAX_ATTEMPTS", "3"))
+# A call still running past this percentile of recent latencies is hedged.
+INFERMEDICA_HEDGE_PERCENTILE = float(os.environ.get("INFERMEDICA_HEDGE_PERCENTILE", "0.95"))
+# Hedge delay used until enough latencies have been seen.
+INFERMEDICA_HEDGE_DELAY = float(os.environ.get("INFERMEDICA_HEDGE_DELAY", "1.0"))
+# Consecutive failed calls that open the circuit, and seconds it stays open.
+INFERMEDICA_BREAKER_FAILURES = int(os.environ.get("INFERMEDICA_BREAKER_FAILURES", "5"))
+INFERMEDICA_BREAKER_RESET = float(os.environ.get("INFERMEDICA_BREAKER_RESET", "30"))
+
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class InfermedicaError(Exception):
+    def __init__(self, endpoint: Text, message: Text, status: Optional[int] = None):
+        super().__init__("Infermedica /{} failed: {}".format(endpoint, message))
+        self.endpoint = endpoint
+        self.status = status
+
+
+def _consume(task: asyncio.Future) -> None:
+    # Losing and cancelled attempts may still end in an error nobody awaits.
+    if not task.cancelled():
+        task.exception()
+
+
+def _retryable(error: InfermedicaError) -> bool:
+    # Timeouts, connection errors, throttling and server errors; a 4xx means
+    # the request itself is wrong and would fail again.
+    return error.status is None or error.status == 429 or error.status >= 500
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls to one endpoint."""
+
+    def __init__(self, size: int = LATENCY_WINDOW) -> None:
+        self.samples = deque(maxlen=size)
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def percentile(self, q: float, default: float) -> float:
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Fails calls fast after repeated failures.
+
+    After ``failures`` consecutive failed calls the circuit opens for
+    ``reset_after`` seconds; then a single trial call is let through, and
+    its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, failures: int = INFERMEDICA_BREAKER_FAILURES, reset_after: float = INFERMEDICA_BREAKER_RESET) -> None:
+        self.failures = failures
+        self.reset_after = reset_after
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> Text:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half_open":
+            # Let one trial through and hold everyone else back meanwhile.
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.opened_at is not None or self.consecutive_failures >= self.failures:
+            self.opened_at = time.monotonic()
+
+
+class InfermedicaClient:
+    """Async Infermedica v3 client sharing one pooled keep-alive session.
+
+    Every report runs under a deadline: a call still running past the
+    recent latency percentile is hedged with a second request, failed calls
+    are retried while the budget lasts, and a circuit breaker fails calls
+    fast while the API is down.
+    """
+
+    def __init__(
+        self,
+        base_url: Text = INFERMEDICA_URL,
+        app_id: Text = INFERMEDICA_APP_ID,
+        app_key: Text = INFERMEDICA_APP_KEY,
+        timeout: float = INFERMEDICA_TIMEOUT,
+        pool_size: int = INFERMEDICA_POOL_SIZE,
+        budget: float = INFERMEDICA_BUDGET,
+        max_attempts: int = INFERMEDICA_MAX_ATTEMPTS,
+    ) -> None:
+        self.base_url = base_url.rstrip("/") + "/"
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.breaker = CircuitBreaker()
+        self.latencies = {}
+        self.headers = {
+            "Accept": "application/json",
+            "App-Id": app_id,
+            "App-Key": app_key,
+        }
+        self._session = None
+        self._loop = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # A session is bound to the loop it was created in, so build it lazily
+        # inside the server's loop and rebuild it if that loop ever changes.
+        loop = asyncio.get_event_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+            self._loop = loop
+        return self._session
+
+    async def _post(self, endpoint: Text, data: Dict[Text, Any], timeout: Optional[float] = None) -> Dict[Text, Any]:
+        started = time.perf_counter()
+        try:
+            with span("infermedica." + endpoint):
+                result = await self._send(endpoint, data, timeout)
+        except InfermedicaError as e:
+            INFERMEDICA_ERRORS.inc(endpoint, str(e.status or "none"))
+            raise
+        finally:
+            INFERMEDICA_LATENCY.observe(time.perf_counter() - started, endpoint)
+        self.latencies.setdefault(endpoint, LatencyWindow()).add(time.perf_counter() - started)
+        return result
+
+    def hedge_delay(self, endpoint: Text) -> float:
+        window = self.latencies.get(endpoint)
+        if window is None:
+            return INFERMEDICA_HEDGE_DELAY
+        return window.percentile(INFERMEDICA_HEDGE_PERCENTILE, INFERMEDICA_HEDGE_DELAY)
+
+    async def _call(self, endpoint: Text, data: Dict[Text, Any], deadline: float, admitted: bool = False) -> Dict[Text, Any]:
+        """POST with hedging and retries until ``deadline`` (event-loop time).
+
+        ``admitted`` calls were already let through the circuit breaker.
+        """
+        if not admitted and not self.breaker.allow():
+            raise InfermedicaError(endpoint, "circuit open")
+        loop = asyncio.get_event_loop()
+        attempts = []
+        pending = set()
+        launched = 0
+        error = None
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise InfermedicaError(endpoint, "report budget exhausted") from error
+                if not pending:
+                    if launched >= self.max_attempts:
+                        raise error
+                    pending.add(self._attempt(attempts, endpoint, data, remaining))
+                    launched += 1
+                can_hedge = launched < self.max_attempts
+                wait = min(remaining, self.hedge_delay(endpoint)) if can_hedge else remaining
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except InfermedicaError as e:
+                        error = e
+                        if not _retryable(e):
+                            raise
+                    else:
+                        self.breaker.record_success()
+                        return result
+                if not done and can_hedge and loop.time() < deadline:
+                    INFERMEDICA_HEDGES.inc(endpoint)
+                    remaining = deadline - loop.time()
+                    pending.add(self._attempt(attempts, endpoint, data, remaining))
+                    launched += 1
+        except InfermedicaError:
+            self.breaker.record_failure()
+            raise
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def _attempt(self, attempts: List[asyncio.Future], endpoint: Text, data: Dict[Text, Any], remaining: float) -> asyncio.Future:
+        task = asyncio.ensure_future(self._post(endpoint, data, min(remaining, self.timeout)))
+        task.add_done_callback(_consume)
+        attempts.append(task)
+        return task
+
+    async def _send(self, endpoint: Text, data: Dict[Text, Any], timeout: Optional[float]) -> Dict[Text, Any]:
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        try:
+            async with session.post(self.base_url + endpoint, json=data, timeout=client_timeout) as resp:
+                if resp.status >= 400:
+                    raise InfermedicaError(endpoint, await resp.text(), status=resp.status)
+                result = await resp.json(content_type=None)
+        except asyncio.TimeoutError as e:
+            raise InfermedicaError(endpoint, "timed out") from e
+        except aiohttp.ClientError as e:
+            raise InfermedicaError(endpoint, str(e)) from e
+        except ValueError as e:
+            # An HTML error page or a truncated body from a proxy.
+            raise InfermedicaError(endpoint, "invalid JSON response: {}".format(e)) from e
+        if not isinstance(result, dict):
+            raise InfermedicaError(endpoint, "unexpected response: {!r}".format(result)[:200])
+        return result
+
+    @staticmethod
+    def diagnostic_data(evidence: List[Dict[Text, Any]], sex: Text, age: Any) -> Dict[Text, Any]:
+        return {"sex": sex, "age": {"value": age}, "evidence": evidence}
+
+    def deadline(self, budget: Optional[float] = None) -> float:
+        return asyncio.get_event_loop().time() + (budget or self.budget)
+
+    async def diagnosis(self, evidence, sex, age, deadline: Optional[float] = None) -> Dict[Text, Any]:
+        return await self._call("diagnosis", self.diagnostic_data(evidence, sex, age), deadline or self.deadline())
+
+    async def triage(self, evidence, sex, age, deadline: Optional[float] = None) -> Dict[Text, Any]:
+        return await self._call("triage", self.diagnostic_data(evidence, sex, age), deadline or self.deadline())
+
+    async def diagnosis_and_triage(
+        self, evidence, sex, age, deadline: Optional[float] = None
+    ) -> Tuple[Dict[Text, Any], Dict[Text, Any]]:
+        """Issue both calls concurrently so a report costs about one round trip.
+
+        The pair passes the circuit breaker once, so a half-open circuit's
+        trial covers both calls.
+        """
+        if not self.breaker.allow():
+            raise InfermedicaError("diagnosis", "circuit open")
+        deadline = deadline or self.deadline()
+        data = self.diagnostic_data(evidence, sex, age)
+        results = await asyncio.gather(
+            self._call("diagnosis", data, deadline, admitted=True),
+            self._call("triage", data, deadline, admitted=True),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results[0], results[1]
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Shared by every action in the process.
+client = InfermedicaClient()
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+REGISTRY.register(CallbackGauge(
+    "infermedica_circuit_state", "Circuit breaker state: 0 closed, 1 half open, 2 open.",
+    lambda: BREAKER_STATES[client.breaker.state],
+))
@@ -0,0 +1,70 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Text
+
+logger = logging.getLogger(__name__)
+
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+SYMPTOM_TABLE = "infermedica_symptom_list.csv"
+RISK_FACTOR_TABLE = "infermedica_risk_factors.csv"
+# Generated by ``python -m scripts.build_evidence_map``.
+EVIDENCE_MAP_PATH = os.path.join(TABLE_DIR, "evidence_map.json")
+
+
+def table_digest(filename: Text) -> Text:
+    with open(os.path.join(TABLE_DIR, filename), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _load_index(filename: Text, name_column: Text, id_column: Text) -> Mapping[Text, Text]:
+    # First occurrence wins, same as the old ``.loc[...].iloc[0]`` lookup.
+    index = {}
+    with open(os.path.join(TABLE_DIR, filename), newline="") as f:
+        for row in csv.DictReader(f):
+            index.setdefault(row[name_column], row[id_column])
+    return MappingProxyType(index)
+
+
+def _load_artifact() -> Dict[Text, Any]:
+    with open(EVIDENCE_MAP_PATH) as f:
+        artifact = json.load(f)
+    if (
+        artifact.get("symptom_table_sha1") != table_digest(SYMPTOM_TABLE)
+        or artifact.get("risk_factor_table_sha1") != table_digest(RISK_FACTOR_TABLE)
+    ):
+        logger.warning(
+            "%s was built from different Infermedica tables; "
+            "rerun `python -m scripts.build_evidence_map`.", EVIDENCE_MAP_PATH
+        )
+    return artifact
+
+
+# Built once when the action server imports the package and shared by every
+# request; maps the Infermedica name (e.g. "abdominal pain") to its ID.
+SYMPTOM_IDS = _load_index(SYMPTOM_TABLE, "symptom_name", "symptom_id")
+RISK_FACTOR_IDS = _load_index(RISK_FACTOR_TABLE, "risk_factor", "id")
+
+# slot -> (Infermedica ID, "symptom" | "risk_factor"), and the same entries
+# split by kind for the report loops.
+_ARTIFACT = _load_artifact()
+EVIDENCE_MAP = MappingProxyType({slot: tuple(entry) for slot, entry in _ARTIFACT["slots"].items()})
+SYMPTOM_SLOTS = tuple((slot, e[0]) for slot, e in EVIDENCE_MAP.items() if e[1] == "symptom")
+RISK_FACTOR_SLOTS = tuple((slot, e[0]) for slot, e in EVIDENCE_MAP.items() if e[1] == "risk_factor")
+
+# Symptom intent -> its parent symptoms, nearest first (see actions/symptoms.py).
+SYMPTOM_INTENTS = MappingProxyType(
+    {intent: tuple(parents) for intent, parents in _ARTIFACT.get("symptom_intents", {}).items()}
+)
+
+# Form -> derived evidence slots packed into its bitset slot (see actions/evidence_bits.py).
+EVIDENCE_BITSETS = MappingProxyType(
+    {form: tuple(slots) for form, slots in _ARTIFACT.get("evidence_bitsets", {}).items()}
+)
+
+# Domain slots that hold the patient's answers, in the order of the
+# answered-slot mask (see actions/evidence.py).
+ANSWER_SLOTS = tuple(_ARTIFACT.get("answer_slots", ()))
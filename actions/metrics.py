@@ -0,0 +1,240 @@
+"""Prometheus text-format metrics for the action server.
+
+Metrics are always collected (a few dict updates per request). They are
+exposed on a side port only when ``ACTION_METRICS_PORT`` is set:
+
+    ACTION_METRICS_PORT=9105 rasa run actions
+    curl localhost:9105/metrics
+"""
+import bisect
+import errno
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List, Optional, Sequence, Text, Tuple
+
+logger = logging.getLogger(__name__)
+
+ACTION_METRICS_HOST = os.environ.get("ACTION_METRICS_HOST", "0.0.0.0")
+ACTION_METRICS_PORT = int(os.environ.get("ACTION_METRICS_PORT", "0") or "0")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Updates come from the event loop, scrapes from the server thread.
+_lock = threading.Lock()
+
+
+def _format_labels(names: Sequence[Text], values: Sequence[Any], extra: Text = "") -> Text:
+    pairs = ['{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> Text:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: Text, documentation: Text, labelnames: Sequence[Text] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels: Any, amount: float = 1.0) -> None:
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[Text]:
+        return [
+            "{}{} {}".format(self.name, _format_labels(self.labelnames, labels), _format_value(value))
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self, name: Text, documentation: Text, labelnames: Sequence[Text] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+
+    def observe(self, value: float, *labels: Any) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self) -> List[Text]:
+        lines = []
+        for labels, counts in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="{}"'.format(_format_value(bound))
+                lines.append("{}_bucket{} {}".format(self.name, _format_labels(self.labelnames, labels, le), cumulative))
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append("{}_sum{} {}".format(self.name, label_text, _format_value(counts[-1])))
+            lines.append("{}_count{} {}".format(self.name, label_text, cumulative))
+        return lines
+
+
+class CallbackGauge:
+    """A value read from elsewhere at scrape time, e.g. the cache hit ratio."""
+
+    kind = "gauge"
+
+    def __init__(self, name: Text, documentation: Text, func: Callable[[], float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def samples(self) -> List[Text]:
+        return ["{} {}".format(self.name, _format_value(self.func()))]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> Text:
+        lines = []
+        with _lock:
+            for metric in self.metrics:
+                lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+                lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ACTION_LATENCY = REGISTRY.register(
+    Histogram("action_latency_seconds", "Time spent running an action or form validator.", ["action"])
+)
+ACTION_ERRORS = REGISTRY.register(
+    Counter("action_errors_total", "Actions that raised instead of returning events.", ["action"])
+)
+INFERMEDICA_LATENCY = REGISTRY.register(
+    Histogram("infermedica_request_seconds", "Infermedica API call latency.", ["endpoint"])
+)
+INFERMEDICA_ERRORS = REGISTRY.register(
+    Counter("infermedica_errors_total", "Failed Infermedica API calls.", ["endpoint", "status"])
+)
+INFERMEDICA_HEDGES = REGISTRY.register(
+    Counter("infermedica_hedged_requests_total", "Extra requests sent because a call ran past the hedge delay.", ["endpoint"])
+)
+DEGRADED_REPORTS = REGISTRY.register(
+    Counter("report_degraded_total", "Reports sent without Infermedica results because it failed or ran out of budget.", ["reason"])
+)
+LOCAL_TRIAGE_REPORTS = REGISTRY.register(
+    Counter("report_local_triage_total", "Reports whose triage level came from the local red-flag rules.", ["level", "mode"])
+)
+EVIDENCE_SIZE = REGISTRY.register(
+    Histogram("report_evidence_items", "Evidence items sent per report.", buckets=SIZE_BUCKETS)
+)
+
+
+def observe_action(run: Callable) -> Callable:
+    """Wrap an action's ``run`` so its latency and failures are recorded."""
+
+    @functools.wraps(run)
+    async def wrapper(self, dispatcher, tracker, domain):
+        started = time.perf_counter()
+        try:
+            return await run(self, dispatcher, tracker, domain)
+        except Exception:
+            ACTION_ERRORS.inc(self.name())
+            raise
+        finally:
+            ACTION_LATENCY.observe(time.perf_counter() - started, self.name())
+
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: Text, *args: Any) -> None:
+        pass
+
+
+_server = None
+
+
+def _bind(host: Text, port: int, retry_for: float) -> Optional[ThreadingHTTPServer]:
+    deadline = time.monotonic() + retry_for
+    while True:
+        try:
+            return ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE or time.monotonic() >= deadline:
+                logger.warning("Could not serve metrics on %s:%s: %s", host, port, e)
+                return None
+        time.sleep(0.5)
+
+
+def _serve(host: Text, port: int, retry_for: float) -> None:
+    global _server
+    server = _bind(host, port, retry_for)
+    if server is None:
+        return
+    _server = server
+    logger.info("Serving action server metrics on http://%s:%s/metrics", host, port)
+    server.serve_forever()
+
+
+def start_metrics_server(
+    port: Optional[int] = None, host: Text = ACTION_METRICS_HOST, retry_for: float = 0.0
+) -> Optional[Tuple[Text, int]]:
+    """Serve ``/metrics`` from a daemon thread; a no-op if ``port`` is 0.
+
+    ``port`` defaults to ``ACTION_METRICS_PORT``, read at call time. With
+    ``retry_for``, the thread keeps trying a port that is still in use for
+    that many seconds, and None is returned straight away.
+    """
+    global _server
+    if port is None:
+        port = ACTION_METRICS_PORT
+    if not port or _server is not None:
+        return None
+    if retry_for:
+        threading.Thread(target=_serve, args=(host, port, retry_for), name="metrics", daemon=True).start()
+        return None
+    _server = _bind(host, port, 0.0)
+    if _server is None:
+        return None
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving action server metrics on http://%s:%s/metrics", host, port)
+    return _server.server_address
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from actions.infermedica_client import InfermedicaError, client
+from actions.metrics import REGISTRY, CallbackGauge
+from actions.report_cache import cache_key, report_cache
+from actions.tracing import detached
+
+logger = logging.getLogger(__name__)
+
+# Off by default: speculative calls count against the Infermedica quota.
+PREFETCH_ENABLED = os.environ.get("INFERMEDICA_PREFETCH", "false").lower() in ("1", "true", "yes")
+# Also prefetch every N answered slots, on top of every completed form (0 disables).
+PREFETCH_EVERY = int(os.environ.get("INFERMEDICA_PREFETCH_EVERY", "10"))
+# Speculative diagnosis/triage pairs allowed per conversation.
+PREFETCH_MAX_PER_SESSION = int(os.environ.get("INFERMEDICA_PREFETCH_MAX_PER_SESSION", "5"))
+# Conversations whose prefetch state is remembered.
+PREFETCH_MAX_SESSIONS = 10000
+
+Result = Tuple[Dict[Text, Any], Dict[Text, Any]]
+
+
+def _retrieve_exception(task: asyncio.Future) -> None:
+    # Superseded requests may fail unobserved; don't let asyncio log them.
+    if not task.cancelled():
+        task.exception()
+
+
+class _Session:
+    __slots__ = ("key", "task", "calls")
+
+    def __init__(self) -> None:
+        self.key = None
+        self.task = None
+        self.calls = 0
+
+
+class Prefetcher:
+    """Background diagnosis/triage for the evidence collected so far.
+
+    At most one request is in flight per conversation: scheduling newer
+    evidence cancels the superseded one. Finished results land in
+    ``report_cache``, so the final report reuses them whenever the evidence
+    has not changed since, and awaits the in-flight request if it is still
+    running.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = PREFETCH_ENABLED,
+        every: int = PREFETCH_EVERY,
+        max_per_session: int = PREFETCH_MAX_PER_SESSION,
+    ) -> None:
+        self.enabled = enabled
+        self.every = every
+        self.max_per_session = max_per_session
+        self.scheduled = 0
+        self.cancelled = 0
+        self.reused = 0
+        self._sessions = OrderedDict()
+
+    def should_prefetch(self, form_completed: bool, answered_before: int, answered_after: int) -> bool:
+        if not self.enabled:
+            return False
+        if form_completed:
+            return True
+        return self.every > 0 and answered_after // self.every > answered_before // self.every
+
+    def schedule(self, sender_id: Text, evidence: List[Dict[Text, Any]], sex: Text, age: Any) -> bool:
+        if not self.enabled or not evidence or sex is None or age is None:
+            return False
+        session = self._sessions.pop(sender_id, None) or _Session()
+        self._sessions[sender_id] = session
+        if len(self._sessions) > PREFETCH_MAX_SESSIONS:
+            _, evicted = self._sessions.popitem(last=False)
+            self._cancel(evicted)
+
+        key = cache_key(evidence, sex, age)
+        if key == session.key or session.calls >= self.max_per_session:
+            return False
+        self._cancel(session)
+        session.key = key
+        # Not part of the request that scheduled it, and it may outlive it.
+        session.task = asyncio.ensure_future(detached(self._fetch(evidence, sex, age)))
+        session.task.add_done_callback(_retrieve_exception)
+        session.calls += 1
+        self.scheduled += 1
+        return True
+
+    async def result(self, sender_id: Text, evidence: List[Dict[Text, Any]], sex: Text, age: Any) -> Optional[Result]:
+        """The prefetched result for exactly this evidence, or None.
+
+        Ends the conversation's prefetching; a stale in-flight request is
+        cancelled.
+        """
+        session = self._sessions.pop(sender_id, None)
+        if session is None or session.task is None:
+            return None
+        if session.key != cache_key(evidence, sex, age):
+            self._cancel(session)
+            return None
+        try:
+            # Shielded, so a caller running out of time does not cancel the
+            # request; it still fills the cache for a retry.
+            result = await asyncio.shield(session.task)
+        except Exception:
+            # Logged by _fetch; the report makes its own request.
+            return None
+        except asyncio.CancelledError:
+            if session.task.cancelled():
+                return None
+            # The caller itself was cancelled (e.g. its budget ran out).
+            raise
+        self.reused += 1
+        return result
+
+    def _cancel(self, session: _Session) -> None:
+        if session.task is not None and not session.task.done():
+            session.task.cancel()
+            self.cancelled += 1
+        session.task = None
+
+    @staticmethod
+    async def _fetch(evidence, sex, age) -> Result:
+        try:
+            result = await client.diagnosis_and_triage(evidence=evidence, sex=sex, age=age)
+        except InfermedicaError as e:
+            logger.info("Speculative report request failed: %s", e)
+            raise
+        except Exception:
+            logger.exception("Speculative report request failed")
+            raise
+        try:
+            await report_cache.set(evidence, sex, age, result)
+        except Exception:
+            logger.exception("Could not cache a speculative report")
+        return result
+
+
+prefetcher = Prefetcher()
+
+REGISTRY.register(CallbackGauge("prefetch_scheduled", "Speculative report requests started.", lambda: prefetcher.scheduled))
+REGISTRY.register(CallbackGauge("prefetch_cancelled", "Speculative requests cancelled by newer evidence.", lambda: prefetcher.cancelled))
+REGISTRY.register(CallbackGauge("prefetch_reused", "Reports served from a speculative request.", lambda: prefetcher.reused))
@@ -0,0 +1,333 @@
+"""Pre-fork entrypoint: one preloaded master, N workers sharing the listening socket.
+
+    python -m actions.prefork --workers 4 --port 5055
+
+The master imports the actions package once (Infermedica tables, evidence
+map, compiled forms, choice tables), moves everything it loaded out of the
+garbage collector's reach and forks the workers, so they share those pages
+copy-on-write. Each worker serves ``actions.webhook`` on the inherited
+socket; the kernel spreads connections between them.
+
+Signals to the master:
+    TERM, INT  stop; workers finish in-flight requests first
+    HUP        reload: re-exec the master with fresh code on the same socket,
+               start new workers, then retire the old ones
+
+Workers send a heartbeat from their event loop. One that misses
+``--timeout`` seconds of heartbeats (stuck in blocking code) is killed and
+replaced, as is one that exits. With ``ACTION_METRICS_PORT`` set, worker
+``i`` serves metrics on that port + ``i``; after a reload it takes the port
+over once the old worker in its slot has exited. Report caches and prefetches are
+per worker unless ``REPORT_CACHE_BACKEND=redis``.
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import math
+import mmap
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from typing import List, Optional, Text
+
+from aiohttp import web
+
+from actions import metrics, tracing
+from actions.webhook import create_app
+
+logger = logging.getLogger(__name__)
+
+ACTION_SERVER_WORKERS = int(os.environ.get("ACTION_SERVER_WORKERS", "0") or "0")
+ACTION_WORKER_TIMEOUT = float(os.environ.get("ACTION_WORKER_TIMEOUT", "30"))
+ACTION_GRACEFUL_TIMEOUT = float(os.environ.get("ACTION_GRACEFUL_TIMEOUT", "30"))
+# Handed from a master to the one it re-execs into on reload.
+LISTEN_FD_ENV = "ACTION_SERVER_LISTEN_FD"
+OLD_WORKERS_ENV = "ACTION_SERVER_OLD_WORKERS"
+
+HEARTBEAT_INTERVAL = 1.0
+# How long a stopping worker keeps answering, with "Connection: close", before
+# it stops listening and closes idle keep-alive connections.
+DRAIN_SECONDS = 2.0
+# A worker that exits this soon after starting is respawned only after a pause.
+MIN_WORKER_LIFETIME = 2.0
+BEAT = struct.Struct("d")
+# CPU quota of the container: cgroup v2, then v1.
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_CFS_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_CFS_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read(path: Text) -> Optional[Text]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPUs the cgroup's quota allows, or None if there is no quota."""
+    cpu_max = _read(CGROUP_CPU_MAX)
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+    else:
+        quota, period = _read(CGROUP_CFS_QUOTA), _read(CGROUP_CFS_PERIOD)
+    try:
+        limit = int(quota) / int(period)
+    except (TypeError, ValueError, ZeroDivisionError):
+        # "max" (v2) or no cgroup files
+        return None
+    return limit if limit > 0 else None
+
+
+def default_workers() -> int:
+    """One worker per CPU this process may run on, capped by the cgroup quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return cpus
+
+
+class Heartbeats:
+    """One ``time.monotonic()`` stamp per worker slot, in memory shared across fork."""
+
+    def __init__(self, slots: int) -> None:
+        self._map = mmap.mmap(-1, BEAT.size * slots)
+
+    def beat(self, slot: int) -> None:
+        BEAT.pack_into(self._map, slot * BEAT.size, time.monotonic())
+
+    def last(self, slot: int) -> float:
+        return BEAT.unpack_from(self._map, slot * BEAT.size)[0]
+
+
+@web.middleware
+async def close_when_draining(request: web.Request, handler) -> web.StreamResponse:
+    response = await handler(request)
+    if request.app["draining"].is_set():
+        # Tell keep-alive clients to reconnect, which lands them on another worker.
+        response.force_close()
+    return response
+
+
+def create_worker_app(args: argparse.Namespace) -> web.Application:
+    app = create_app(args.actions)
+    # Set once the worker stops; the app's state is frozen after startup.
+    app["draining"] = asyncio.Event()
+    app.middlewares.append(close_when_draining)
+    return app
+
+
+async def serve(slot: int, sock: socket.socket, app: web.Application, heartbeats: Heartbeats, args: argparse.Namespace) -> None:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.SockSite(runner, sock, shutdown_timeout=args.graceful_timeout).start()
+
+    stopping = asyncio.Event()
+    asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    while not stopping.is_set():
+        heartbeats.beat(slot)
+        try:
+            await asyncio.wait_for(stopping.wait(), HEARTBEAT_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+    logger.info("Worker %s draining", slot)
+    app["draining"].set()
+    await asyncio.sleep(min(DRAIN_SECONDS, args.graceful_timeout))
+    await runner.cleanup()
+
+
+def run_worker(slot: int, sock: socket.socket, app: web.Application, heartbeats: Heartbeats, args: argparse.Namespace) -> None:
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl-C reaches the whole process group; the master decides.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tracing.use_process_file()
+    if args.metrics_port:
+        # After a reload the old worker of this slot holds the port until it has drained.
+        retry_for = args.timeout + DRAIN_SECONDS + args.graceful_timeout + 5
+        metrics.start_metrics_server(port=args.metrics_port + slot, retry_for=retry_for)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(serve(slot, sock, app, heartbeats, args))
+    finally:
+        loop.close()
+
+
+class Master:
+    def __init__(self, sock: socket.socket, app: web.Application, args: argparse.Namespace) -> None:
+        self.sock = sock
+        self.app = app
+        self.args = args
+        self.heartbeats = Heartbeats(args.workers)
+        # slot -> pid, and pid -> (slot, start time)
+        self.workers = {}
+        self.started = {}
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self, slot: int) -> None:
+        self.heartbeats.beat(slot)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(slot, self.sock, self.app, self.heartbeats, self.args)
+            except BaseException:
+                logger.exception("Worker %s failed", slot)
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self.workers[slot] = pid
+        self.started[pid] = (slot, time.monotonic())
+        logger.info("Started worker %s (pid %s)", slot, pid)
+
+    def reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot, started = self.started.pop(pid, (None, 0.0))
+            if slot is None or self.workers.get(slot) != pid:
+                continue
+            del self.workers[slot]
+            if self.stopping:
+                continue
+            logger.warning("Worker %s (pid %s) exited with status %s", slot, pid, status)
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(1.0)
+            self.spawn(slot)
+
+    def check_heartbeats(self) -> None:
+        now = time.monotonic()
+        for slot, pid in list(self.workers.items()):
+            if now - self.heartbeats.last(slot) > self.args.timeout:
+                logger.error("Worker %s (pid %s) missed heartbeats for %.0fs, killing it", slot, pid, self.args.timeout)
+                os.kill(pid, signal.SIGKILL)
+                # Reaped and respawned on the next pass.
+                self.heartbeats.beat(slot)
+
+    def wait_ready(self, timeout: float) -> bool:
+        """True once every worker has sent a heartbeat since it was spawned."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.reap()
+            if all(self.heartbeats.last(slot) > self.started[pid][1] for slot, pid in self.workers.items()):
+                return True
+            time.sleep(0.1)
+        return False
+
+    def retire(self, pids: List[int]) -> None:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def stop(self) -> None:
+        self.stopping = True
+        self.retire(list(self.workers.values()))
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers.values():
+            logger.warning("Worker pid %s did not stop in time, killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+
+    def reexec(self) -> None:
+        """Replace this process with a fresh master; the old workers are retired by the new one."""
+        logger.info("Reloading: re-executing the master")
+        os.set_inheritable(self.sock.fileno(), True)
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(self.sock.fileno())
+        env[OLD_WORKERS_ENV] = ",".join(str(pid) for pid in self.workers.values())
+        os.execve(sys.executable, [sys.executable, "-m", "actions.prefork"] + sys.argv[1:], env)
+
+    def run(self, old_workers: List[int]) -> int:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+        if old_workers:
+            if not self.wait_ready(self.args.timeout):
+                logger.warning("New workers are slow to start; retiring the old ones anyway")
+            self.retire(old_workers)
+        while not self.stopping:
+            if self.reloading:
+                self.reexec()
+            self.reap()
+            self.check_heartbeats()
+            time.sleep(0.5)
+        self.stop()
+        logger.info("Stopped")
+        return 0
+
+    def _on_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _on_reload(self, signum, frame) -> None:
+        self.reloading = True
+
+
+def listening_socket(args: argparse.Namespace) -> socket.socket:
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        return socket.socket(fileno=int(fd))
+    return socket.create_server((args.host, args.port), backlog=args.backlog)
+
+
+def preload(args: argparse.Namespace) -> web.Application:
+    """Import the actions, and everything they load at import time, into the master."""
+    app = create_worker_app(args)
+    gc.collect()
+    # Keep the collector from touching (and so un-sharing) the preloaded objects.
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    return app
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the action server as a preloaded master with forked workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("-p", "--port", type=int, default=int(os.environ.get("ACTION_SERVER_PORT", "5055")))
+    parser.add_argument("-w", "--workers", type=int, default=ACTION_SERVER_WORKERS or default_workers())
+    parser.add_argument("--actions", default="actions", help="Package the actions are loaded from.")
+    parser.add_argument("--timeout", type=float, default=ACTION_WORKER_TIMEOUT,
+                        help="Seconds without a heartbeat before a worker is replaced.")
+    parser.add_argument("--graceful-timeout", type=float, default=ACTION_GRACEFUL_TIMEOUT,
+                        help="Seconds a stopping worker gets to finish in-flight requests.")
+    parser.add_argument("--backlog", type=int, default=1024)
+    return parser
+
+
+def main() -> int:
+    args = create_argument_parser().parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+    # Workers serve metrics on their own ports; keep the import in preload()
+    # from opening one in the master.
+    args.metrics_port = metrics.ACTION_METRICS_PORT
+    metrics.ACTION_METRICS_PORT = 0
+    old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, "").split(",") if pid]
+    sock = listening_socket(args)
+    app = preload(args)
+    logger.info("Serving on %s:%s with %s workers", *sock.getsockname()[:2], args.workers)
+    return Master(sock, app, args).run(old_workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import os
+from typing import Any, Dict, List, Optional, Text
+
+from actions.evidence import HISTORY_SLOTS
+
+# How action_create_report delivers the report:
+#   messages - one text message per section (the original behaviour)
+#   payload  - a single custom payload carrying the report and its text rendering
+#   text     - a single text message, for channels without custom payloads
+REPORT_MESSAGE_MODE = os.environ.get("REPORT_MESSAGE_MODE", "messages")
+REPORT_MESSAGE_MODES = ("messages", "payload", "text")
+
+PENDING_ADVICE = "Your symptoms have been recorded and will be sent to the doctor. Triage is pending; if your symptoms get worse, seek medical help immediately."
+DEFAULT_ADVICE = "Your symptoms have been recorded and will be sent to the doctor. Thank you for your patience."
+EMERGENCY_ADVICE = "You have some symptoms which are very serious. Please seek emergency care now"
+TRIAGE_ADVICE = {
+    "emergency_ambulance": EMERGENCY_ADVICE,
+    "emergency": EMERGENCY_ADVICE,
+    "consultation_24": "Your symptoms have been recorded and will be sent to the doctor. Please continue observing your symptoms and if they get worse, seek medical help immediately. Thank you for your patience.",
+    "consultation": DEFAULT_ADVICE,
+}
+
+
+def _label(slot: Text) -> Text:
+    return slot.replace("_", " ")
+
+
+def build_report(
+    answers: Dict[Text, Any],
+    initial: Optional[List[Text]],
+    diagnosis: Dict[Text, Any],
+    triage: Dict[Text, Any],
+) -> Dict[Text, Any]:
+    """The patient report as one structured object.
+
+    A ``None`` triage level means triage could not be obtained in time; the
+    report then says so instead of giving advice for a level.
+    """
+    history = [{"name": _label(slot), "value": answers[slot]} for slot in HISTORY_SLOTS if slot in answers]
+    present = []
+    absent = []
+    for slot, value in answers.items():
+        if slot in HISTORY_SLOTS:
+            continue
+        if value is True:
+            present.append(_label(slot))
+        elif value is False:
+            absent.append(_label(slot))
+    level = triage.get("triage_level")
+    return {
+        "type": "report",
+        "history": history,
+        "chief_complaint": [_label(s) for s in initial or []],
+        "symptoms_present": present,
+        "symptoms_absent": absent,
+        "conditions": [
+            {"id": c.get("id"), "name": c["name"], "probability": c["probability"]}
+            for c in diagnosis.get("conditions", [])
+        ],
+        "triage_level": level,
+        "triage_pending": level is None,
+        "advice": PENDING_ADVICE if level is None else TRIAGE_ADVICE.get(level, DEFAULT_ADVICE),
+    }
+
+
+def render_sections(report: Dict[Text, Any]) -> List[Text]:
+    """One text block per section, as the report was originally sent."""
+    history = ["Patient:"]
+    for entry in report["history"]:
+        value = entry["value"]
+        if value is True:
+            value = "Yes"
+        elif value is False:
+            value = "No"
+        history.append("{}: {}".format(entry["name"], value))
+    conditions = ["Associated Conditions: "]
+    if report["triage_pending"]:
+        conditions.append("pending")
+    for c in report["conditions"]:
+        conditions.append("{}, {}%".format(c["name"], str(round(c["probability"] * 100, 2))))
+    return [
+        "\n".join(history),
+        "\n".join(["Chief complaint: "] + report["chief_complaint"]),
+        "\n".join(["Symptoms Present: "] + report["symptoms_present"]),
+        "\n".join(["Symptoms Absent: "] + report["symptoms_absent"]),
+        "\n".join(conditions),
+        report["advice"],
+    ]
+
+
+def render_text(report: Dict[Text, Any]) -> Text:
+    return "\n\n".join(render_sections(report))
+
+
+def send_report(dispatcher, report: Dict[Text, Any], mode: Text = REPORT_MESSAGE_MODE) -> None:
+    if mode == "payload":
+        dispatcher.utter_message(json_message=dict(report, text=render_text(report)))
+    elif mode == "text":
+        dispatcher.utter_message(text=render_text(report))
+    elif mode == "messages":
+        for section in render_sections(report):
+            dispatcher.utter_message(text=section)
+    else:
+        raise ValueError("Unknown REPORT_MESSAGE_MODE '{}', expected one of {}".format(mode, REPORT_MESSAGE_MODES))
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from actions.metrics import REGISTRY, CallbackGauge
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_BACKEND = os.environ.get("REPORT_CACHE_BACKEND", "memory")
+REPORT_CACHE_TTL = float(os.environ.get("REPORT_CACHE_TTL", "3600"))
+# Upper bound on the serialized size of all entries held by the memory backend.
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+REPORT_CACHE_REDIS_URL = os.environ.get("REPORT_CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Seconds a Redis command may take before the lookup counts as an error.
+REPORT_CACHE_REDIS_TIMEOUT = float(os.environ.get("REPORT_CACHE_REDIS_TIMEOUT", "0.25"))
+REPORT_CACHE_AGE_BAND = int(os.environ.get("REPORT_CACHE_AGE_BAND", "5"))
+
+KEY_PREFIX = "infermedica:report:"
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry expiry and a byte budget."""
+
+    def __init__(self, max_bytes: int = REPORT_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    async def get(self, key: Text) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: Text, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: Text) -> None:
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared store so several action-server replicas reuse each other's results.
+
+    Eviction is left to the Redis ``maxmemory-policy`` (e.g. ``allkeys-lru``).
+    """
+
+    def __init__(self, url: Text = REPORT_CACHE_REDIS_URL, timeout: float = REPORT_CACHE_REDIS_TIMEOUT) -> None:
+        # Only needed when the shared backend is configured.
+        import redis.asyncio
+
+        self._redis = redis.asyncio.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    async def get(self, key: Text) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: Text, value: bytes, ttl: float) -> None:
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+
+def age_band(age: Any, width: int = REPORT_CACHE_AGE_BAND) -> Text:
+    try:
+        band = int(float(age)) // width
+    except (TypeError, ValueError):
+        return str(age)
+    return "{}-{}".format(band * width, (band + 1) * width - 1)
+
+
+def cache_key(evidence: List[Dict[Text, Any]], sex: Text, age: Any) -> Text:
+    canonical = sorted({(e["id"], e["choice_id"], e.get("source", "")) for e in evidence})
+    payload = json.dumps([canonical, str(sex).lower(), age_band(age)], separators=(",", ":"))
+    return KEY_PREFIX + hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    """Diagnosis/triage results keyed on the evidence set, age band and sex.
+
+    The cache fails open: a backend error (Redis down or slow, an unreadable
+    entry) is logged and counted, and the lookup is a miss or the write is
+    skipped.
+    """
+
+    def __init__(self, backend, ttl: float = REPORT_CACHE_TTL) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, evidence, sex, age) -> Optional[Tuple[Dict[Text, Any], Dict[Text, Any]]]:
+        try:
+            value = await self.backend.get(cache_key(evidence, sex, age))
+            if value is not None:
+                diagnosis, triage = json.loads(value)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Report cache lookup failed: %r", e)
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return diagnosis, triage
+
+    async def set(self, evidence, sex, age, result: Tuple[Dict[Text, Any], Dict[Text, Any]]) -> None:
+        value = json.dumps(list(result), separators=(",", ":")).encode("utf-8")
+        try:
+            await self.backend.set(cache_key(evidence, sex, age), value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Report cache write failed: %r", e)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def create_backend(name: Text = REPORT_CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError("Unknown REPORT_CACHE_BACKEND '{}'".format(name))
+
+
+report_cache = ReportCache(create_backend())
+
+REGISTRY.register(CallbackGauge("report_cache_hits", "Report cache hits since start.", lambda: report_cache.hits))
+REGISTRY.register(CallbackGauge("report_cache_misses", "Report cache misses since start.", lambda: report_cache.misses))
+REGISTRY.register(CallbackGauge("report_cache_errors", "Report cache lookups and writes that failed.", lambda: report_cache.errors))
+REGISTRY.register(CallbackGauge("report_cache_hit_ratio", "Fraction of report lookups served from the cache.", lambda: report_cache.hit_ratio))
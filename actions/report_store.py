@@ -0,0 +1,211 @@
+"""Write-behind persistence of generated reports.
+
+    REPORT_STORE_PATH=/data/reports.db rasa run actions
+
+``action_create_report`` hands every report to ``report_store.put``, which
+only appends it to an in-memory queue. A writer thread drains the queue
+into SQLite in WAL mode, committing up to ``REPORT_STORE_BATCH`` reports
+per transaction, so the disk never sits on a conversation's critical path.
+Several action-server processes can share one database file.
+
+A clean shutdown flushes the queue; reports still queued when the process
+is killed are lost. The store is off unless ``REPORT_STORE_PATH`` is set.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from actions.metrics import REGISTRY, CallbackGauge
+
+logger = logging.getLogger(__name__)
+
+REPORT_STORE_PATH = os.environ.get("REPORT_STORE_PATH", "")
+REPORT_STORE_BATCH = int(os.environ.get("REPORT_STORE_BATCH", "100"))
+# How long the writer keeps collecting reports after the first one of a batch.
+REPORT_STORE_FLUSH_INTERVAL = float(os.environ.get("REPORT_STORE_FLUSH_INTERVAL", "0.5"))
+# Reports beyond this many waiting to be written are dropped, not waited for.
+REPORT_STORE_QUEUE_SIZE = int(os.environ.get("REPORT_STORE_QUEUE_SIZE", "10000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    sender_id TEXT,
+    sex TEXT,
+    age TEXT,
+    triage_level TEXT,
+    evidence TEXT NOT NULL,
+    report TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_created_at ON reports (created_at);
+"""
+INSERT = "INSERT INTO reports (created_at, sender_id, sex, age, triage_level, evidence, report) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+# Queued by put(): (created_at, sender_id, sex, age, evidence, report)
+Pending = Tuple[float, Optional[Text], Any, Any, List[Dict[Text, Any]], Dict[Text, Any]]
+
+_STOP = object()
+
+
+def connect(path: Text) -> sqlite3.Connection:
+    """A connection to the report database, creating the table if needed."""
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # With WAL this only risks the last commits on power loss, never corruption.
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _row(pending: Pending) -> Tuple[Any, ...]:
+    created_at, sender_id, sex, age, evidence, report = pending
+    return (
+        created_at,
+        sender_id,
+        None if sex is None else str(sex),
+        None if age is None else str(age),
+        report.get("triage_level"),
+        json.dumps(evidence, separators=(",", ":")),
+        json.dumps(report, separators=(",", ":")),
+    )
+
+
+class ReportStore:
+    """Queue of reports waiting to be written, and the thread writing them.
+
+    The writer starts with the first report a process stores, so a
+    pre-forking master that never stores one hands its workers no thread.
+    """
+
+    def __init__(
+        self,
+        path: Text = REPORT_STORE_PATH,
+        batch: int = REPORT_STORE_BATCH,
+        flush_interval: float = REPORT_STORE_FLUSH_INTERVAL,
+        max_queued: int = REPORT_STORE_QUEUE_SIZE,
+    ) -> None:
+        self.path = path
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+
+    def put(
+        self, sender_id: Optional[Text], report: Dict[Text, Any], evidence: List[Dict[Text, Any]], sex: Any, age: Any
+    ) -> bool:
+        """Queue a report for writing; never blocks. False if it was dropped.
+
+        ``report`` and ``evidence`` are serialised later, on the writer
+        thread, so the caller must not modify them afterwards.
+        """
+        if not self.enabled:
+            return False
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((time.time(), sender_id, sex, age, evidence, report))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Report store queue is full, dropping the report for %s", sender_id)
+            return False
+        return True
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Write everything queued so far and stop the writer."""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("Report store writer did not finish within %ss", timeout)
+
+    def _ensure_writer(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # Threads do not survive fork(): a forked worker starts its own.
+            self._pid = os.getpid()
+            self._queue = queue.Queue(self.max_queued)
+            self._thread = threading.Thread(target=self._write_loop, args=(self._queue,), name="report-store", daemon=True)
+            self._thread.start()
+
+    def _write_loop(self, pending: "queue.Queue") -> None:
+        try:
+            connection = connect(self.path)
+        except sqlite3.Error as e:
+            logger.error("Could not open the report store at %s, reports will not be saved: %s", self.path, e)
+            connection = None
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch(pending)
+                if batch:
+                    self._write(connection, batch)
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _next_batch(self, pending: "queue.Queue") -> Tuple[List[Pending], bool]:
+        """Block for one report, then collect more for up to ``flush_interval``."""
+        item = pending.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch:
+            try:
+                item = pending.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write(self, connection: Optional[sqlite3.Connection], batch: List[Pending]) -> None:
+        if connection is None:
+            self.dropped += len(batch)
+            return
+        try:
+            rows = [_row(item) for item in batch]
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(INSERT, rows)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.error("Could not save %s reports: %s", len(batch), e)
+            self.dropped += len(batch)
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+
+report_store = ReportStore()
+atexit.register(report_store.close)
+
+REGISTRY.register(CallbackGauge("report_store_written", "Reports saved to the report store.", lambda: report_store.written))
+REGISTRY.register(CallbackGauge("report_store_dropped", "Reports that could not be saved.", lambda: report_store.dropped))
+REGISTRY.register(CallbackGauge("report_store_queued", "Reports waiting to be saved.", lambda: report_store.queued))
@@ -0,0 +1,46 @@
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, Optional, Text, Tuple
+
+from actions.infermedica_tables import SYMPTOM_INTENTS
+
+
+def complaint_name(slot: Text) -> Text:
+    """How a symptom appears in the ``initial`` slot, e.g. "cough dry"."""
+    return slot.replace("_", " ").lower()
+
+
+class SymptomRegistry:
+    """Symptom intents, the slots they set and their chief complaints.
+
+    Built once from the evidence-map artifact (domain intents matched against
+    the Infermedica symptom table), so every lookup is a dict access.
+    """
+
+    def __init__(self, intents: Mapping[Text, Tuple[Text, ...]]) -> None:
+        # Parents first, so a reported "cough dry" also counts as "cough".
+        self._complaints = MappingProxyType({
+            intent: tuple(complaint_name(s) for s in reversed(parents)) + (complaint_name(intent),)
+            for intent, parents in intents.items()
+        })
+
+    def __contains__(self, intent: Text) -> bool:
+        return intent in self._complaints
+
+    def slot(self, intent: Optional[Text]) -> Optional[Text]:
+        """The bool slot a symptom intent sets, or None for other intents."""
+        return intent if intent in self._complaints else None
+
+    def complaints(self, intent: Text) -> Tuple[Text, ...]:
+        return self._complaints.get(intent, ())
+
+    def add_complaint(self, initial: Optional[Iterable[Text]], intent: Text) -> List[Text]:
+        """``initial`` plus the intent's complaints, each name kept once, in first-reported order."""
+        return chief_complaints(list(initial or []) + list(self.complaints(intent)))
+
+
+def chief_complaints(initial: Optional[Iterable[Text]]) -> List[Text]:
+    """``initial`` without repeats; conversations recorded before the registry may have them."""
+    return list(dict.fromkeys(initial or []))
+
+
+symptom_registry = SymptomRegistry(SYMPTOM_INTENTS)
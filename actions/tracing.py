@@ -0,0 +1,159 @@
+"""Opt-in per-request tracing of action execution.
+
+    ACTION_TRACE=1 ACTION_TRACE_SAMPLE_RATE=0.1 ACTION_TRACE_MEMORY=1 rasa run actions
+
+A sampled request writes one JSON line to ``ACTION_TRACE_FILE`` holding the
+action name, sender, total duration and a timed span per phase, plus the
+tracemalloc allocation delta of each span when ``ACTION_TRACE_MEMORY`` is
+set. Allocation deltas are process-wide, so requests running concurrently
+show up in each other's spans. The file rotates at ``ACTION_TRACE_MAX_BYTES``;
+each ``actions.prefork`` worker writes its own ``<file>.<pid>.jsonl``.
+
+Background work that may outlive the request (prefetches) runs ``detached``
+from its trace. Spans that end after their trace was written, such as a
+losing hedged request winding down, are dropped.
+"""
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Text
+
+
+def _flag(name: Text) -> bool:
+    return os.environ.get(name, "false").lower() in ("1", "true", "yes")
+
+
+ACTION_TRACE = _flag("ACTION_TRACE")
+ACTION_TRACE_SAMPLE_RATE = float(os.environ.get("ACTION_TRACE_SAMPLE_RATE", "1.0"))
+ACTION_TRACE_MEMORY = _flag("ACTION_TRACE_MEMORY")
+ACTION_TRACE_FILE = os.environ.get("ACTION_TRACE_FILE", "action_traces.jsonl")
+ACTION_TRACE_MAX_BYTES = int(os.environ.get("ACTION_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+ACTION_TRACE_BACKUPS = int(os.environ.get("ACTION_TRACE_BACKUPS", "5"))
+
+_current = contextvars.ContextVar("action_trace", default=None)
+_writer = None
+_trace_file = ACTION_TRACE_FILE
+
+
+class Trace:
+    __slots__ = ("action", "sender_id", "started", "spans", "memory", "finished")
+
+    def __init__(self, action: Text, sender_id: Optional[Text], memory: bool) -> None:
+        self.action = action
+        self.sender_id = sender_id
+        self.started = time.perf_counter()
+        self.spans = []
+        self.memory = memory
+        self.finished = False
+
+    def to_dict(self, duration: float, error: Optional[Text]) -> Dict[Text, Any]:
+        trace = {
+            "ts": time.time(),
+            "action": self.action,
+            "sender_id": self.sender_id,
+            "duration_ms": round(duration * 1000, 3),
+            "spans": self.spans,
+        }
+        if error is not None:
+            trace["error"] = error
+        return trace
+
+
+def _get_writer() -> logging.Logger:
+    global _writer
+    if _writer is None:
+        handler = logging.handlers.RotatingFileHandler(
+            _trace_file, maxBytes=ACTION_TRACE_MAX_BYTES, backupCount=ACTION_TRACE_BACKUPS
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _writer = logging.getLogger("actions.traces")
+        _writer.setLevel(logging.INFO)
+        _writer.propagate = False
+        _writer.addHandler(handler)
+    return _writer
+
+
+def use_process_file() -> None:
+    """Write this process's traces to ``<file>.<pid><ext>``.
+
+    For forked workers: processes sharing one rotating file rotate it out
+    from under each other.
+    """
+    global _writer, _trace_file
+    root, ext = os.path.splitext(ACTION_TRACE_FILE)
+    _trace_file = "{}.{}{}".format(root, os.getpid(), ext)
+    if _writer is not None:
+        # Inherited from the parent, still pointing at its file.
+        for handler in list(_writer.handlers):
+            _writer.removeHandler(handler)
+            handler.close()
+        _writer = None
+
+
+async def detached(awaitable: Awaitable) -> Any:
+    """Await ``awaitable`` outside the current trace, for a task that may outlive the request."""
+    _current.set(None)
+    return await awaitable
+
+
+@contextmanager
+def span(name: Text) -> Iterator[None]:
+    """Time one phase of the current request; free when it is not traced."""
+    trace = _current.get()
+    if trace is None or trace.finished:
+        yield
+        return
+    memory_before = tracemalloc.get_traced_memory()[0] if trace.memory else None
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ended = time.perf_counter()
+        record = {
+            "name": name,
+            "start_ms": round((started - trace.started) * 1000, 3),
+            "duration_ms": round((ended - started) * 1000, 3),
+        }
+        if memory_before is not None:
+            record["alloc_bytes"] = tracemalloc.get_traced_memory()[0] - memory_before
+        if not trace.finished:
+            trace.spans.append(record)
+
+
+def _start_trace(action: Text, sender_id: Optional[Text]) -> Optional[Trace]:
+    if not ACTION_TRACE or random.random() >= ACTION_TRACE_SAMPLE_RATE:
+        return None
+    if ACTION_TRACE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return Trace(action, sender_id, ACTION_TRACE_MEMORY)
+
+
+def trace_action(run: Callable) -> Callable:
+    """Wrap an action's ``run`` so sampled requests are traced."""
+
+    @functools.wraps(run)
+    async def wrapper(self, dispatcher, tracker, domain):
+        trace = _start_trace(self.name(), getattr(tracker, "sender_id", None))
+        if trace is None:
+            return await run(self, dispatcher, tracker, domain)
+        token = _current.set(trace)
+        error = None
+        try:
+            return await run(self, dispatcher, tracker, domain)
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            _current.reset(token)
+            trace.finished = True
+            duration = time.perf_counter() - trace.started
+            _get_writer().info(json.dumps(trace.to_dict(duration, error), separators=(",", ":")))
+
+    return wrapper
@@ -0,0 +1,85 @@
+import os
+from typing import Any, Dict, List, Optional, Text
+
+from actions.form_engine import compile_test
+
+# How action_create_report uses the local red-flag triage:
+#   off      - never
+#   fallback - only when Infermedica cannot answer within the budget
+#   primary  - an emergency red flag decides the triage level and Infermedica
+#              is only asked for the conditions; any other red flag is
+#              reported when it is more urgent than Infermedica's level
+LOCAL_TRIAGE = os.environ.get("LOCAL_TRIAGE", "fallback")
+
+LEVELS = ("consultation", "consultation_24", "emergency")
+# Every level Infermedica's /triage returns, least urgent first.
+URGENCY = ("self_care", "consultation", "consultation_24", "emergency", "emergency_ambulance")
+
+# Checked against the answered slots; the most urgent matching rule wins.
+# A rule's tests use the same operators as the form skip rules.
+RED_FLAG_RULES = [
+    {"level": "emergency", "when": {"chest_pain_radiating_to_left_upper_limb": True}, "reason": "chest pain spreading to the left arm"},
+    {"level": "emergency", "when": {"chest_pain_radiating_to_the_neck": True}, "reason": "chest pain spreading to the neck"},
+    {"level": "emergency", "when": {"chest_pain_radiating_between_shoulder_blades": True}, "reason": "chest pain spreading between the shoulder blades"},
+    {"level": "emergency", "when": {"chest_pain_pressure": True, "chest_pain_continues_after_rest": True}, "reason": "pressing chest pain at rest"},
+    {"level": "emergency", "when": {"hemoptysis": True}, "reason": "coughing up blood"},
+    {"level": "emergency", "when": {"dyspnea_at_rest": True}, "reason": "shortness of breath at rest"},
+    {"level": "emergency", "when": {"bleeding_from_anus_heavy": True}, "reason": "heavy bleeding from the anus"},
+    {"level": "emergency", "when": {"headache_worst_headache_in_life": True}, "reason": "worst headache of their life"},
+    {"level": "consultation_24", "when": {"fever_greater_than_40": True}, "reason": "fever above 40C"},
+    {"level": "consultation_24", "when": {"dyspnea_after_a_few_minutes_of_walking": True}, "reason": "shortness of breath after a few minutes of walking"},
+    {"level": "consultation_24", "when": {"bleeding_from_anus": True}, "reason": "bleeding from the anus"},
+    {"level": "consultation_24", "when": {"blood_in_stool": True}, "reason": "blood in stool"},
+    {"level": "consultation_24", "when": {"abdominal_pain_severe": True}, "reason": "severe abdominal pain"},
+]
+
+
+class RedFlagRule:
+    __slots__ = ("level", "rank", "tests", "reason")
+
+    def __init__(self, level: Text, when: Dict[Text, Any], reason: Text) -> None:
+        if level not in LEVELS:
+            raise ValueError("Unknown triage level '{}'".format(level))
+        self.level = level
+        self.rank = LEVELS.index(level)
+        self.tests = tuple((slot, compile_test(test)) for slot, test in when.items())
+        self.reason = reason
+
+    def matches(self, answers: Dict[Text, Any]) -> bool:
+        return all(test(answers.get(slot)) for slot, test in self.tests)
+
+
+class TriageResult:
+    __slots__ = ("level", "reasons")
+
+    def __init__(self, level: Text, reasons: List[Text]) -> None:
+        self.level = level
+        self.reasons = reasons
+
+    def as_triage(self) -> Dict[Text, Any]:
+        """Shaped like an Infermedica /triage response."""
+        return {"triage_level": self.level, "source": "local", "red_flags": self.reasons}
+
+    def outranks(self, triage: Dict[Text, Any]) -> bool:
+        """Whether this level is more urgent than an Infermedica /triage response's."""
+        level = triage.get("triage_level")
+        return URGENCY.index(self.level) > (URGENCY.index(level) if level in URGENCY else -1)
+
+
+# Most urgent first, so evaluation can stop below the best level found.
+COMPILED_RULES = sorted((RedFlagRule(**rule) for rule in RED_FLAG_RULES), key=lambda r: -r.rank)
+
+
+def red_flag_triage(answers: Dict[Text, Any]) -> Optional[TriageResult]:
+    """The most urgent level any red flag in ``answers`` calls for, or None."""
+    best = None
+    reasons = []
+    for rule in COMPILED_RULES:
+        if best is not None and rule.rank < best:
+            break
+        if rule.matches(answers):
+            best = rule.rank
+            reasons.append(rule.reason)
+    if best is None:
+        return None
+    return TriageResult(LEVELS[best], reasons)
@@ -0,0 +1,189 @@
+"""Action-server webhook that parses each distinct domain only once.
+
+    python -m actions.webhook --port 5055
+
+Rasa 2.x sends the whole domain (~100 KB of JSON) with every action call,
+and ``python -m rasa_sdk`` parses it into a fresh dict each time. Here the
+domain's JSON text is looked up by SHA-1 digest instead: a known domain is
+hashed (about a tenth of the cost of parsing it) and the cached dict is
+passed to the action, so concurrent requests share one copy. Only the rest
+of the request body is parsed. Anything unexpected falls back to a full
+parse, so the cache can only save work, never change a request.
+
+Serves the same ``/webhook``, ``/health`` and ``/actions`` routes as the
+SDK server.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Text
+
+from aiohttp import web
+from rasa_sdk import utils
+from rasa_sdk.executor import ActionExecutor
+from rasa_sdk.interfaces import ActionExecutionRejection, ActionNotFoundException
+
+from actions.infermedica_client import client
+from actions.metrics import REGISTRY, CallbackGauge
+from actions.report_store import report_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = int(os.environ.get("ACTION_SERVER_PORT", "5055"))
+# Distinct domains kept; more than one only matters while a new model rolls out.
+DOMAIN_CACHE_SIZE = int(os.environ.get("DOMAIN_CACHE_SIZE", "4"))
+
+DOMAIN_KEY = b'"domain":'
+JSON_WHITESPACE = b" \t\r\n"
+
+
+class DomainCache:
+    """Parsed domains by the SHA-1 of their JSON text, least recently used evicted.
+
+    Callers share the cached dicts and must treat them as read-only.
+    """
+
+    def __init__(self, max_entries: int = DOMAIN_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._domains = OrderedDict()
+        # Byte lengths of the cached domains, the only slice sizes worth hashing.
+        self._lengths = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _lookup(self, body: bytes, start: int) -> Optional[Any]:
+        for length in set(self._lengths.values()):
+            end = start + length
+            digest = hashlib.sha1(body[start:end]).digest()
+            domain = self._domains.get(digest)
+            if domain is not None:
+                self._domains.move_to_end(digest)
+                return domain, end
+        return None
+
+    def _store(self, digest: bytes, length: int, domain: Dict[Text, Any]) -> None:
+        self._domains[digest] = domain
+        self._lengths[digest] = length
+        while len(self._domains) > self.max_entries:
+            evicted, _ = self._domains.popitem(last=False)
+            del self._lengths[evicted]
+
+    def decode(self, body: bytes) -> Dict[Text, Any]:
+        """Parse an action call, reusing the domain dict if it was seen before."""
+        # Rasa serialises the domain after the tracker, so the last "domain"
+        # key is the top-level one unless the call has no domain at all.
+        key = body.rfind(DOMAIN_KEY)
+        if key < 0:
+            return json.loads(body)
+        start = key + len(DOMAIN_KEY)
+        while start < len(body) and body[start] in JSON_WHITESPACE:
+            start += 1
+        if body[start:start + 1] != b"{":
+            return json.loads(body)
+
+        found = self._lookup(body, start)
+        if found is not None:
+            domain, end = found
+            self.hits += 1
+        else:
+            text = body[start:].decode("utf-8")
+            try:
+                domain, chars = json.JSONDecoder().raw_decode(text)
+            except ValueError:
+                return json.loads(body)
+            end = start + len(text[:chars].encode("utf-8"))
+            self.misses += 1
+            self._store(hashlib.sha1(body[start:end]).digest(), end - start, domain)
+
+        action_call = json.loads(body[:start] + b"null" + body[end:])
+        if not isinstance(action_call, dict) or action_call.get("domain", 0) is not None:
+            # The slice was a nested "domain" key, not the top-level one.
+            return json.loads(body)
+        action_call["domain"] = domain
+        return action_call
+
+
+domain_cache = DomainCache()
+
+REGISTRY.register(CallbackGauge("domain_cache_hits", "Action calls whose domain was already parsed.", lambda: domain_cache.hits))
+REGISTRY.register(CallbackGauge("domain_cache_misses", "Action calls whose domain had to be parsed.", lambda: domain_cache.misses))
+
+
+def _response_body(result: Any) -> Any:
+    # rasa_sdk 3 returns a pydantic model, rasa_sdk 2 a plain dict.
+    return result.model_dump() if hasattr(result, "model_dump") else result
+
+
+async def webhook(request: web.Request) -> web.Response:
+    executor = request.app["executor"]
+    body = await request.read()
+    if request.headers.get("Content-Encoding") == "deflate":
+        body = zlib.decompress(body)
+    try:
+        action_call = request.app["domain_cache"].decode(body)
+    except ValueError:
+        return web.json_response({"error": "Invalid body request"}, status=400)
+    utils.check_version_compatibility(action_call.get("version"))
+    try:
+        result = await executor.run(action_call)
+    except ActionExecutionRejection as e:
+        logger.debug(e)
+        return web.json_response({"error": e.message, "action_name": e.action_name}, status=400)
+    except ActionNotFoundException as e:
+        logger.error(e)
+        return web.json_response({"error": e.message, "action_name": e.action_name}, status=404)
+    return web.json_response(_response_body(result))
+
+
+async def close_client(app: web.Application) -> None:
+    await client.close()
+
+
+async def flush_reports(app: web.Application) -> None:
+    await asyncio.get_event_loop().run_in_executor(None, report_store.close)
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def list_actions(request: web.Request) -> web.Response:
+    return web.json_response([_response_body(a) for a in request.app["executor"].list_actions()])
+
+
+def create_app(actions_package: Text = "actions", cache: Optional[DomainCache] = None) -> web.Application:
+    executor = ActionExecutor()
+    executor.register_package(actions_package)
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["executor"] = executor
+    app["domain_cache"] = cache if cache is not None else domain_cache
+    app.router.add_post("/webhook", webhook)
+    app.router.add_get("/health", health)
+    app.router.add_get("/actions", list_actions)
+    app.on_cleanup.append(close_client)
+    app.on_cleanup.append(flush_reports)
+    return app
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the action server with domain caching.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--actions", default="actions", help="Package the actions are loaded from.")
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = create_argument_parser().parse_args()
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_app(arguments.actions), host=arguments.host, port=arguments.port, access_log=None)
@@ -0,0 +1,100 @@
+"""Per-request parse time and memory with and without the webhook's domain cache.
+
+    python -m benchmarks.domain_cache --requests 2000 --in-flight 50
+
+Request bodies are captured from synthetic interviews, encoded as Rasa 2.x
+sends them (domain included). Each body is decoded with a plain
+``json.loads``, as ``python -m rasa_sdk`` does, and with
+``actions.webhook.DomainCache``. Memory is the tracemalloc size of
+``--in-flight`` decoded requests held at once, as under concurrent load.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Text
+
+from actions.webhook import DomainCache
+from benchmarks.synthetic import DOMAIN_PATH, RULES_PATH, drive, interviews, load_yaml, symptom_forms
+
+
+def capture_bodies(count: int, domain: Dict[Text, Any]) -> List[bytes]:
+    bodies = []
+
+    async def run(payload):
+        bodies.append(json.dumps(payload).encode("utf-8"))
+        return []
+
+    loop = asyncio.new_event_loop()
+    try:
+        for interview in interviews(max(1, count // 20), domain, symptom_forms(load_yaml(RULES_PATH))):
+            loop.run_until_complete(drive(interview, run))
+            if len(bodies) >= count:
+                break
+    finally:
+        loop.close()
+    return bodies[:count]
+
+
+def time_decode(decode: Callable[[bytes], Any], bodies: List[bytes]) -> List[float]:
+    samples = []
+    for body in bodies:
+        started = time.perf_counter()
+        decode(body)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def held_bytes(decode: Callable[[bytes], Any], bodies: List[bytes]) -> int:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        held = [decode(body) for body in bodies]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del held
+    return after - before
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the webhook domain cache.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--in-flight", type=int, default=50, help="Requests held at once for the memory figure.")
+    parser.add_argument("--domain", default=DOMAIN_PATH)
+    parser.add_argument("-o", "--output", help="Also write the results as JSON.")
+    args = parser.parse_args()
+
+    bodies = capture_bodies(args.requests, load_yaml(args.domain))
+    cache = DomainCache()
+    cache.decode(bodies[0])
+    for body in bodies[:50]:
+        assert cache.decode(body) == json.loads(body)
+
+    results = {}
+    for name, decode in (("json.loads", json.loads), ("DomainCache", cache.decode)):
+        samples = time_decode(decode, bodies)
+        results[name] = {
+            "median_us": statistics.median(samples) * 1e6,
+            "p95_us": sorted(samples)[int(len(samples) * 0.95)] * 1e6,
+            "in_flight_kb": held_bytes(decode, bodies[:args.in_flight]) / 1024,
+        }
+    results["meta"] = {"requests": len(bodies), "mean_body_kb": statistics.mean(map(len, bodies)) / 1024,
+                       "in_flight": args.in_flight, "hit_ratio": cache.hit_ratio}
+
+    print("{} request bodies, {:.1f} KB each on average".format(len(bodies), results["meta"]["mean_body_kb"]))
+    print("{:<12} {:>12} {:>12} {:>20}".format("decoder", "median us", "p95 us", "{} held, KB".format(args.in_flight)))
+    for name in ("json.loads", "DomainCache"):
+        r = results[name]
+        print("{:<12} {:>12.1f} {:>12.1f} {:>20.1f}".format(name, r["median_us"], r["p95_us"], r["in_flight_kb"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
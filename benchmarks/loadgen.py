@@ -0,0 +1,195 @@
+"""Drive synthetic interviews against a running action server.
+
+    rasa run actions &                 # or: docker run -p 5055:5055 <actions image>
+    python -m scripts.infermedica_stub --latency lognormal:-1.5,0.5 &
+    INFERMEDICA_URL=http://localhost:8090/v3/ ...   # for the action server
+    python -m benchmarks.loadgen --url http://localhost:5055/webhook --concurrency 50 --duration 60
+
+Each of ``--concurrency`` virtual users runs synthetic interviews back to
+back (``benchmarks.synthetic``): history form, a symptom, its form, then
+the report, one webhook request per turn. Latency percentiles, throughput
+and error rates are reported per action name.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Text
+
+import aiohttp
+
+from benchmarks.synthetic import DOMAIN_PATH, RULES_PATH, Interview, drive, load_yaml, symptom_forms
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.interviews = 0
+        self.started = time.monotonic()
+
+    def record(self, action: Text, latency: float, ok: bool) -> None:
+        self.latencies[action].append(latency)
+        if not ok:
+            self.errors[action] += 1
+
+    def summary(self) -> Dict[Text, Any]:
+        elapsed = time.monotonic() - self.started
+        actions = {}
+        total = 0
+        for action, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            total += len(ordered)
+            actions[action] = {
+                "requests": len(ordered),
+                "errors": self.errors[action],
+                "error_rate": self.errors[action] / len(ordered),
+                "throughput_rps": len(ordered) / elapsed,
+                "p50_ms": percentile(ordered, 0.50) * 1000,
+                "p95_ms": percentile(ordered, 0.95) * 1000,
+                "p99_ms": percentile(ordered, 0.99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+            "interviews": self.interviews,
+            "interviews_per_s": self.interviews / elapsed if elapsed else 0.0,
+            "actions": actions,
+        }
+
+
+class LoadGenerator:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.domain = load_yaml(args.domain)
+        self.forms = symptom_forms(load_yaml(args.rules))
+        if args.form:
+            self.forms = {i: f for i, f in self.forms.items() if f in args.form}
+        self.intents = sorted(self.forms)
+        # The domain is the bulk of every request body; encode it once.
+        self.domain_json = json.dumps(self.domain, separators=(",", ":")) if args.send_domain else "{}"
+        self.stats = Stats()
+        self.rng = random.Random(args.seed)
+        self.count = 0
+
+    def encode(self, payload: Dict[Text, Any]) -> bytes:
+        rest = json.dumps({k: v for k, v in payload.items() if k != "domain"}, separators=(",", ":"))
+        return '{{"domain":{},{}'.format(self.domain_json, rest[1:]).encode("utf-8")
+
+    def next_interview(self) -> Optional[Interview]:
+        if self.args.interviews and self.count >= self.args.interviews:
+            return None
+        intent = self.intents[self.count % len(self.intents)]
+        sender_id = "load-{}-{}".format(self.args.seed, self.count)
+        self.count += 1
+        return Interview(sender_id, intent, self.forms[intent], self.domain, random.Random(self.rng.random()))
+
+    async def post(self, session: aiohttp.ClientSession, payload: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        action = payload["next_action"]
+        started = time.perf_counter()
+        events = []
+        ok = False
+        try:
+            async with session.post(self.args.url, data=self.encode(payload), headers={"Content-Type": "application/json"}) as resp:
+                body = await resp.read()
+                ok = resp.status == 200
+                if ok:
+                    events = json.loads(body).get("events", [])
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            ok = False
+        self.stats.record(action, time.perf_counter() - started, ok)
+        if self.args.think_time:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.args.think_time))
+        return events
+
+    async def user(self, session: aiohttp.ClientSession, deadline: float) -> None:
+        async def run(payload):
+            return await self.post(session, payload)
+
+        while time.monotonic() < deadline:
+            interview = self.next_interview()
+            if interview is None:
+                return
+            await drive(interview, run)
+            self.stats.interviews += 1
+
+    async def report_progress(self) -> None:
+        while True:
+            await asyncio.sleep(self.args.progress_interval)
+            summary = self.stats.summary()
+            print(
+                "{:.0f}s: {} requests, {:.1f} req/s, {} errors, {} interviews".format(
+                    summary["elapsed_s"], summary["requests"], summary["throughput_rps"], summary["errors"], summary["interviews"]
+                ),
+                file=sys.stderr,
+            )
+
+    async def run(self) -> Dict[Text, Any]:
+        deadline = time.monotonic() + self.args.duration if self.args.duration else float("inf")
+        connector = aiohttp.TCPConnector(limit=self.args.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        self.stats = Stats()
+        progress = asyncio.ensure_future(self.report_progress())
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                await asyncio.gather(*(self.user(session, deadline) for _ in range(self.args.concurrency)))
+        finally:
+            progress.cancel()
+        return self.stats.summary()
+
+
+def print_summary(summary: Dict[Text, Any]) -> None:
+    print("{:<36} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}".format("action", "requests", "err%", "req/s", "p50 ms", "p95 ms", "p99 ms"))
+    for action, s in summary["actions"].items():
+        print("{:<36} {:>8} {:>6.2f}% {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+            action, s["requests"], s["error_rate"] * 100, s["throughput_rps"], s["p50_ms"], s["p95_ms"], s["p99_ms"]))
+    print("{} requests ({} errors) in {:.1f}s: {:.1f} req/s, {:.2f} interviews/s".format(
+        summary["requests"], summary["errors"], summary["elapsed_s"], summary["throughput_rps"], summary["interviews_per_s"]))
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load-test the action server with synthetic interviews.")
+    parser.add_argument("--url", default="http://localhost:5055/webhook")
+    parser.add_argument("--concurrency", type=int, default=10, help="Interviews running at once.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run; 0 runs until --interviews are done.")
+    parser.add_argument("--interviews", type=int, default=0, help="Stop after this many interviews (0 = no limit).")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds a user waits between turns.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--form", action="append", help="Only interview for these forms (repeatable).")
+    parser.add_argument("--no-domain", dest="send_domain", action="store_false",
+                        help="Send an empty domain, as Rasa does when the server already has it.")
+    parser.add_argument("--domain", default=DOMAIN_PATH)
+    parser.add_argument("--rules", default=RULES_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--progress-interval", type=float, default=5.0)
+    parser.add_argument("-o", "--output", help="Also write the summary as JSON.")
+    return parser
+
+
+def main() -> int:
+    args = create_argument_parser().parse_args()
+    if not args.duration and not args.interviews:
+        print("Give --duration or --interviews", file=sys.stderr)
+        return 2
+    summary = asyncio.get_event_loop().run_until_complete(LoadGenerator(args).run())
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary["requests"] and summary["errors"] == summary["requests"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""Microbenchmarks for the form validators, SetSymptom and CreateReport.
+
+    python -m benchmarks.microbench -o bench.json
+    python -m benchmarks.microbench -o new.json --compare bench.json --threshold 0.2
+
+Trackers come from synthetic interviews (``benchmarks.synthetic``), so every
+form is timed at realistic fill stages. CreateReport talks to the offline
+Infermedica stand-in, started in-process with no injected latency, and
+is timed both with and without a report-cache hit. Results are written as
+JSON; ``--compare`` prints the ratio to an earlier run and fails if any
+benchmark's median got slower than ``--threshold``.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Text
+
+from aiohttp import web
+from rasa_sdk import Tracker
+from rasa_sdk.executor import ActionExecutor, CollectingDispatcher
+
+from actions.actions import CreateReport, SetSymptom
+from actions.evidence_bits import form_view
+from actions.form_engine import COMPILED_FORMS, DeclarativeFormValidationAction
+from actions.infermedica_client import client
+from actions.report_cache import MemoryBackend, report_cache
+from benchmarks.synthetic import DOMAIN_PATH, RULES_PATH, drive, interviews, load_yaml, symptom_forms
+from scripts import infermedica_stub
+
+STUB_PORT = 8097
+
+
+def summarize(samples: List[float]) -> Dict[Text, float]:
+    ordered = sorted(samples)
+    micros = 1e6
+    return {
+        "n": len(ordered),
+        "min_us": ordered[0] * micros,
+        "median_us": statistics.median(ordered) * micros,
+        "mean_us": statistics.mean(ordered) * micros,
+        "p95_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * micros,
+        "stdev_us": (statistics.stdev(ordered) if len(ordered) > 1 else 0.0) * micros,
+    }
+
+
+async def timed(func: Callable[[], Awaitable[Any]], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def maybe_await(value: Any) -> Any:
+    return await value if inspect.isawaitable(value) else value
+
+
+async def collect_trackers(count: int, domain: Dict[Text, Any]) -> Dict[Text, List[Dict[Text, Any]]]:
+    """Tracker states captured at every step of ``count`` synthetic interviews, by action."""
+    executor = ActionExecutor()
+    executor.register_package("actions")
+    captured = defaultdict(list)
+
+    async def run(payload):
+        captured[payload["next_action"]].append(payload["tracker"])
+        if payload["next_action"] == "action_create_report":
+            return []
+        response = await executor.run(payload)
+        return response.events if response else []
+
+    for interview in interviews(count, domain, symptom_forms(load_yaml(RULES_PATH))):
+        await drive(interview, run)
+    return captured
+
+
+async def bench_forms(captured, domain, repeat: int, results: Dict[Text, Any]) -> None:
+    dispatcher = CollectingDispatcher()
+    for cls in DeclarativeFormValidationAction.__subclasses__():
+        action = cls()
+        form = action.form_name()
+        states = captured.get(action.name(), [])
+        if not states:
+            continue
+        trackers = [Tracker.from_dict(state) for state in states]
+
+        position = 0
+
+        async def required_slots():
+            nonlocal position
+            tracker = trackers[position % len(trackers)]
+            position += 1
+            await action.required_slots([], dispatcher, tracker, domain)
+
+        results["required_slots.{}".format(form)] = summarize(await timed(required_slots, repeat))
+
+        compiled = COMPILED_FORMS[form]
+        slot_states = [form_view(form, t.slots) for t in trackers]
+
+        async def evaluate_cold():
+            nonlocal position
+            position += 1
+            compiled.evaluate(slot_states[position % len(slot_states)])
+
+        results["required_slots_cold.{}".format(form)] = summarize(await timed(evaluate_cold, repeat))
+
+        by_slot = defaultdict(list)
+        for tracker in trackers:
+            slot = tracker.get_slot("requested_slot")
+            if slot is not None and tracker.get_slot(slot) is not None:
+                by_slot[slot].append(tracker)
+        for slot, slot_trackers in sorted(by_slot.items()):
+            validator = getattr(action, "validate_" + slot, None)
+            if validator is None:
+                continue
+
+            async def validate():
+                nonlocal position
+                tracker = slot_trackers[position % len(slot_trackers)]
+                position += 1
+                await maybe_await(validator(tracker.get_slot(slot), CollectingDispatcher(), tracker, domain))
+
+            results["validate.{}.{}".format(form, slot)] = summarize(await timed(validate, repeat))
+
+
+async def bench_actions(captured, domain, repeat: int, results: Dict[Text, Any]) -> None:
+    set_symptom = SetSymptom()
+    symptom_trackers = [Tracker.from_dict(state) for state in captured["action_set_symptom"]]
+    position = 0
+
+    async def run_set_symptom():
+        nonlocal position
+        position += 1
+        await set_symptom.run(CollectingDispatcher(), symptom_trackers[position % len(symptom_trackers)], domain)
+
+    results["action_set_symptom"] = summarize(await timed(run_set_symptom, repeat))
+
+    create_report = CreateReport()
+    report_trackers = [Tracker.from_dict(state) for state in captured["action_create_report"]]
+
+    async def run_create_report():
+        nonlocal position
+        position += 1
+        await create_report.run(CollectingDispatcher(), report_trackers[position % len(report_trackers)], domain)
+
+    backend = report_cache.backend
+    # A zero-byte budget stores nothing, so every report goes to the API.
+    report_cache.backend = MemoryBackend(max_bytes=0)
+    results["action_create_report.uncached"] = summarize(await timed(run_create_report, repeat))
+    report_cache.backend = MemoryBackend()
+    for tracker in report_trackers:
+        await create_report.run(CollectingDispatcher(), tracker, domain)
+    results["action_create_report.cached"] = summarize(await timed(run_create_report, repeat))
+    report_cache.backend = backend
+
+
+def git_revision() -> Text:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[Text, Any]:
+    domain = load_yaml(args.domain)
+    stub_args = infermedica_stub.create_argument_parser().parse_args(["--port", str(STUB_PORT)])
+    runner = web.AppRunner(infermedica_stub.create_app(stub_args))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+    client.base_url = "http://127.0.0.1:{}/v3/".format(STUB_PORT)
+
+    results = {}
+    try:
+        captured = await collect_trackers(args.interviews, domain)
+        await bench_forms(captured, domain, args.repeat, results)
+        await bench_actions(captured, domain, args.repeat, results)
+    finally:
+        await client.close()
+        await runner.cleanup()
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "interviews": args.interviews,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[Text, Any], baseline: Dict[Text, Any], threshold: float) -> int:
+    regressions = 0
+    for name, stats in sorted(current["results"].items()):
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = stats["median_us"] / before["median_us"] if before["median_us"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print("{:<60} {:>10.1f}us -> {:>10.1f}us  x{:.2f}{}".format(name, before["median_us"], stats["median_us"], ratio, flag))
+    print("{} regression(s) over {:.0%}".format(regressions, threshold))
+    return 1 if regressions else 0
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Time form validators, SetSymptom and CreateReport.")
+    parser.add_argument("-o", "--output", default="microbench.json")
+    parser.add_argument("--domain", default=DOMAIN_PATH)
+    parser.add_argument("--interviews", type=int, default=60, help="Synthetic interviews to draw trackers from.")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per benchmark.")
+    parser.add_argument("--compare", help="Earlier results to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown, as a fraction.")
+    return parser
+
+
+def main() -> int:
+    args = create_argument_parser().parse_args()
+    # The synthetic answers trip rasa_sdk's per-slot "no validation method" warnings.
+    logging.getLogger("rasa_sdk").setLevel(logging.ERROR)
+    report = asyncio.get_event_loop().run_until_complete(run_benchmarks(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for name, stats in sorted(report["results"].items()):
+        print("{:<60} median {:>10.1f}us  p95 {:>10.1f}us".format(name, stats["median_us"], stats["p95_us"]))
+    print("Wrote {} benchmarks to {}".format(len(report["results"]), args.output))
+    if args.compare:
+        with open(args.compare) as f:
+            return compare(report, json.load(f), args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
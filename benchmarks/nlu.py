@@ -0,0 +1,249 @@
+"""Time the NLU pipeline of a trained model, per component and end to end.
+
+    rasa train nlu && python -m benchmarks.nlu -o nlu.json
+    python -m benchmarks.nlu --model models/nlu-variant.tar.gz -o variant.json --compare nlu.json
+
+Replays every example in ``data/nlu.yml`` (entity annotations stripped) and
+every button payload in ``domain.yml``. The buttons here send plain text
+such as "Yes" or "male", so those payloads run through the whole pipeline
+just like typed messages.
+
+Each message is parsed the way ``Interpreter.parse`` does it, with every
+component's ``process`` call timed separately. The whole ``parse`` call is
+also timed on its own for end-to-end latency. The first parses, which
+build the TensorFlow graphs, are reported as warm-up and not counted.
+
+Batched mode runs each component over ``--batch-size`` messages before the
+next component starts, and reports throughput. Rasa 2.x components have no
+batched inference call, so this measures the per-message calls grouped by
+stage, as an offline job would run them.
+
+Peak memory is the process's maximum resident set size, measured before
+the model is loaded and after the run.
+
+Needs the Rasa version the bot is trained with (``pip install rasa==2.7``).
+The action server's environment does not include it.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Text, Tuple
+
+from ruamel.yaml import YAML
+
+# Keep TensorFlow's start-up chatter out of the report.
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+NLU_PATH = "data/nlu.yml"
+DOMAIN_PATH = "domain.yml"
+# "[hay fever](allergy)" and "[hay fever]{"entity": "allergy"}" -> "hay fever"
+ENTITY_ANNOTATION = re.compile(r"\[([^\]]+)\](?:\([^)]*\)|\{[^}]*\})")
+
+
+def _load_yaml(path: Text) -> Dict[Text, Any]:
+    with open(path) as f:
+        return YAML(typ="safe").load(f)
+
+
+def nlu_examples(path: Text = NLU_PATH) -> List[Text]:
+    examples = []
+    for item in _load_yaml(path).get("nlu", []):
+        if "intent" not in item:
+            continue
+        for line in str(item.get("examples", "")).splitlines():
+            line = line.strip()
+            if line.startswith("- "):
+                examples.append(ENTITY_ANNOTATION.sub(r"\1", line[2:].strip()))
+    return examples
+
+
+def button_payloads(path: Text = DOMAIN_PATH) -> List[Text]:
+    """Distinct button payloads that reach the NLU pipeline.
+
+    Payloads starting with "/" name an intent directly and skip it.
+    """
+    payloads = []
+    for variations in (_load_yaml(path).get("responses") or {}).values():
+        for variation in variations or []:
+            for button in variation.get("buttons") or []:
+                payload = str(button.get("payload", ""))
+                if payload and not payload.startswith("/"):
+                    payloads.append(payload)
+    return list(dict.fromkeys(payloads))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_interpreter(model: Text):
+    """The NLU interpreter of a packed model, or the newest one in a directory."""
+    from rasa.model import get_model, get_model_subdirectories
+    from rasa.nlu.model import Interpreter
+
+    _, nlu_path = get_model_subdirectories(get_model(model))
+    if nlu_path is None:
+        raise ValueError("{} has no NLU model".format(model))
+    return Interpreter.load(nlu_path)
+
+
+def component_labels(interpreter) -> List[Text]:
+    """Unique labels: the pipeline has two CountVectorsFeaturizers."""
+    labels = []
+    for index, component in enumerate(interpreter.pipeline):
+        label = "{} {}".format(index, type(component).__name__)
+        analyzer = getattr(component, "component_config", {}).get("analyzer")
+        if analyzer and analyzer != "word":
+            label += " ({})".format(analyzer)
+        labels.append(label)
+    return labels
+
+
+def new_message(text: Text):
+    from rasa.nlu.model import Interpreter
+    from rasa.shared.nlu.training_data.message import Message
+
+    return Message(data=dict(Interpreter.default_output_attributes(), text=text))
+
+
+def time_components(interpreter, texts: List[Text], repeat: int) -> Dict[Text, List[float]]:
+    """Seconds per ``process`` call, by component label."""
+    labels = component_labels(interpreter)
+    samples = defaultdict(list)
+    for _ in range(repeat):
+        for text in texts:
+            message = new_message(text)
+            for label, component in zip(labels, interpreter.pipeline):
+                started = time.perf_counter()
+                component.process(message, **interpreter.context)
+                samples[label].append(time.perf_counter() - started)
+    return samples
+
+
+def time_parse(interpreter, texts: List[Text], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            interpreter.parse(text)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def time_batched(interpreter, texts: List[Text], batch_size: int, repeat: int) -> Tuple[float, Dict[Text, float]]:
+    """Total seconds to run all messages stage by stage, and seconds spent per component."""
+    labels = component_labels(interpreter)
+    per_component = dict.fromkeys(labels, 0.0)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for start in range(0, len(texts), batch_size):
+            messages = [new_message(text) for text in texts[start:start + batch_size]]
+            for label, component in zip(labels, interpreter.pipeline):
+                stage_started = time.perf_counter()
+                for message in messages:
+                    component.process(message, **interpreter.context)
+                per_component[label] += time.perf_counter() - stage_started
+    return time.perf_counter() - started, per_component
+
+
+def _rasa_version() -> Text:
+    import rasa
+
+    return rasa.__version__
+
+
+def run_benchmarks(args: argparse.Namespace) -> Tuple[Dict[Text, Any], Dict[Text, List[float]]]:
+    texts = nlu_examples(args.nlu) + button_payloads(args.domain)
+    if args.limit:
+        texts = texts[:args.limit]
+    memory = {"peak_rss_before_load_mb": peak_rss_mb()}
+
+    started = time.perf_counter()
+    interpreter = load_interpreter(args.model)
+    load_seconds = time.perf_counter() - started
+    memory["peak_rss_after_load_mb"] = peak_rss_mb()
+
+    warmup = time_parse(interpreter, texts[:args.warmup], 1)
+    samples = {"component/" + label: values for label, values in time_components(interpreter, texts, args.repeat).items()}
+    samples["parse/end_to_end"] = time_parse(interpreter, texts, args.repeat)
+    batched_seconds, batched_components = time_batched(interpreter, texts, args.batch_size, args.repeat)
+    memory["peak_rss_mb"] = peak_rss_mb()
+
+    parsed = len(texts) * args.repeat
+    end_to_end = sum(samples["parse/end_to_end"])
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "model": args.model,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rasa": _rasa_version(),
+            "messages": len(texts),
+            "repeat": args.repeat,
+            "batch_size": args.batch_size,
+        },
+        "load_seconds": load_seconds,
+        "warmup_ms": [seconds * 1000 for seconds in warmup],
+        "throughput": {
+            "sequential_messages_per_s": parsed / end_to_end if end_to_end else 0.0,
+            "batched_messages_per_s": parsed / batched_seconds if batched_seconds else 0.0,
+            "batched_component_share": {
+                label: seconds / batched_seconds for label, seconds in batched_components.items()
+            } if batched_seconds else {},
+        },
+        "memory": memory,
+    }
+    return report, samples
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Time the NLU pipeline of a trained model.")
+    parser.add_argument("-m", "--model", default="models", help="Packed model, or a directory holding them (newest is used).")
+    parser.add_argument("-o", "--output", default="nlu_bench.json")
+    parser.add_argument("--nlu", default=NLU_PATH)
+    parser.add_argument("--domain", default=DOMAIN_PATH)
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the messages per measurement.")
+    parser.add_argument("--warmup", type=int, default=20, help="Messages parsed before timing starts.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Messages per stage in batched mode.")
+    parser.add_argument("--limit", type=int, default=0, help="Only replay this many messages (0 = all).")
+    parser.add_argument("--compare", help="Earlier results to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown, as a fraction.")
+    return parser
+
+
+def main() -> int:
+    args = create_argument_parser().parse_args()
+    report, samples = run_benchmarks(args)
+    # Imported only now: the action code they pull in would count towards the memory figures.
+    from benchmarks.microbench import compare, git_revision, summarize
+
+    report["meta"]["revision"] = git_revision()
+    report["results"] = {name: summarize(values) for name, values in samples.items()}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print("Loaded {} in {:.1f}s; first parse {:.1f}ms".format(args.model, report["load_seconds"], (report["warmup_ms"] or [0.0])[0]))
+    for name, stats in report["results"].items():
+        print("{:<60} median {:>10.1f}us  p95 {:>10.1f}us".format(name, stats["median_us"], stats["p95_us"]))
+    throughput = report["throughput"]
+    print("Throughput: {:.1f} msg/s sequential, {:.1f} msg/s batched (--batch-size {})".format(
+        throughput["sequential_messages_per_s"], throughput["batched_messages_per_s"], args.batch_size))
+    memory = report["memory"]
+    print("Peak RSS: {:.0f} MB before load, {:.0f} MB after load, {:.0f} MB after the run".format(
+        memory["peak_rss_before_load_mb"], memory["peak_rss_after_load_mb"], memory["peak_rss_mb"]))
+    print("Wrote {} benchmarks to {}".format(len(report["results"]), args.output))
+    if args.compare:
+        with open(args.compare) as f:
+            return compare(report, json.load(f), args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
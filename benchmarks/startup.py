@@ -0,0 +1,180 @@
+"""Measure action-server startup: import time, time to first served request, idle memory.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --max-startup 3.0 --max-rss-mb 150   # fail if over budget
+    python -m benchmarks.startup --entrypoint rasa_sdk                # the stock SDK server
+
+Each run starts a fresh server with the Docker image's entrypoint
+(``python -m actions.prefork``, one worker by default) and times it from
+spawn until it has answered one webhook request (a history-form
+validation). Memory is read after ``--idle`` seconds without traffic,
+summed over the server's processes. RSS is the conservative figure the
+budget applies to. PSS splits the pages a pre-fork master shares with its
+workers between them. Import time is measured separately in a bare
+interpreter.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Text
+
+from benchmarks.synthetic import DOMAIN_PATH, load_yaml, request
+
+# What each --entrypoint runs; the Dockerfile uses prefork.
+ENTRYPOINTS = {
+    "prefork": ["-m", "actions.prefork", "--port", "{port}", "--workers", "{workers}"],
+    "webhook": ["-m", "actions.webhook", "--port", "{port}"],
+    "rasa_sdk": ["-m", "rasa_sdk", "--actions", "actions", "-p", "{port}"],
+}
+IMPORT_PROBE = "import time; t = time.perf_counter(); import actions.actions; print(time.perf_counter() - t)"
+
+
+def import_seconds() -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_PROBE], text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    for parent in pids:
+        try:
+            with open("/proc/{0}/task/{0}/children".format(parent)) as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _proc_kb(path: Text, field: Text) -> Optional[int]:
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def memory_mb(pid: int) -> Dict[Text, Optional[float]]:
+    """RSS and PSS summed over ``pid`` and its descendants."""
+    totals = {}
+    for key, path, field in (("rss", "/proc/{}/status", "VmRSS:"), ("pss", "/proc/{}/smaps_rollup", "Pss:")):
+        values = [_proc_kb(path.format(p), field) for p in process_tree(pid)]
+        totals[key] = None if None in values else sum(values) / 1024
+    if totals["rss"] is None:
+        try:
+            output = subprocess.check_output(["ps", "-o", "rss=", "-p", str(pid)], text=True)
+            totals["rss"] = int(output.strip()) / 1024
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            pass
+    return totals
+
+
+def first_request_body(domain: Dict[Text, Any]) -> bytes:
+    slots = {slot: None for slot in domain["slots"]}
+    slots.update(requested_slot="age", age="42")
+    payload = request(
+        "validate_history_taking_form", "startup-probe", slots, domain, "inform", "42",
+        [{"event": "slot", "name": "age", "value": "42"}], "history_taking_form",
+    )
+    return json.dumps(payload).encode("utf-8")
+
+
+def serve_once(url: Text, body: bytes) -> bool:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status == 200
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return False
+
+
+def measure(args: argparse.Namespace, body: bytes) -> Dict[Text, Any]:
+    url = "http://127.0.0.1:{}/webhook".format(args.port)
+    started = time.perf_counter()
+    command = [part.format(port=args.port, workers=args.workers) for part in ENTRYPOINTS[args.entrypoint]]
+    server = subprocess.Popen(
+        [sys.executable] + command,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=dict(os.environ),
+    )
+    try:
+        deadline = started + args.timeout
+        while not serve_once(url, body):
+            if server.poll() is not None:
+                raise RuntimeError("action server exited with status {}".format(server.returncode))
+            if time.perf_counter() > deadline:
+                raise RuntimeError("action server did not answer within {}s".format(args.timeout))
+            time.sleep(0.02)
+        first_request = time.perf_counter() - started
+        time.sleep(args.idle)
+        memory = memory_mb(server.pid)
+        return {"time_to_first_request_s": first_request, "rss_idle_mb": memory["rss"], "pss_idle_mb": memory["pss"]}
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Time action-server startup and measure idle memory.")
+    parser.add_argument("--entrypoint", choices=sorted(ENTRYPOINTS), default="prefork", help="Server to start.")
+    parser.add_argument("--workers", type=int, default=1, help="Workers for the prefork entrypoint.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--idle", type=float, default=2.0, help="Seconds to wait before reading RSS.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--domain", default=DOMAIN_PATH)
+    parser.add_argument("--max-startup", type=float, help="Budget for the median time to first request, in seconds.")
+    parser.add_argument("--max-rss-mb", type=float, help="Budget for the median idle RSS, in MB.")
+    parser.add_argument("-o", "--output", help="Also write the results as JSON.")
+    return parser
+
+
+def main() -> int:
+    args = create_argument_parser().parse_args()
+    body = first_request_body(load_yaml(args.domain))
+    imports = [import_seconds() for _ in range(args.runs)]
+    runs = [measure(args, body) for _ in range(args.runs)]
+    rss = [r["rss_idle_mb"] for r in runs if r["rss_idle_mb"] is not None]
+    pss = [r["pss_idle_mb"] for r in runs if r["pss_idle_mb"] is not None]
+    summary = {
+        "entrypoint": args.entrypoint,
+        "import_s": statistics.median(imports),
+        "time_to_first_request_s": statistics.median(r["time_to_first_request_s"] for r in runs),
+        "rss_idle_mb": statistics.median(rss) if rss else None,
+        "pss_idle_mb": statistics.median(pss) if pss else None,
+        "runs": runs,
+    }
+    print("import actions.actions      {:.3f}s".format(summary["import_s"]))
+    print("time to first request       {:.3f}s".format(summary["time_to_first_request_s"]))
+    if summary["rss_idle_mb"] is not None:
+        print("resident memory at idle     {:.1f} MB".format(summary["rss_idle_mb"]))
+    if summary["pss_idle_mb"] is not None:
+        print("proportional memory at idle {:.1f} MB".format(summary["pss_idle_mb"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    over = []
+    if args.max_startup is not None and summary["time_to_first_request_s"] > args.max_startup:
+        over.append("startup {:.3f}s > {:.3f}s".format(summary["time_to_first_request_s"], args.max_startup))
+    if args.max_rss_mb is not None and summary["rss_idle_mb"] is not None and summary["rss_idle_mb"] > args.max_rss_mb:
+        over.append("idle RSS {:.1f} MB > {:.1f} MB".format(summary["rss_idle_mb"], args.max_rss_mb))
+    for line in over:
+        print("Over budget: " + line)
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Synthetic interviews built from domain.yml and the form definitions.
+
+An interview starts with the history form, reports one symptom intent,
+answers that symptom's form turn by turn and ends with
+``action_create_report``. Every step is an action-server webhook request;
+the caller runs it and passes the returned events back in, so skip rules
+and re-prompts behave as they would against a real bot.
+"""
+import random
+from typing import Any, Dict, Generator, List, Optional, Text, Tuple
+
+from ruamel.yaml import YAML
+
+from actions.choices import CHOICE_TABLES
+from actions.evidence_bits import form_view
+from actions.form_engine import COMPILED_FORMS
+
+DOMAIN_PATH = "domain.yml"
+RULES_PATH = "data/rules.yml"
+HISTORY_FORM = "history_taking_form"
+# Turns spent on one slot before the interview gives up on it.
+MAX_ATTEMPTS = 2
+
+Step = Generator[Dict[Text, Any], List[Dict[Text, Any]], None]
+
+
+def load_yaml(path: Text) -> Dict[Text, Any]:
+    with open(path) as f:
+        # YAML 1.2, as Rasa reads it, so payloads like ``no`` stay strings.
+        return YAML(typ="safe").load(f)
+
+
+def symptom_forms(rules: Dict[Text, Any]) -> Dict[Text, Text]:
+    """Symptom intent -> form it activates, from the activation rules."""
+    forms = {}
+    for rule in rules.get("rules", []):
+        steps = rule.get("steps", [])
+        intents = [s["intent"] for s in steps if "intent" in s]
+        actions = [s["action"] for s in steps if "action" in s]
+        if len(intents) == 1 and actions[:1] == ["action_set_symptom"] and len(actions) > 1:
+            forms[intents[0]] = actions[1]
+    return forms
+
+
+def free_text(slot: Text, rng: random.Random) -> Text:
+    if slot in CHOICE_TABLES:
+        return rng.choice(list(CHOICE_TABLES[slot]))
+    if slot == "age":
+        return str(rng.randint(18, 85))
+    if slot == "gender":
+        return rng.choice(("male", "female"))
+    if slot == "temperature":
+        return "{:.1f}".format(rng.uniform(36.5, 40.0))
+    return "pollen"
+
+
+def answer(slot: Text, mappings: List[Dict[Text, Any]], rng: random.Random) -> Tuple[Text, Text, Any]:
+    """(intent, text, extracted value) for a user answering ``slot``."""
+    mapping = rng.choice(mappings) if mappings else {"type": "from_intent", "intent": "affirm", "value": True}
+    if mapping["type"] == "from_intent":
+        return mapping["intent"], mapping["intent"], mapping["value"]
+    text = free_text(slot, rng)
+    return "inform", text, text
+
+
+def request(
+    action: Text,
+    sender_id: Text,
+    slots: Dict[Text, Any],
+    domain: Dict[Text, Any],
+    intent: Text,
+    text: Text,
+    events: List[Dict[Text, Any]] = (),
+    active_loop: Optional[Text] = None,
+) -> Dict[Text, Any]:
+    """An action-server webhook request body."""
+    latest_message = {
+        "intent": {"name": intent, "confidence": 1.0},
+        "intent_ranking": [{"name": intent, "confidence": 1.0}],
+        "entities": [],
+        "text": text,
+    }
+    return {
+        "next_action": action,
+        "sender_id": sender_id,
+        "version": "2.7.0",
+        "domain": domain,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": slots,
+            "latest_message": latest_message,
+            "events": [{"event": "user", "text": text, "parse_data": latest_message}] + list(events),
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {"name": active_loop} if active_loop else {},
+            "latest_action_name": "action_listen",
+        },
+    }
+
+
+class Interview:
+    def __init__(
+        self, sender_id: Text, intent: Text, form: Text, domain: Dict[Text, Any], rng: random.Random
+    ) -> None:
+        self.sender_id = sender_id
+        self.intent = intent
+        self.form = form
+        self.domain = domain
+        self.rng = rng
+        self.slots = {slot: None for slot in domain["slots"]}
+
+    def apply(self, events: List[Dict[Text, Any]]) -> None:
+        for event in events or []:
+            if event.get("event") == "slot":
+                self.slots[event["name"]] = event.get("value")
+
+    def fill_form(self, form: Text) -> Step:
+        compiled = COMPILED_FORMS[form]
+        mappings = self.domain["forms"][form].get("required_slots") or {}
+        validate = "validate_" + form
+        attempts = {}
+        while True:
+            required = compiled.evaluate(form_view(form, self.slots)).required
+            pending = [s for s in required if self.slots.get(s) is None and attempts.get(s, 0) < MAX_ATTEMPTS]
+            if not pending:
+                return
+            slot = pending[0]
+            attempts[slot] = attempts.get(slot, 0) + 1
+            intent, text, value = answer(slot, mappings.get(slot, []), self.rng)
+            slots = dict(self.slots, requested_slot=slot)
+            slots[slot] = value
+            extracted = [{"event": "slot", "name": slot, "value": value}]
+            events = yield request(validate, self.sender_id, slots, self.domain, intent, text, extracted, form)
+            self.apply(events)
+
+    def steps(self) -> Step:
+        """Yield webhook requests; send back each response's events."""
+        yield from self.fill_form(HISTORY_FORM)
+        events = yield request("action_set_symptom", self.sender_id, dict(self.slots), self.domain, self.intent, self.intent)
+        self.apply(events)
+        if self.form in COMPILED_FORMS:
+            yield from self.fill_form(self.form)
+        yield request("action_create_report", self.sender_id, dict(self.slots), self.domain, "deny", "no")
+
+
+def interviews(
+    count: int, domain: Dict[Text, Any], forms: Dict[Text, Text], seed: int = 0, prefix: Text = "synthetic"
+) -> List[Interview]:
+    rng = random.Random(seed)
+    intents = sorted(forms)
+    return [
+        Interview("{}-{}".format(prefix, i), intents[i % len(intents)], forms[intents[i % len(intents)]], domain,
+                  random.Random(rng.random()))
+        for i in range(count)
+    ]
+
+
+async def drive(interview: Interview, run) -> None:
+    """Run every step of ``interview`` through ``await run(request) -> events``."""
+    steps = interview.steps()
+    try:
+        payload = next(steps)
+        while True:
+            payload = steps.send(await run(payload))
+    except StopIteration:
+        pass
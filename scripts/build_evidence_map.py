@@ -0,0 +1,194 @@
+"""Compile the slot -> Infermedica evidence mapping used by CreateReport.
+
+    python -m scripts.build_evidence_map [--domain domain.yml] [--strict]
+
+Every bool slot in the domain is matched by name (underscores read as
+spaces) against the symptom and risk-factor tables. The result is written
+to ``actions/evidence_map.json`` together with digests of both tables, so
+the action server can tell when the artifact is stale. Unmatched and
+ambiguous slots are reported; with ``--strict`` they fail the build.
+
+The artifact also lists the symptom intents SetSymptom handles (intents
+named after a mapped symptom slot) with their parent symptoms, e.g.
+``cough_productive`` -> ``cough``. A parent is the longest other symptom
+intent the name starts with, or an entry in ``EXTRA_PARENTS``.
+
+Finally it lists, per form, the derived evidence slots its validator packs
+into one tri-state bitset slot (``actions.evidence_bits``): everything the
+choice tables and the form's ``derived`` list set that no form asks for and
+no symptom intent sets. Packed slots need not be declared in the domain.
+
+``answer_slots`` fixes the order of the domain slots that hold the
+patient's answers, for the answered-slot mask ``actions.evidence`` keeps.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, List, Text
+
+from ruamel.yaml import YAML
+
+from actions.choices import CHOICE_TABLES, FromSlot
+from actions.form_definitions import FORM_DEFINITIONS
+
+# Kept in step with actions/infermedica_tables.py, which cannot be imported
+# here because it loads the artifact this script produces.
+TABLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "actions")
+SYMPTOM_TABLE = "infermedica_symptom_list.csv"
+RISK_FACTOR_TABLE = "infermedica_risk_factors.csv"
+EVIDENCE_MAP_PATH = os.path.join(TABLE_DIR, "evidence_map.json")
+# Parents that cannot be read off the intent name.
+EXTRA_PARENTS = {"hemoptysis": "cough"}
+# Kept in step with IGNORED_SLOTS in actions/evidence.py (bitset slots aside).
+BOOKKEEPING_SLOTS = ("requested_slot", "initial", "answered_slots")
+
+
+def table_digest(filename: Text) -> Text:
+    with open(os.path.join(TABLE_DIR, filename), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def read_table(filename: Text, name_column: Text, id_column: Text) -> Dict[Text, List[Text]]:
+    names = {}
+    with open(os.path.join(TABLE_DIR, filename), newline="") as f:
+        for row in csv.DictReader(f):
+            names.setdefault(row[name_column], []).append(row[id_column])
+    return names
+
+
+def build(domain_path: Text):
+    with open(domain_path) as f:
+        domain = YAML(typ="safe").load(f)
+    symptoms = read_table(SYMPTOM_TABLE, "symptom_name", "symptom_id")
+    risk_factors = read_table(RISK_FACTOR_TABLE, "risk_factor", "id")
+
+    bitsets = evidence_bitsets(domain)
+    packed = [slot for layout in bitsets.values() for slot in layout]
+    bool_slots = [slot for slot, definition in domain["slots"].items() if definition.get("type") == "bool"]
+
+    mapping = {}
+    unmatched = []
+    ambiguous = []
+    for slot in dict.fromkeys(bool_slots + packed):
+        name = slot.replace("_", " ")
+        candidates = [(i, "symptom") for i in symptoms.get(name, [])]
+        candidates += [(i, "risk_factor") for i in risk_factors.get(name, [])]
+        if not candidates:
+            unmatched.append(slot)
+            continue
+        if len(candidates) > 1:
+            ambiguous.append("{} -> {}".format(slot, ", ".join("{} ({})".format(*c) for c in candidates)))
+        # Symptoms win over risk factors, first row wins within a table.
+        mapping[slot] = list(candidates[0])
+
+    artifact = {
+        "symptom_table_sha1": table_digest(SYMPTOM_TABLE),
+        "risk_factor_table_sha1": table_digest(RISK_FACTOR_TABLE),
+        "slots": mapping,
+        "symptom_intents": symptom_intents(domain, mapping),
+        "evidence_bitsets": bitsets,
+        "answer_slots": answer_slots(domain, bitsets),
+    }
+    return artifact, unmatched, ambiguous
+
+
+def domain_intents(domain) -> List[Text]:
+    return [i if isinstance(i, str) else next(iter(i)) for i in domain.get("intents", [])]
+
+
+def evidence_bitsets(domain) -> Dict[Text, List[Text]]:
+    """Form -> the derived evidence slots packed into its bitset, in a fixed order."""
+    asked = {slot for definition in FORM_DEFINITIONS.values() for slot in definition["slots"]}
+    intents = set(domain_intents(domain))
+    bitsets = {}
+    for form, definition in FORM_DEFINITIONS.items():
+        derived = []
+        for slot in definition["slots"]:
+            for values in CHOICE_TABLES.get(slot, {}).values():
+                derived.extend(name for name, value in values.items() if isinstance(value, (bool, FromSlot)))
+        derived.extend(definition.get("derived", []))
+        layout = [slot for slot in dict.fromkeys(derived) if slot not in asked and slot not in intents]
+        if layout:
+            bitsets[form] = layout
+    return bitsets
+
+
+def answer_slots(domain, bitsets) -> List[Text]:
+    """Domain slots that can hold an answer, in domain order."""
+    bookkeeping = set(BOOKKEEPING_SLOTS) | {form + "_evidence" for form in bitsets}
+    return [slot for slot in domain["slots"] if slot not in bookkeeping]
+
+
+def symptom_intents(domain, mapping) -> Dict[Text, List[Text]]:
+    """Symptom intent -> its ancestors, nearest first."""
+    symptoms = {i for i in domain_intents(domain) if mapping.get(i, [None, None])[1] == "symptom"}
+    parent = dict(EXTRA_PARENTS)
+    for intent in symptoms:
+        if intent in parent:
+            continue
+        prefixes = [other for other in symptoms if intent.startswith(other + "_")]
+        if prefixes:
+            parent[intent] = max(prefixes, key=len)
+    ancestors = {}
+    for intent in sorted(symptoms):
+        chain = []
+        node = parent.get(intent)
+        while node is not None and node in symptoms and node not in chain:
+            chain.append(node)
+            node = parent.get(node)
+        ancestors[intent] = chain
+    return ancestors
+
+
+def write_artifact(artifact, f) -> None:
+    # One slot per line keeps the file compact and its diffs readable.
+    f.write("{\n")
+    for key in ("symptom_table_sha1", "risk_factor_table_sha1"):
+        f.write(" {}: {},\n".format(json.dumps(key), json.dumps(artifact[key])))
+    sections = ("slots", "symptom_intents", "evidence_bitsets")
+    for key in sections:
+        f.write(" {}: {{\n".format(json.dumps(key)))
+        entries = sorted(artifact[key].items())
+        for position, (name, entry) in enumerate(entries):
+            separator = "," if position < len(entries) - 1 else ""
+            f.write("  {}: {}{}\n".format(json.dumps(name), json.dumps(entry), separator))
+        f.write(" },\n")
+    # Order matters here, so this one stays a list.
+    f.write(' "answer_slots": [\n')
+    slots = artifact["answer_slots"]
+    for position, slot in enumerate(slots):
+        f.write("  {}{}\n".format(json.dumps(slot), "," if position < len(slots) - 1 else ""))
+    f.write(" ]\n")
+    f.write("}\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build actions/evidence_map.json from domain.yml and the Infermedica CSVs.")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--output", default=EVIDENCE_MAP_PATH)
+    parser.add_argument("--strict", action="store_true", help="Fail if any bool or packed slot is unmatched or ambiguous.")
+    args = parser.parse_args()
+
+    artifact, unmatched, ambiguous = build(args.domain)
+    with open(args.output, "w") as f:
+        write_artifact(artifact, f)
+
+    print("Mapped {} slots to Infermedica evidence, {} symptom intents and {} packed slots in {}".format(
+        len(artifact["slots"]), len(artifact["symptom_intents"]),
+        sum(map(len, artifact["evidence_bitsets"].values())), args.output))
+    if unmatched:
+        print("Unmatched bool slots ({}):".format(len(unmatched)))
+        for slot in unmatched:
+            print("  " + slot)
+    if ambiguous:
+        print("Ambiguous slots ({}):".format(len(ambiguous)))
+        for line in ambiguous:
+            print("  " + line)
+    return 1 if args.strict and (unmatched or ambiguous) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
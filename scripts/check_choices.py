@@ -0,0 +1,24 @@
+"""Check the choice validator tables against the options offered in domain.yml.
+
+    python -m scripts.check_choices [domain.yml]
+"""
+import sys
+
+from ruamel.yaml import YAML
+
+from actions.choices import check_choice_tables
+
+
+def main(domain_path: str = "domain.yml") -> int:
+    with open(domain_path) as f:
+        # YAML 1.2, as Rasa reads it, so payloads like ``no`` stay strings.
+        domain = YAML(typ="safe").load(f)
+    problems = check_choice_tables(domain)
+    for problem in problems:
+        print(problem)
+    print("{} problem(s) found".format(len(problems)))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
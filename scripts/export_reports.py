@@ -0,0 +1,341 @@
+"""Export stored reports to a date-partitioned columnar dataset for analytics.
+
+    python -m scripts.export_reports reports.db -o export/
+    python -m scripts.export_reports reports.db -o export/ --resume
+    python -m scripts.export_reports reports.db -o export/ --format arrow
+
+Reads the report store (``actions.report_store``) in id order, a batch at a
+time, and writes three tables under the output directory, each partitioned
+by the report's UTC date (``<table>/date=YYYY-MM-DD/part-<first id>.*``):
+
+    reports     one row per report: sex, age, age band, triage level, ...
+    evidence    one row per evidence item: Infermedica id, choice, source
+    conditions  one row per condition: Infermedica id, name, probability
+
+``evidence`` and ``conditions`` repeat the report's sex, age band and
+triage level, so cohort queries need no join. Infermedica ids and the other
+repetitive strings are dictionary-encoded, with codes kept stable across
+the whole export, ``--resume`` runs included. ``--format parquet`` (the default) is compressed;
+``--format arrow`` writes Arrow IPC files that can be memory-mapped.
+Either way, readers only touch the partitions and columns a query needs:
+
+    import pyarrow.dataset as ds
+    evidence = ds.dataset("export/evidence", partitioning="hive")
+    evidence.to_table(columns=["id", "triage_level"], filter=ds.field("date") >= "2026-10-01")
+
+``--resume`` exports only reports stored since the previous run into the
+same directory. Needs ``pyarrow``, which the action server itself does not.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Text, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from actions.report_cache import age_band
+
+# Written last, so a directory holding it holds a complete export.
+STATE_FILE = "_export_state.json"
+TABLES = ("reports", "evidence", "conditions")
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+
+SELECT = (
+    "SELECT id, created_at, sender_id, sex, age, triage_level, evidence, report"
+    " FROM reports WHERE id > ? ORDER BY id"
+)
+
+
+def _dictionary() -> "pa.DataType":
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def schemas() -> Dict[Text, "pa.Schema"]:
+    cohort = [
+        ("sex", _dictionary()),
+        ("age_band", _dictionary()),
+        ("triage_level", _dictionary()),
+    ]
+    return {
+        "reports": pa.schema([
+            ("report_id", pa.int64()),
+            ("created_at", pa.timestamp("ms", tz="UTC")),
+            ("sender_id", pa.string()),
+            ("sex", _dictionary()),
+            ("age", pa.int16()),
+            ("age_band", _dictionary()),
+            ("triage_level", _dictionary()),
+            ("triage_pending", pa.bool_()),
+            ("chief_complaint", pa.list_(pa.string())),
+            ("evidence_count", pa.int16()),
+            ("condition_count", pa.int16()),
+        ]),
+        "evidence": pa.schema([
+            ("report_id", pa.int64()),
+            ("id", _dictionary()),
+            ("choice_id", _dictionary()),
+            ("source", _dictionary()),
+        ] + cohort),
+        "conditions": pa.schema([
+            ("report_id", pa.int64()),
+            ("id", _dictionary()),
+            ("name", _dictionary()),
+            ("probability", pa.float32()),
+            ("rank", pa.int16()),
+        ] + cohort),
+    }
+
+
+class Vocabulary:
+    """Dictionary for one column that only grows, so codes never change.
+
+    Every batch carries the values seen so far; an Arrow IPC file then only
+    needs dictionary deltas, and equal values share a code across files.
+    """
+
+    def __init__(self, values: Optional[List[Text]] = None) -> None:
+        self._values = list(values or [])
+        self._codes = {value: code for code, value in enumerate(self._values)}
+
+    @property
+    def values(self) -> List[Text]:
+        return self._values
+
+    def encode(self, values: List[Optional[Text]]) -> "pa.DictionaryArray":
+        batch = pa.array(values, pa.string()).dictionary_encode()
+        # Map the batch's own (few) distinct values to their stable codes.
+        codes = []
+        for value in batch.dictionary.to_pylist():
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self._values)
+                self._values.append(value)
+            codes.append(code)
+        indices = pa.compute.take(pa.array(codes, pa.int32()), batch.indices)
+        return pa.DictionaryArray.from_arrays(indices, pa.array(self._values, pa.string()))
+
+
+def _age(age: Optional[Text]) -> Optional[int]:
+    try:
+        age = int(float(age))
+    except (TypeError, ValueError):
+        return None
+    return age if 0 <= age < 2 ** 15 else None
+
+
+def _date(created_at: float) -> Text:
+    return datetime.fromtimestamp(created_at, timezone.utc).strftime("%Y-%m-%d")
+
+
+class Columns:
+    """Rows of one table for one partition, collected column by column."""
+
+    def __init__(self, schema: "pa.Schema") -> None:
+        self.schema = schema
+        self.columns = {name: [] for name in schema.names}
+
+    def extend(self, count: int, **values: Any) -> None:
+        """Add ``count`` rows; each value is a list of ``count`` items or one item for every row."""
+        for name, column in self.columns.items():
+            value = values.get(name)
+            if isinstance(value, list):
+                column.extend(value)
+            else:
+                column.extend([value] * count)
+
+    def __len__(self) -> int:
+        return len(self.columns["report_id"])
+
+    def to_batch(self, vocabularies: Dict[Tuple[Text, Text], Vocabulary], table: Text) -> "pa.RecordBatch":
+        arrays = []
+        for field in self.schema:
+            values = self.columns[field.name]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(vocabularies[table, field.name].encode(values))
+            else:
+                arrays.append(pa.array(values, field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def add_report(partition: Dict[Text, Columns], row: Tuple[Any, ...], band_width: int) -> None:
+    report_id, created_at, sender_id, sex, age, triage_level, evidence, report = row
+    evidence = json.loads(evidence)
+    report = json.loads(report)
+    conditions = report.get("conditions", [])
+    cohort = {"sex": sex, "age_band": None if age is None else age_band(age, band_width), "triage_level": triage_level}
+    partition["reports"].extend(
+        1,
+        report_id=report_id,
+        created_at=int(created_at * 1000),
+        sender_id=sender_id,
+        age=_age(age),
+        triage_pending=triage_level is None,
+        # A list value is per row; this one row holds a list.
+        chief_complaint=[report.get("chief_complaint", [])],
+        evidence_count=len(evidence),
+        condition_count=len(conditions),
+        **cohort
+    )
+    partition["evidence"].extend(
+        len(evidence),
+        report_id=report_id,
+        id=[item["id"] for item in evidence],
+        choice_id=[item.get("choice_id") for item in evidence],
+        source=[item.get("source") for item in evidence],
+        **cohort
+    )
+    partition["conditions"].extend(
+        len(conditions),
+        report_id=report_id,
+        id=[condition.get("id") for condition in conditions],
+        name=[condition.get("name") for condition in conditions],
+        probability=[condition.get("probability") for condition in conditions],
+        rank=list(range(len(conditions))),
+        **cohort
+    )
+
+
+class DatasetWriter:
+    """One open file per table and date; files of dates no longer arriving are closed."""
+
+    def __init__(self, output: Text, file_format: Text, vocabularies: Optional[Dict[Text, List[Text]]] = None) -> None:
+        self.output = output
+        self.file_format = file_format
+        self.schemas = schemas()
+        self.vocabularies = defaultdict(Vocabulary)
+        # Saved by an earlier run as {"table/column": values}.
+        for key, values in (vocabularies or {}).items():
+            table, column = key.split("/", 1)
+            self.vocabularies[table, column] = Vocabulary(values)
+        self._open = {}
+        self.files = 0
+        self.rows = dict.fromkeys(TABLES, 0)
+
+    def _writer(self, table: Text, date: Text, first_id: int):
+        writer = self._open.get((table, date))
+        if writer is None:
+            directory = os.path.join(self.output, table, "date=" + date)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, "part-{}.{}".format(first_id, EXTENSIONS[self.file_format]))
+            schema = self.schemas[table]
+            if self.file_format == "arrow":
+                options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+                writer = pa.ipc.new_file(path, schema, options=options)
+            else:
+                writer = pa.parquet.ParquetWriter(path, schema, compression="zstd")
+            self._open[table, date] = writer
+            self.files += 1
+        return writer
+
+    def write(self, partitions: Dict[Text, Dict[Text, Columns]], first_ids: Dict[Text, int]) -> None:
+        for key in [key for key in self._open if key[1] not in partitions]:
+            self._open.pop(key).close()
+        for date, tables in sorted(partitions.items()):
+            for table, columns in tables.items():
+                if not len(columns):
+                    continue
+                batch = columns.to_batch(self.vocabularies, table)
+                self._writer(table, date, first_ids[date]).write_batch(batch)
+                self.rows[table] += len(columns)
+
+    def saved_vocabularies(self) -> Dict[Text, List[Text]]:
+        return {"{}/{}".format(*key): vocabulary.values for key, vocabulary in sorted(self.vocabularies.items())}
+
+    def close(self) -> None:
+        for writer in self._open.values():
+            writer.close()
+        self._open.clear()
+
+
+def read_batches(connection: sqlite3.Connection, after_id: int, batch_size: int) -> Iterator[List[Tuple[Any, ...]]]:
+    cursor = connection.execute(SELECT, (after_id,))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def read_state(output: Text) -> Optional[Dict[Text, Any]]:
+    try:
+        with open(os.path.join(output, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_state(output: Text, state: Dict[Text, Any]) -> None:
+    path = os.path.join(output, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def run(args: argparse.Namespace) -> int:
+    if pa is None:
+        print("scripts.export_reports needs pyarrow: pip install pyarrow", file=sys.stderr)
+        return 2
+    state = read_state(args.output)
+    if state is not None and not args.resume:
+        print("{} already holds an export; pass --resume to extend it".format(args.output), file=sys.stderr)
+        return 2
+    if state is not None and state["format"] != args.format:
+        print("{} holds a {} export".format(args.output, state["format"]), file=sys.stderr)
+        return 2
+    after_id = state["last_id"] if state else 0
+
+    # Read-only, so exporting never blocks the action server writing reports.
+    connection = sqlite3.connect("file:{}?mode=ro".format(args.database), uri=True)
+    writer = DatasetWriter(args.output, args.format, state.get("vocabularies") if state else None)
+    started = time.monotonic()
+    last_id = after_id
+    try:
+        for rows in read_batches(connection, after_id, args.batch_size):
+            partitions = {}
+            first_ids = {}
+            for row in rows:
+                date = _date(row[1])
+                if date not in partitions:
+                    partitions[date] = {table: Columns(writer.schemas[table]) for table in TABLES}
+                    first_ids[date] = row[0]
+                add_report(partitions[date], row, args.age_band)
+            writer.write(partitions, first_ids)
+            last_id = rows[-1][0]
+    finally:
+        writer.close()
+        connection.close()
+    write_state(args.output, {"format": args.format, "last_id": last_id, "vocabularies": writer.saved_vocabularies()})
+    elapsed = time.monotonic() - started
+    print(
+        "Exported {reports} reports ({evidence} evidence items, {conditions} conditions) to {files} files in {elapsed:.1f}s".format(
+            files=writer.files, elapsed=elapsed, **writer.rows
+        ),
+        file=sys.stderr,
+    )
+    return 0
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Export stored reports to a date-partitioned Parquet or Arrow dataset.")
+    parser.add_argument("database", help="Report store written by the action server (REPORT_STORE_PATH).")
+    parser.add_argument("-o", "--output", required=True, help="Dataset directory.")
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="parquet")
+    parser.add_argument("--resume", action="store_true", help="Add the reports stored since the last export to the output.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Reports read and written at a time.")
+    parser.add_argument("--age-band", type=int, default=10, help="Width in years of the age_band column.")
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(run(create_argument_parser().parse_args()))
@@ -0,0 +1,207 @@
+"""Local stand-in for the Infermedica ``/diagnosis`` and ``/triage`` endpoints.
+
+Point the action server at it with ``INFERMEDICA_URL=http://localhost:8090/v3/``.
+
+    # replay a cassette, synthesising answers for unknown evidence
+    python -m scripts.infermedica_stub --cassette cassettes/urti.jsonl --latency lognormal:-1.2,0.4
+
+    # proxy to the live API and append every exchange to the cassette
+    python -m scripts.infermedica_stub --cassette cassettes/urti.jsonl --record
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from typing import Any, Callable, Dict, Optional, Text
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+UPSTREAM_URL = "https://api.infermedica.com/v3/"
+ENDPOINTS = ("diagnosis", "triage")
+FORWARDED_HEADERS = ("App-Id", "App-Key", "Model", "Dev-Mode", "Interview-Id")
+
+SYNTHETIC_CONDITIONS = [
+    ("c_1", "Common cold", "Common cold"),
+    ("c_10", "Gastroesophageal reflux disease", "GERD"),
+    ("c_55", "Tension-type headaches", "Tension-type headache"),
+    ("c_87", "Acute sinusitis", "Sinusitis"),
+    ("c_105", "Acute bronchitis", "Bronchitis"),
+    ("c_146", "Contact dermatitis", "Contact dermatitis"),
+    ("c_232", "Acute gastroenteritis", "Stomach flu"),
+]
+TRIAGE_LEVELS = ("self_care", "consultation", "consultation_24", "emergency", "emergency_ambulance")
+
+
+def request_key(endpoint: Text, data: Dict[Text, Any]) -> Text:
+    evidence = sorted((e.get("id"), e.get("choice_id"), e.get("source", "")) for e in data.get("evidence", []))
+    age = data.get("age", {})
+    payload = [endpoint, str(data.get("sex")), str(age.get("value") if isinstance(age, dict) else age), evidence]
+    return hashlib.sha1(json.dumps(payload, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def parse_latency(spec: Text) -> Callable[[], float]:
+    """Build a delay sampler (seconds) from ``kind:params``.
+
+    ``fixed:0.3``, ``uniform:0.1,0.5``, ``normal:0.3,0.05``, ``lognormal:mu,sigma``,
+    ``pareto:alpha,scale`` or ``none``.
+    """
+    kind, _, params = spec.partition(":")
+    args = [float(p) for p in params.split(",") if p]
+    if kind == "none":
+        return lambda: 0.0
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(args[0], args[1])
+    if kind == "pareto":
+        return lambda: args[1] * random.paretovariate(args[0])
+    raise ValueError("Unknown latency distribution '{}'".format(spec))
+
+
+def synthetic_response(endpoint: Text, data: Dict[Text, Any]) -> Dict[Text, Any]:
+    # Deterministic for a given evidence set so repeated runs are comparable.
+    rng = random.Random(request_key(endpoint, data))
+    present = sum(1 for e in data.get("evidence", []) if e.get("choice_id") == "present")
+    if endpoint == "triage":
+        level = TRIAGE_LEVELS[min(present // 8, len(TRIAGE_LEVELS) - 1)]
+        return {"triage_level": level, "serious": [], "root_cause": "synthetic", "teleconsultation_applicable": True}
+    conditions = []
+    for condition_id, name, common_name in rng.sample(SYNTHETIC_CONDITIONS, 3):
+        conditions.append({"id": condition_id, "name": name, "common_name": common_name,
+                           "probability": round(rng.uniform(0.05, 0.9), 4)})
+    conditions.sort(key=lambda c: c["probability"], reverse=True)
+    return {"question": None, "conditions": conditions, "extras": {}, "has_emergency_evidence": False,
+            "should_stop": True, "interview_token": "synthetic"}
+
+
+class Cassette:
+    def __init__(self, path: Optional[Text]) -> None:
+        self.path = path
+        self.entries = {}
+        if path:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self.entries[request_key(entry["endpoint"], entry["request"])] = entry
+            except FileNotFoundError:
+                pass
+
+    def lookup(self, endpoint: Text, data: Dict[Text, Any]) -> Optional[Dict[Text, Any]]:
+        return self.entries.get(request_key(endpoint, data))
+
+    def record(self, entry: Dict[Text, Any]) -> None:
+        self.entries[request_key(entry["endpoint"], entry["request"])] = entry
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+class StubState:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.cassette = Cassette(args.cassette)
+        self.latency = parse_latency(args.latency)
+        self.replay_latency = args.replay_latency
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.strict = args.strict
+        self.record = args.record
+        self.upstream = args.upstream.rstrip("/") + "/"
+        self.session = None
+        self.requests = 0
+        self.replayed = 0
+        self.synthesized = 0
+        self.errors = 0
+
+
+async def handle(request: web.Request) -> web.Response:
+    state = request.app["state"]
+    endpoint = request.match_info["endpoint"]
+    data = await request.json()
+    state.requests += 1
+
+    if state.record:
+        return await proxy(state, request, endpoint, data)
+
+    entry = state.cassette.lookup(endpoint, data)
+    if state.replay_latency and entry is not None:
+        delay = entry.get("latency", 0.0)
+    else:
+        delay = state.latency()
+    await asyncio.sleep(delay)
+
+    if random.random() < state.error_rate:
+        state.errors += 1
+        return web.json_response({"message": "injected error"}, status=state.error_status)
+    if entry is not None:
+        state.replayed += 1
+        return web.json_response(entry["response"], status=entry.get("status", 200))
+    if state.strict:
+        state.errors += 1
+        return web.json_response({"message": "no recorded response"}, status=404)
+    state.synthesized += 1
+    return web.json_response(synthetic_response(endpoint, data))
+
+
+async def proxy(state: StubState, request: web.Request, endpoint: Text, data: Dict[Text, Any]) -> web.Response:
+    if state.session is None:
+        state.session = ClientSession(timeout=ClientTimeout(total=30))
+    headers = {h: request.headers[h] for h in FORWARDED_HEADERS if h in request.headers}
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    async with state.session.post(state.upstream + endpoint, json=data, headers=headers) as resp:
+        body = await resp.json(content_type=None)
+        status = resp.status
+    state.cassette.record({"endpoint": endpoint, "request": data, "status": status,
+                           "response": body, "latency": round(loop.time() - started, 4)})
+    return web.json_response(body, status=status)
+
+
+async def stats(request: web.Request) -> web.Response:
+    state = request.app["state"]
+    return web.json_response({"requests": state.requests, "replayed": state.replayed,
+                              "synthesized": state.synthesized, "errors": state.errors,
+                              "cassette_entries": len(state.cassette.entries)})
+
+
+async def close_session(app: web.Application) -> None:
+    if app["state"].session is not None:
+        await app["state"].session.close()
+
+
+def create_app(args: argparse.Namespace) -> web.Application:
+    app = web.Application()
+    app["state"] = StubState(args)
+    app.router.add_post("/v3/{endpoint:(diagnosis|triage)}", handle)
+    app.router.add_get("/stats", stats)
+    app.on_cleanup.append(close_session)
+    return app
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline Infermedica /diagnosis and /triage stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--cassette", help="JSONL file of recorded request/response pairs.")
+    parser.add_argument("--record", action="store_true",
+                        help="Proxy to --upstream and append every exchange to the cassette.")
+    parser.add_argument("--upstream", default=UPSTREAM_URL)
+    parser.add_argument("--latency", default="none", help="Injected delay distribution, e.g. lognormal:-1.2,0.4")
+    parser.add_argument("--replay-latency", action="store_true",
+                        help="Use the latency recorded in the cassette for replayed entries.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail.")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--strict", action="store_true",
+                        help="Return 404 for requests missing from the cassette instead of synthesising.")
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = create_argument_parser().parse_args()
+    web.run_app(create_app(arguments), host=arguments.host, port=arguments.port)
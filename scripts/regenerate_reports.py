@@ -0,0 +1,214 @@
+"""Re-run diagnosis and triage for exported conversations.
+
+    python -m scripts.regenerate_reports trackers.jsonl -o reports.jsonl --workers 4 --concurrency 16
+    python -m scripts.regenerate_reports trackers.jsonl -o reports.jsonl --resume
+
+Input is JSONL with one tracker per line, or a tracker-store dump holding
+a JSON list of trackers or a ``{sender_id: tracker}`` object. A tracker's
+``slots`` are used when present, otherwise its ``slot`` events are
+replayed. Evidence is built exactly as ``action_create_report`` builds it.
+
+Chunks of trackers are spread over a process pool; each worker keeps up
+to ``--concurrency`` Infermedica requests in flight. Results are appended
+to the output as they finish, one JSON object per line tagged with the
+input line, so the output doubles as the checkpoint: ``--resume`` skips
+every line already written.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Set, Text, Tuple
+
+from actions.evidence import evidence_from_slots
+from actions.infermedica_client import InfermedicaError, client
+from actions.report_cache import report_cache
+
+Record = Tuple[int, Dict[Text, Any]]
+
+# Per worker process, set up by ``_init_worker``.
+_loop = None
+_semaphore = None
+_use_cache = False
+
+
+def read_trackers(path: Text) -> Iterator[Record]:
+    """Yield ``(position, tracker)`` pairs; JSONL input is streamed."""
+    with open(path) as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[" or (first == "{" and not path.endswith(".jsonl")):
+            dump = json.load(f)
+            if isinstance(dump, dict):
+                if "events" in dump or "slots" in dump:
+                    dump = [dump]
+                else:
+                    dump = [dict(tracker, sender_id=sender_id) for sender_id, tracker in dump.items()]
+            yield from enumerate(dump)
+            return
+        for position, line in enumerate(f):
+            if line.strip():
+                yield position, json.loads(line)
+
+
+def tracker_slots(tracker: Dict[Text, Any]) -> Dict[Text, Any]:
+    if tracker.get("slots") is not None:
+        return tracker["slots"]
+    slots = {}
+    for event in tracker.get("events", []):
+        kind = event.get("event")
+        if kind == "slot":
+            slots[event["name"]] = event.get("value")
+        elif kind == "restart":
+            slots = {}
+    return slots
+
+
+def read_checkpoint(path: Text) -> Set[int]:
+    done = set()
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["line"])
+                except (ValueError, KeyError):
+                    # A partial last line from an interrupted run.
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+
+async def regenerate(position: int, tracker: Dict[Text, Any]) -> Dict[Text, Any]:
+    slots = tracker_slots(tracker)
+    sex, age = slots.get("gender"), slots.get("age")
+    evidence = evidence_from_slots(slots)
+    output = {"line": position, "sender_id": tracker.get("sender_id"), "evidence": evidence}
+    if not evidence or sex is None or age is None:
+        output["error"] = "incomplete interview"
+        return output
+    async with _semaphore:
+        try:
+            result = await report_cache.get(evidence, sex, age) if _use_cache else None
+            if result is None:
+                result = await client.diagnosis_and_triage(evidence=evidence, sex=sex, age=age)
+                if _use_cache:
+                    await report_cache.set(evidence, sex, age, result)
+        except InfermedicaError as e:
+            output["error"] = str(e)
+            return output
+    diagnosis, triage = result
+    output.update(diagnosis=diagnosis, triage=triage, triage_level=triage.get("triage_level"))
+    return output
+
+
+def _init_worker(concurrency: int, use_cache: bool) -> None:
+    global _loop, _semaphore, _use_cache
+    # One loop per process, so the pooled HTTP session survives across chunks.
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _semaphore = asyncio.Semaphore(concurrency)
+    _use_cache = use_cache
+
+
+def _run_chunk(chunk: List[Record]) -> List[Dict[Text, Any]]:
+    async def run():
+        return await asyncio.gather(*(regenerate(position, tracker) for position, tracker in chunk))
+
+    return _loop.run_until_complete(run())
+
+
+def chunked(records: Iterator[Record], size: int, skip: Set[int]) -> Iterator[List[Record]]:
+    chunk = []
+    for record in records:
+        if record[0] in skip:
+            continue
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Progress:
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last = self.started
+        self.done = 0
+        self.errors = 0
+
+    def update(self, results: List[Dict[Text, Any]], force: bool = False) -> None:
+        self.done += len(results)
+        self.errors += sum(1 for r in results if "error" in r)
+        now = time.monotonic()
+        if force or now - self.last >= self.interval:
+            self.last = now
+            elapsed = now - self.started
+            print(
+                "{} reports ({} errors) in {:.1f}s, {:.1f} reports/s".format(
+                    self.done, self.errors, elapsed, self.done / elapsed if elapsed else 0.0
+                ),
+                file=sys.stderr,
+            )
+
+
+def run(args: argparse.Namespace) -> int:
+    done = read_checkpoint(args.output) if args.resume else set()
+    if done:
+        print("Resuming: skipping {} already regenerated trackers".format(len(done)), file=sys.stderr)
+    progress = Progress(args.progress_interval)
+    chunks = chunked(read_trackers(args.input), args.chunk_size, done)
+
+    with open(args.output, "a" if args.resume else "w") as out, ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(args.concurrency, args.use_cache)
+    ) as pool:
+        if args.resume and out.tell() > 0:
+            # Terminate a line cut short by an interrupted run.
+            out.write("\n")
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            # Keep each worker busy with one chunk queued behind it, but never
+            # read more of the input than that.
+            while not exhausted and len(pending) < args.workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(_run_chunk, chunk))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results = future.result()
+                for result in results:
+                    out.write(json.dumps(result, separators=(",", ":")) + "\n")
+                out.flush()
+                progress.update(results)
+    progress.update([], force=True)
+    return 1 if args.fail_on_error and progress.errors else 0
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Regenerate diagnosis/triage reports for exported trackers.")
+    parser.add_argument("input", help="Tracker JSONL, or a JSON tracker-store dump.")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results, also used as the checkpoint.")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Infermedica requests in flight per worker.")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Trackers handed to a worker at a time.")
+    parser.add_argument("--resume", action="store_true", help="Append to the output, skipping trackers already in it.")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="Reuse cached results (REPORT_CACHE_*); off by default since regeneration usually follows a model change.")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between throughput lines.")
+    parser.add_argument("--fail-on-error", action="store_true", help="Exit 1 if any tracker failed.")
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(run(create_argument_parser().parse_args()))
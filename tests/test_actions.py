@@ -0,0 +1,923 @@
+"""Unit tests for the action server's building blocks.
+
+    python -m pytest tests
+
+``data/required_slots_baseline.json`` holds ``required_slots`` results of
+the hand-written form validators the declarative forms replaced, for random
+assignments of the slots those validators read. Each case stores the slots
+the baseline skipped from the form's full order.
+"""
+import asyncio
+import json
+import os
+import queue
+import random
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from rasa_sdk import Tracker
+from rasa_sdk.events import SlotSet
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions import infermedica_client, prefetch, prefork, report_cache, tracing
+from actions.actions import SetSymptom
+from actions.choices import CHOICE_TABLES, REPROMPT, FromSlot, validate_choice
+from actions.evidence import ANSWERS_SLOT, answers_from_slots, evidence_from_slots, record_answers
+from actions.evidence_bits import BITSETS, form_view, pack_events, unpack
+from actions.form_engine import COMPILED_FORMS
+from actions.infermedica_client import CircuitBreaker, InfermedicaClient, InfermedicaError
+from actions.infermedica_tables import ANSWER_SLOTS
+from actions.prefetch import Prefetcher
+from actions.report import DEFAULT_ADVICE, PENDING_ADVICE, TRIAGE_ADVICE, build_report, send_report
+from actions.report_cache import MemoryBackend, ReportCache, cache_key
+from actions.report_store import INSERT, ReportStore, connect
+from actions.symptoms import SymptomRegistry, chief_complaints, symptom_registry
+from actions.triage import RED_FLAG_RULES, TriageResult, red_flag_triage
+from actions.webhook import DomainCache
+from scripts import export_reports, regenerate_reports
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "tests", "data", "required_slots_baseline.json")
+
+with open(BASELINE_PATH) as f:
+    BASELINE = json.load(f)["forms"]
+
+EVIDENCE = [{"id": "s_21", "choice_id": "present", "source": "initial"}, {"id": "s_98", "choice_id": "absent"}]
+
+
+def tracker(slots):
+    return Tracker("test", slots, {}, [], False, None, {}, "action_listen")
+
+
+# ReportCache
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_bytes=10)
+
+    async def fill():
+        await backend.set("a", b"aaaa", 60)
+        await backend.set("b", b"bbbb", 60)
+        assert await backend.get("a") == b"aaaa"
+        await backend.set("c", b"cccc", 60)
+        await backend.set("huge", b"x" * 11, 60)
+        return [await backend.get(key) for key in ("a", "b", "c", "huge")]
+
+    assert asyncio.run(fill()) == [b"aaaa", None, b"cccc", None]
+    assert (len(backend), backend.size) == (2, 8)
+
+
+def test_memory_backend_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(report_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    backend = MemoryBackend()
+
+    async def get():
+        return await backend.get("key")
+
+    asyncio.run(backend.set("key", b"value", 10))
+    now[0] += 9.9
+    assert asyncio.run(get()) == b"value"
+    now[0] += 0.2
+    assert asyncio.run(get()) is None
+    assert (len(backend), backend.size) == (0, 0)
+
+
+def test_cache_key_ignores_order_duplicates_and_nearby_ages():
+    key = cache_key(EVIDENCE, "male", 30)
+    assert cache_key(list(reversed(EVIDENCE)) + EVIDENCE[:1], "Male", "34") == key
+    assert cache_key(EVIDENCE, "male", 35) != key
+    assert cache_key(EVIDENCE, "female", 30) != key
+    assert cache_key(EVIDENCE[:1], "male", 30) != key
+    assert cache_key([dict(EVIDENCE[1], choice_id="present")] + EVIDENCE[:1], "male", 30) != key
+
+
+def test_report_cache_round_trip():
+    cache = ReportCache(MemoryBackend())
+    result = ({"conditions": [{"id": "c_1", "name": "Flu", "probability": 0.5}]}, {"triage_level": "consultation"})
+
+    async def use():
+        assert await cache.get(EVIDENCE, "male", 30) is None
+        await cache.set(EVIDENCE, "male", 30, result)
+        return await cache.get(list(reversed(EVIDENCE)), "male", 31)
+
+    assert asyncio.run(use()) == result
+    assert (cache.hits, cache.misses, cache.hit_ratio) == (1, 1, 0.5)
+
+
+class BrokenBackend:
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+    async def set(self, key, value, ttl):
+        raise ConnectionError("redis is down")
+
+
+def test_report_cache_fails_open():
+    cache = ReportCache(BrokenBackend())
+
+    async def use():
+        await cache.set(EVIDENCE, "male", 30, ({"conditions": []}, {"triage_level": "consultation"}))
+        return await cache.get(EVIDENCE, "male", 30)
+
+    assert asyncio.run(use()) is None
+    assert (cache.hits, cache.misses, cache.errors) == (0, 1, 2)
+
+
+def test_report_cache_treats_unreadable_entries_as_misses():
+    backend = MemoryBackend()
+    cache = ReportCache(backend)
+    asyncio.run(backend.set(cache_key(EVIDENCE, "male", 30), b"not json", 60))
+    assert asyncio.run(cache.get(EVIDENCE, "male", 30)) is None
+    assert (cache.misses, cache.errors) == (1, 1)
+
+
+# Answered slots and evidence
+
+
+def apply(slots, events):
+    slots = dict(slots)
+    slots.update((e["name"], e["value"]) for e in events if e["event"] == "slot")
+    return slots
+
+
+def answer(slots, *events):
+    events = list(events)
+    recorded = record_answers(tracker(slots), events)
+    return apply(slots, events + ([recorded] if recorded else []))
+
+
+def test_record_answers_tracks_set_and_cleared_slots():
+    slots = answer({}, SlotSet("age", "30"), SlotSet("abdominal_pain", True), SlotSet("requested_slot", "cough"))
+    slots = answer(slots, SlotSet("cough", False), SlotSet("smoking_cigarettes", True))
+    slots = answer(slots, SlotSet("abdominal_pain", None))
+    assert answers_from_slots(slots) == {"age": "30", "smoking_cigarettes": True, "cough": False}
+
+
+def test_record_answers_ignores_turns_without_answers():
+    assert record_answers(tracker({}), [SlotSet("requested_slot", "age"), SlotSet("initial", ["headache"])]) is None
+
+
+def test_recorded_answers_stay_a_fixed_size():
+    slots = {}
+    for slot in ANSWER_SLOTS:
+        slots = answer(slots, SlotSet(slot, True))
+    assert len(answers_from_slots(slots)) == len(ANSWER_SLOTS)
+    assert len(slots[ANSWERS_SLOT]) <= len(ANSWER_SLOTS) // 4 + 6
+
+
+@pytest.mark.parametrize("recorded", [None, {"cough": False}, "0.1", "not a mask"])
+def test_answers_fall_back_to_the_slots(recorded):
+    slots = {ANSWERS_SLOT: recorded, "cough": False, "age": "30", "initial": ["headache"], "requested_slot": None}
+    assert answers_from_slots(slots) == {"age": "30", "cough": False}
+
+
+def test_answers_include_packed_evidence():
+    form, bitset = next(iter(BITSETS.items()))
+    slots = answer({}, SlotSet("age", "30"))
+    slots[bitset.slot_name] = bitset.update(None, {bitset.slots[0]: True})
+    assert answers_from_slots(slots) == {"age": "30", bitset.slots[0]: True}
+
+
+def test_evidence_from_recorded_answers():
+    slots = answer({"initial": ["headache", "headache"]}, SlotSet("abdominal_pain", True), SlotSet("cough", False),
+                   SlotSet("smoking_cigarettes", True), SlotSet("age", "30"), SlotSet("abdominal_pain_type", "cramping"))
+    evidence = evidence_from_slots(slots)
+    assert evidence[0] == {"id": "s_21", "choice_id": "present", "source": "initial"}
+    assert sorted(evidence[1:], key=lambda e: e["id"]) == [
+        {"id": "p_28", "choice_id": "present", "source": "predefined"},
+        {"id": "s_102", "choice_id": "absent"},
+        {"id": "s_13", "choice_id": "present"},
+    ]
+
+
+# build_report and send_report
+
+
+DIAGNOSIS = {"conditions": [{"id": "c_55", "name": "Tension-type headache", "probability": 0.4567, "common_name": "Headache"}]}
+
+
+def test_build_report():
+    answers = {"cough": False, "age": "30", "fever": True, "gender": "male", "abdominal_pain_type": "cramping", "smoking_cigarettes": True}
+    report = build_report(answers, ["headache", "back_pain"], DIAGNOSIS, {"triage_level": "consultation_24"})
+    assert report == {
+        "type": "report",
+        "history": [{"name": "age", "value": "30"}, {"name": "gender", "value": "male"}, {"name": "smoking cigarettes", "value": True}],
+        "chief_complaint": ["headache", "back pain"],
+        "symptoms_present": ["fever"],
+        "symptoms_absent": ["cough"],
+        "conditions": [{"id": "c_55", "name": "Tension-type headache", "probability": 0.4567}],
+        "triage_level": "consultation_24",
+        "triage_pending": False,
+        "advice": TRIAGE_ADVICE["consultation_24"],
+    }
+
+
+def test_build_report_without_triage():
+    report = build_report({}, None, {"conditions": []}, {"triage_level": None})
+    assert report["triage_pending"] and report["advice"] == PENDING_ADVICE
+    assert report["chief_complaint"] == [] and report["conditions"] == []
+    assert build_report({}, None, {}, {"triage_level": "self_care"})["advice"] == DEFAULT_ADVICE
+
+
+def sent(mode, report):
+    dispatcher = CollectingDispatcher()
+    send_report(dispatcher, report, mode)
+    return dispatcher.messages
+
+
+def test_send_report_modes():
+    report = build_report({"age": "30", "hypertension": False, "fever": True}, ["headache"], DIAGNOSIS, {"triage_level": "emergency"})
+    sections = [
+        "Patient:\nage: 30\nhypertension: No",
+        "Chief complaint: \nheadache",
+        "Symptoms Present: \nfever",
+        "Symptoms Absent: ",
+        "Associated Conditions: \nTension-type headache, 45.67%",
+        TRIAGE_ADVICE["emergency"],
+    ]
+    assert [m["text"] for m in sent("messages", report)] == sections
+    assert [m["text"] for m in sent("text", report)] == ["\n\n".join(sections)]
+    [message] = sent("payload", report)
+    assert message["text"] is None
+    assert message["custom"] == dict(report, text="\n\n".join(sections))
+    with pytest.raises(ValueError):
+        sent("carrier pigeon", report)
+
+
+def test_send_report_marks_pending_triage():
+    report = build_report({}, [], {"conditions": []}, {"triage_level": None})
+    assert sent("messages", report)[4]["text"] == "Associated Conditions: \npending"
+
+
+# tracing
+
+
+@pytest.fixture
+def traces(monkeypatch):
+    monkeypatch.setattr(tracing, "ACTION_TRACE", True)
+    monkeypatch.setattr(tracing, "ACTION_TRACE_SAMPLE_RATE", 1.0)
+    written = []
+    monkeypatch.setattr(tracing, "_get_writer", lambda: SimpleNamespace(info=lambda line: written.append(json.loads(line))))
+    return written
+
+
+class TracedAction:
+    def name(self):
+        return "action_traced"
+
+    @tracing.trace_action
+    async def run(self, dispatcher, tracker, domain):
+        async def outlives_the_request():
+            with tracing.span("late"):
+                await asyncio.sleep(0.05)
+
+        async def background():
+            with tracing.span("background"):
+                return tracing._current.get()
+
+        self.trace = tracing._current.get()
+        self.late = asyncio.ensure_future(outlives_the_request())
+        self.background = asyncio.ensure_future(tracing.detached(background()))
+        with tracing.span("work"):
+            await asyncio.sleep(0)
+
+
+def test_spans_after_the_trace_was_written_are_dropped(traces):
+    action = TracedAction()
+
+    async def run():
+        await action.run(None, tracker({}), {})
+        await action.late
+        return await action.background
+
+    assert asyncio.run(run()) is None
+    [trace] = traces
+    assert trace["action"] == "action_traced"
+    assert [s["name"] for s in trace["spans"]] == ["work"]
+    assert [s["name"] for s in action.trace.spans] == ["work"]
+
+
+def test_each_process_writes_its_own_trace_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "ACTION_TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "_trace_file", tracing.ACTION_TRACE_FILE)
+    monkeypatch.setattr(tracing, "_writer", None)
+    tracing.use_process_file()
+    writer = tracing._get_writer()
+    try:
+        writer.info("{}")
+        assert [p.name for p in tmp_path.iterdir()] == ["traces.{}.jsonl".format(os.getpid())]
+    finally:
+        for handler in list(writer.handlers):
+            writer.removeHandler(handler)
+            handler.close()
+
+
+# Prefetcher
+
+
+@pytest.mark.parametrize("error", [InfermedicaError("diagnosis", "timed out"), RuntimeError("unexpected"), ConnectionError("redis is down")])
+def test_failed_prefetch_is_a_miss(monkeypatch, error):
+    async def fail(**kwargs):
+        raise error
+
+    monkeypatch.setattr(prefetch.client, "diagnosis_and_triage", fail)
+    prefetcher = Prefetcher(enabled=True)
+
+    async def run():
+        assert prefetcher.schedule("user", EVIDENCE, "male", 30)
+        return await prefetcher.result("user", EVIDENCE, "male", 30)
+
+    assert asyncio.run(run()) is None
+    assert prefetcher.reused == 0
+
+
+def test_prefetch_survives_a_failing_cache(monkeypatch):
+    async def fetch(**kwargs):
+        return {"conditions": []}, {"triage_level": "consultation"}
+
+    monkeypatch.setattr(prefetch.client, "diagnosis_and_triage", fetch)
+    monkeypatch.setattr(prefetch, "report_cache", ReportCache(BrokenBackend()))
+    prefetcher = Prefetcher(enabled=True)
+
+    async def run():
+        prefetcher.schedule("user", EVIDENCE, "male", 30)
+        return await prefetcher.result("user", EVIDENCE, "male", 30)
+
+    assert asyncio.run(run()) == ({"conditions": []}, {"triage_level": "consultation"})
+
+
+# scripts.regenerate_reports
+
+
+COMPLETE = {"sender_id": "a", "slots": {"gender": "male", "age": "30", "initial": ["headache"], "cough": False}}
+
+
+def test_read_trackers_accepts_jsonl_and_dumps(tmp_path):
+    trackers = [COMPLETE, {"sender_id": "b", "events": []}]
+    (tmp_path / "trackers.jsonl").write_text("\n".join(json.dumps(t) for t in trackers) + "\n\n")
+    (tmp_path / "list.json").write_text(json.dumps(trackers))
+    (tmp_path / "dump.json").write_text(json.dumps({t["sender_id"]: {k: v for k, v in t.items() if k != "sender_id"} for t in trackers}))
+    (tmp_path / "single.json").write_text(json.dumps(COMPLETE))
+    for name in ("trackers.jsonl", "list.json", "dump.json"):
+        assert list(regenerate_reports.read_trackers(str(tmp_path / name))) == list(enumerate(trackers))
+    assert list(regenerate_reports.read_trackers(str(tmp_path / "single.json"))) == [(0, COMPLETE)]
+
+
+def test_tracker_slots_replays_events():
+    events = [
+        {"event": "slot", "name": "cough", "value": True},
+        {"event": "restart"},
+        {"event": "slot", "name": "age", "value": "30"},
+        {"event": "user", "text": "hi"},
+    ]
+    assert regenerate_reports.tracker_slots({"events": events}) == {"age": "30"}
+    assert regenerate_reports.tracker_slots({"slots": {"age": "40"}, "events": events}) == {"age": "40"}
+
+
+@pytest.fixture
+def regenerate_client(monkeypatch):
+    calls = []
+
+    async def diagnosis_and_triage(evidence, sex, age):
+        calls.append(evidence)
+        if sex == "female":
+            raise InfermedicaError("triage", "timed out")
+        return {"conditions": [{"id": "c_1", "name": "Migraine", "probability": 0.4}]}, {"triage_level": "consultation"}
+
+    monkeypatch.setattr(regenerate_reports.client, "diagnosis_and_triage", diagnosis_and_triage)
+    monkeypatch.setattr(regenerate_reports, "_use_cache", False)
+    return calls
+
+
+def regenerate(position, tracker):
+    async def run():
+        regenerate_reports._semaphore = asyncio.Semaphore(1)
+        return await regenerate_reports.regenerate(position, tracker)
+
+    return asyncio.run(run())
+
+
+def test_regenerate_builds_evidence_like_create_report(regenerate_client):
+    result = regenerate(3, COMPLETE)
+    assert result["line"] == 3 and result["sender_id"] == "a"
+    assert result["evidence"] == evidence_from_slots(COMPLETE["slots"])
+    assert result["triage_level"] == "consultation"
+    assert result["diagnosis"]["conditions"][0]["name"] == "Migraine"
+    assert regenerate_client == [result["evidence"]]
+
+
+def test_regenerate_reports_failures(regenerate_client):
+    assert regenerate(0, {"slots": {"initial": ["headache"]}})["error"] == "incomplete interview"
+    failed = regenerate(1, {"slots": dict(COMPLETE["slots"], gender="female")})
+    assert "timed out" in failed["error"] and "triage_level" not in failed
+    assert len(regenerate_client) == 1
+
+
+def test_regenerate_run_resumes_from_its_output(tmp_path, regenerate_client):
+    trackers = tmp_path / "trackers.jsonl"
+    trackers.write_text("\n".join(json.dumps(dict(COMPLETE, sender_id=str(i))) for i in range(5)) + "\n")
+    output = tmp_path / "reports.jsonl"
+    # Two reports done, the third cut short by an interrupted run.
+    output.write_text('{"line":0}\n{"line":2}\n{"line":4,"sen')
+    args = regenerate_reports.create_argument_parser().parse_args(
+        [str(trackers), "-o", str(output), "--workers", "1", "--chunk-size", "2", "--resume"]
+    )
+    assert regenerate_reports.run(args) == 0
+    lines = [json.loads(line) for line in output.read_text().splitlines() if line.startswith("{") and line.endswith("}")]
+    assert sorted(line["line"] for line in lines) == [0, 1, 2, 3, 4]
+    assert sorted(line["sender_id"] for line in lines if "sender_id" in line) == ["1", "3", "4"]
+
+
+# CompiledForm.evaluate
+
+
+@pytest.mark.parametrize("form", sorted(BASELINE))
+def test_evaluate_matches_baseline_required_slots(form):
+    compiled = COMPILED_FORMS[form]
+    order = BASELINE[form]["order"]
+    for case in BASELINE[form]["cases"]:
+        expected = [slot for slot in order if slot not in case["skipped"]]
+        assert list(compiled.evaluate(case["slots"]).required) == expected, case["slots"]
+
+
+@pytest.mark.parametrize("form", sorted(BASELINE))
+def test_incremental_evaluate_matches_fresh_evaluate(form):
+    compiled = COMPILED_FORMS[form]
+    state = None
+    for case in BASELINE[form]["cases"]:
+        state = compiled.evaluate(case["slots"], state)
+        assert state.required == compiled.evaluate(case["slots"]).required
+
+
+def test_every_form_has_a_baseline():
+    assert set(BASELINE) == set(COMPILED_FORMS)
+
+
+# validate_choice
+
+
+def test_validate_choice_sets_derived_slots():
+    dispatcher = CollectingDispatcher()
+    result = validate_choice("abdominal_pain_type", "cramping", dispatcher, tracker({}))
+    assert result == {"abdominal_pain_type": "cramping", "abdominal_pain_crampy": True}
+    assert dispatcher.messages == []
+
+
+def test_validate_choice_derived_value_can_override_the_choice():
+    result = validate_choice("abdominal_pain_type", "others", CollectingDispatcher(), tracker({}))
+    assert result == {"abdominal_pain_type": "Unknown"}
+
+
+@pytest.mark.parametrize("value", ["not an option", None, ["cramping"], {"a": 1}])
+def test_validate_choice_rejects_unknown_values(value):
+    dispatcher = CollectingDispatcher()
+    assert validate_choice("abdominal_pain_type", value, dispatcher, tracker({})) == {"abdominal_pain_type": None}
+    assert [m["text"] for m in dispatcher.messages] == [REPROMPT]
+
+
+def test_validate_choice_copies_from_slot():
+    slot, value, derived, source = next(
+        (slot, value, name, derived[name].slot)
+        for slot, table in CHOICE_TABLES.items()
+        for value, derived in table.items()
+        for name in derived
+        if isinstance(derived[name], FromSlot)
+    )
+    for copied in (True, False, None):
+        result = validate_choice(slot, value, CollectingDispatcher(), tracker({source: copied}))
+        assert result[derived] is copied
+
+
+# CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 1000.0
+
+        def monotonic(self):
+            return self.now
+
+    fake = Clock()
+    monkeypatch.setattr(infermedica_client, "time", fake)
+    return fake
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failures=3, reset_after=10)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failures=2, reset_after=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failures=1, reset_after=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_trial_outcome_closes_or_reopens(clock):
+    breaker = CircuitBreaker(failures=1, reset_after=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_paired_calls_share_the_half_open_trial(clock, monkeypatch):
+    client = InfermedicaClient()
+    calls = []
+
+    async def post(endpoint, data, timeout):
+        calls.append(endpoint)
+        return {"endpoint": endpoint}
+
+    monkeypatch.setattr(client, "_post", post)
+    for _ in range(client.breaker.failures):
+        client.breaker.record_failure()
+    clock.now += client.breaker.reset_after
+    result = asyncio.run(client.diagnosis_and_triage([], "male", 30))
+    assert result == ({"endpoint": "diagnosis"}, {"endpoint": "triage"})
+    assert sorted(calls) == ["diagnosis", "triage"]
+    assert client.breaker.state == "closed"
+
+
+def test_paired_calls_fail_fast_while_open(clock):
+    client = InfermedicaClient()
+    for _ in range(client.breaker.failures):
+        client.breaker.record_failure()
+    with pytest.raises(InfermedicaError):
+        asyncio.run(client.diagnosis_and_triage([], "male", 30))
+
+
+@pytest.mark.parametrize("body", ["<html><body>502 Bad Gateway</body></html>", '{"conditions": [', "null"])
+def test_unreadable_responses_count_as_failures(body):
+    async def respond(request):
+        return web.Response(text=body, content_type="text/html")
+
+    async def call():
+        app = web.Application()
+        app.router.add_post("/v3/diagnosis", respond)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        client = InfermedicaClient(base_url="http://127.0.0.1:{}/v3/".format(port), budget=2, max_attempts=1)
+        try:
+            with pytest.raises(InfermedicaError):
+                await client.diagnosis([], "male", 30)
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return client
+
+    assert asyncio.run(call()).breaker.consecutive_failures == 1
+
+
+# red_flag_triage
+
+
+def test_no_red_flags():
+    assert red_flag_triage({}) is None
+    assert red_flag_triage({"hemoptysis": False, "fever_greater_than_40": None}) is None
+
+
+def test_single_red_flag():
+    result = red_flag_triage({"fever_greater_than_40": True})
+    assert result.level == "consultation_24"
+    assert result.as_triage() == {"triage_level": "consultation_24", "source": "local", "red_flags": ["fever above 40C"]}
+
+
+def test_most_urgent_red_flags_win():
+    result = red_flag_triage({"fever_greater_than_40": True, "hemoptysis": True, "dyspnea_at_rest": True})
+    assert result.level == "emergency"
+    assert result.reasons == ["coughing up blood", "shortness of breath at rest"]
+
+
+def test_red_flag_needs_every_condition():
+    assert red_flag_triage({"chest_pain_pressure": True}) is None
+    assert red_flag_triage({"chest_pain_pressure": True, "chest_pain_continues_after_rest": True}).level == "emergency"
+
+
+@pytest.mark.parametrize("level, remote, outranks", [
+    ("consultation_24", "self_care", True),
+    ("consultation_24", "consultation", True),
+    ("consultation_24", "consultation_24", False),
+    ("consultation_24", "emergency", False),
+    ("emergency", "emergency_ambulance", False),
+    ("consultation", None, True),
+    ("consultation", "unknown", True),
+])
+def test_local_triage_outranks_less_urgent_remote_levels(level, remote, outranks):
+    assert TriageResult(level, []).outranks({"triage_level": remote}) is outranks
+
+
+def test_red_flags_read_known_slots():
+    from ruamel.yaml import YAML
+
+    with open(os.path.join(ROOT, "domain.yml")) as f:
+        slots = set(YAML(typ="safe").load(f)["slots"])
+    slots.update(slot for bitset in BITSETS.values() for slot in bitset.slots)
+    assert {slot for rule in RED_FLAG_RULES for slot in rule["when"]} <= slots
+
+
+# SymptomRegistry
+
+
+def test_registry_resolves_parents_first():
+    registry = SymptomRegistry({"cough": (), "cough_dry": ("cough",), "cough_dry_night": ("cough_dry", "cough")})
+    assert registry.complaints("cough_dry_night") == ("cough", "cough dry", "cough dry night")
+    assert registry.slot("cough_dry") == "cough_dry" and "cough_dry" in registry
+    assert registry.slot("greet") is None and registry.slot(None) is None
+    assert registry.complaints("greet") == ()
+
+
+def test_registry_keeps_each_complaint_once():
+    registry = SymptomRegistry({"cough": (), "cough_dry": ("cough",)})
+    initial = registry.add_complaint(None, "cough")
+    initial = registry.add_complaint(initial, "cough_dry")
+    initial = registry.add_complaint(initial, "cough")
+    assert initial == ["cough", "cough dry"]
+
+
+def test_chief_complaints_drop_repeats_in_order():
+    assert chief_complaints(["headache", "cough", "headache"]) == ["headache", "cough"]
+    assert chief_complaints(None) == []
+
+
+@pytest.mark.parametrize("intent, parent", [("cough_dry", "cough"), ("abdominal_pain_crampy", "abdominal pain"), ("hemoptysis", "cough")])
+def test_registry_built_from_the_domain(intent, parent):
+    assert symptom_registry.complaints(intent)[0] == parent
+
+
+def test_set_symptom_records_the_complaint_once():
+    slots = {"initial": ["cough"], "cough": True}
+    dispatcher = CollectingDispatcher()
+    latest = {"intent": {"name": "cough_dry"}, "intent_ranking": [{"name": "cough_dry", "confidence": 1.0}]}
+    events = asyncio.run(SetSymptom().run(dispatcher, Tracker("test", slots, latest, [], False, None, {}, "action_listen"), {}))
+    slots = apply(slots, events)
+    assert slots["initial"] == ["cough", "cough dry"]
+    assert answers_from_slots(slots) == {"cough": True, "cough_dry": True}
+    assert asyncio.run(SetSymptom().run(dispatcher, tracker(slots), {})) == []
+
+
+# DomainCache
+
+
+DOMAIN = {"slots": {"age": {"type": "text"}}, "responses": {"utter_greet": [{"text": "Grüß dich"}]}}
+
+
+def body(call):
+    return json.dumps(call).encode("utf-8")
+
+
+def test_domain_cache_reuses_parsed_domain():
+    cache = DomainCache()
+    call = {"next_action": "action_create_report", "tracker": {"slots": {"age": "30"}}, "domain": DOMAIN}
+    first = cache.decode(body(call))
+    second = cache.decode(body(dict(call, tracker={"slots": {"age": "40"}})))
+    assert first == call
+    assert second["tracker"] == {"slots": {"age": "40"}}
+    assert second["domain"] is first["domain"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_domain_cache_evicts_least_recently_used():
+    cache = DomainCache(max_entries=1)
+    other = dict(DOMAIN, slots={})
+    for domain in (DOMAIN, other, DOMAIN):
+        assert cache.decode(body({"domain": domain}))["domain"] == domain
+    assert (cache.hits, cache.misses) == (0, 3)
+
+
+@pytest.mark.parametrize("call", [
+    {"next_action": "action_listen", "tracker": {}},
+    {"next_action": "action_listen", "domain": None},
+    {"tracker": {"slots": {"x": {"domain": {"nested": True}}}}},
+    {"domain": DOMAIN, "tracker": {"latest_message": {"domain": {"nested": True}}}},
+    {"domain": "not an object"},
+])
+def test_domain_cache_falls_back_to_a_full_parse(call):
+    cache = DomainCache()
+    for _ in range(2):
+        assert cache.decode(body(call)) == call
+
+
+def test_domain_cache_handles_unusual_spacing():
+    raw = b'{"next_action": "x",\n "domain" :\n {"slots": {}}}'
+    assert DomainCache().decode(raw) == json.loads(raw)
+
+
+@pytest.mark.parametrize("raw", [b'{"domain": {"slots": {', b'{"domain": {}} trailing', b"not json"])
+def test_domain_cache_rejects_invalid_json(raw):
+    with pytest.raises(ValueError):
+        DomainCache().decode(raw)
+
+
+# FormBitset
+
+
+@pytest.mark.parametrize("form", sorted(BITSETS))
+def test_bitset_round_trip(form):
+    bitset = BITSETS[form]
+    rng = random.Random(form)
+    for _ in range(50):
+        values = {slot: rng.choice([True, False]) for slot in bitset.slots if rng.random() < 0.5}
+        encoded = bitset.update(None, values)
+        assert bitset.decode(encoded) == {slot: values[slot] for slot in bitset.slots if slot in values}
+        assert bitset.masks(encoded) == bitset.masks(bitset.encode(*bitset.masks(encoded)))
+
+
+def test_bitset_update_overwrites_and_clears():
+    bitset = next(b for b in BITSETS.values() if len(b.slots) >= 2)
+    first, second = bitset.slots[:2]
+    encoded = bitset.update(None, {first: True, second: False})
+    encoded = bitset.update(encoded, {first: False, second: None})
+    assert bitset.decode(encoded) == {first: False}
+
+
+# Tags are at most four hex digits, so "fffff" is never the current layout.
+@pytest.mark.parametrize("encoded", [None, "", "fffff.1.0", "garbage", "a.b"])
+def test_bitset_ignores_foreign_or_empty_values(encoded):
+    bitset = next(iter(BITSETS.values()))
+    assert bitset.decode(encoded) == {}
+
+
+def test_pack_events_and_unpack():
+    form, bitset = next(iter(BITSETS.items()))
+    slot = bitset.slots[0]
+    events = pack_events(form, {}, [SlotSet("requested_slot", None), SlotSet(slot, True)])
+    assert [e["name"] for e in events] == ["requested_slot", bitset.slot_name]
+    slots = {bitset.slot_name: events[-1]["value"]}
+    assert unpack(slots) == {slot: True}
+    assert form_view(form, slots)[slot] is True
+
+
+# default_workers
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    def write(**files):
+        for name, path in (("cpu_max", "CGROUP_CPU_MAX"), ("quota", "CGROUP_CFS_QUOTA"), ("period", "CGROUP_CFS_PERIOD")):
+            target = tmp_path / name
+            if name in files:
+                target.write_text(files[name] + "\n")
+            monkeypatch.setattr(prefork, path, str(target))
+
+    monkeypatch.setattr(prefork.os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    return write
+
+
+@pytest.mark.parametrize("files, workers", [
+    ({}, 8),
+    ({"cpu_max": "max 100000"}, 8),
+    ({"cpu_max": "200000 100000"}, 2),
+    ({"cpu_max": "150000 100000"}, 2),
+    ({"cpu_max": "50000 100000"}, 1),
+    ({"cpu_max": "1600000 100000"}, 8),
+    ({"quota": "300000", "period": "100000"}, 3),
+    ({"quota": "-1", "period": "100000"}, 8),
+])
+def test_default_workers_respects_the_cgroup_quota(cgroup, files, workers):
+    cgroup(**files)
+    assert prefork.default_workers() == workers
+
+
+# ReportStore
+
+
+REPORT = {"triage_level": "consultation", "conditions": [{"id": "c_1", "name": "Flu", "probability": 0.5}]}
+
+
+def stored(path):
+    with sqlite3.connect(str(path)) as connection:
+        return connection.execute("SELECT sender_id, sex, age, triage_level, evidence, report FROM reports ORDER BY id").fetchall()
+
+
+def test_report_store_writes_in_batches(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.db"), batch=2, flush_interval=10)
+    for sender_id in ("a", "b", "c", "d"):
+        assert store.put(sender_id, REPORT, EVIDENCE, "male", 30)
+    deadline = time.monotonic() + 5
+    while store.written < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Two full batches, without waiting for the flush interval.
+    assert (store.written, store.batches) == (4, 2)
+    store.close()
+    rows = stored(tmp_path / "reports.db")
+    assert [row[0] for row in rows] == ["a", "b", "c", "d"]
+    assert rows[0][1:4] == ("male", "30", "consultation")
+    assert json.loads(rows[0][4]) == EVIDENCE and json.loads(rows[0][5]) == REPORT
+
+
+def test_report_store_flushes_on_close(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.db"), batch=100, flush_interval=60)
+    store.put("a", REPORT, EVIDENCE, None, None)
+    store.put("b", dict(REPORT, triage_level=None), [], "female", "41")
+    started = time.monotonic()
+    store.close()
+    assert time.monotonic() - started < 5
+    assert (store.written, store.batches, store.dropped) == (2, 1, 0)
+    assert [row[:4] for row in stored(tmp_path / "reports.db")] == [("a", None, None, "consultation"), ("b", "female", "41", None)]
+
+
+def test_report_store_drops_reports_when_full(tmp_path, monkeypatch):
+    store = ReportStore(str(tmp_path / "reports.db"), max_queued=1)
+    # No writer thread, so nothing drains the queue.
+    monkeypatch.setattr(store, "_ensure_writer", lambda: None)
+    store._queue = queue.Queue(store.max_queued)
+    assert store.put("a", REPORT, EVIDENCE, "male", 30)
+    assert not store.put("b", REPORT, EVIDENCE, "male", 30)
+    assert store.dropped == 1
+
+
+def test_report_store_is_off_without_a_path():
+    store = ReportStore("")
+    assert not store.enabled
+    assert not store.put("a", REPORT, EVIDENCE, "male", 30)
+    assert store.queued == 0
+
+
+# scripts.export_reports
+
+
+def store_reports(path, reports):
+    connection = connect(str(path))
+    with connection:
+        connection.execute("BEGIN")
+        connection.executemany(INSERT, reports)
+    connection.close()
+
+
+def stored_report(day, evidence_ids, triage_level="consultation"):
+    evidence = [{"id": i, "choice_id": "present"} for i in evidence_ids]
+    return (1790000000 + day * 86400, "user", "male", "34", triage_level, json.dumps(evidence), json.dumps(REPORT))
+
+
+def export(database, output, *args):
+    return export_reports.run(export_reports.create_argument_parser().parse_args([str(database), "-o", str(output)] + list(args)))
+
+
+def test_export_keeps_dictionary_codes_across_resume(tmp_path):
+    ipc = pytest.importorskip("pyarrow.ipc")
+
+    database, output = tmp_path / "reports.db", tmp_path / "export"
+    store_reports(database, [stored_report(0, ["s_1", "s_2"])])
+    assert export(database, output, "--format", "arrow") == 0
+    store_reports(database, [stored_report(1, ["s_3", "s_1"], "emergency")])
+    assert export(database, output, "--format", "arrow", "--resume") == 0
+
+    codes = {}
+    for path in sorted(output.glob("evidence/date=*/*.arrow")):
+        column = ipc.open_file(str(path)).read_all().column("id").combine_chunks()
+        values = column.dictionary.to_pylist()
+        for index in column.indices.to_pylist():
+            assert codes.setdefault(values[index], index) == index
+    assert codes == {"s_1": 0, "s_2": 1, "s_3": 2}
+
+
+def test_export_resume_only_adds_new_reports(tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+
+    database, output = tmp_path / "reports.db", tmp_path / "export"
+    store_reports(database, [stored_report(0, ["s_1"]), stored_report(0, ["s_2"])])
+    assert export(database, output) == 0
+    assert export(database, output) == 2
+    assert export(database, output, "--resume", "--format", "arrow") == 2
+    store_reports(database, [stored_report(1, ["s_2", "s_3"], "emergency")])
+    assert export(database, output, "--resume") == 0
+
+    reports = ds.dataset(str(output / "reports"), partitioning="hive").to_table().to_pylist()
+    assert sorted(r["report_id"] for r in reports) == [1, 2, 3]
+    evidence = ds.dataset(str(output / "evidence"), partitioning="hive").to_table().to_pylist()
+    assert sorted((e["report_id"], e["id"], e["triage_level"], e["age_band"]) for e in evidence) == [
+        (1, "s_1", "consultation", "30-39"), (2, "s_2", "consultation", "30-39"),
+        (3, "s_2", "emergency", "30-39"), (3, "s_3", "emergency", "30-39"),
+    ]
+